@@ -0,0 +1,24 @@
+"""bill listing indexes
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Keyset pagination of bill listings on (created_at, id)
+    op.create_index('ix_bills_created_at_id', 'bills', ['created_at', 'id'], unique=False)
+    op.create_index('ix_bills_status_created_at_id', 'bills', ['status', 'created_at', 'id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_bills_status_created_at_id', table_name='bills')
+    op.drop_index('ix_bills_created_at_id', table_name='bills')
@@ -0,0 +1,53 @@
+"""comment aggregates
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Comments of a bill, oldest first
+    op.create_index('ix_comments_bill_id_created_at', 'comments', ['bill_id', 'created_at'], unique=False)
+
+    op.create_table(
+        'bill_comment_stats',
+        sa.Column('bill_id', sa.Integer(), nullable=False),
+        sa.Column('comment_count', sa.Integer(), nullable=False),
+        sa.Column('last_comment_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['bill_id'], ['bills.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bill_id')
+    )
+    op.create_table(
+        'bill_comment_daily',
+        sa.Column('bill_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('comment_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['bill_id'], ['bills.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bill_id', 'day')
+    )
+
+    # Aggregates of the comments already there
+    op.execute(
+        "INSERT INTO bill_comment_stats (bill_id, comment_count, last_comment_at) "
+        "SELECT bill_id, count(*), max(created_at) FROM comments "
+        "WHERE bill_id IS NOT NULL GROUP BY bill_id"
+    )
+    op.execute(
+        "INSERT INTO bill_comment_daily (bill_id, day, comment_count) "
+        "SELECT bill_id, (created_at AT TIME ZONE 'UTC')::date, count(*) FROM comments "
+        "WHERE bill_id IS NOT NULL AND created_at IS NOT NULL GROUP BY 1, 2"
+    )
+
+def downgrade() -> None:
+    op.drop_table('bill_comment_daily')
+    op.drop_table('bill_comment_stats')
+    op.drop_index('ix_comments_bill_id_created_at', table_name='comments')
@@ -0,0 +1,61 @@
+"""comment clusters
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'comment_clusters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('bill_id', sa.Integer(), nullable=False),
+        sa.Column('representative_id', sa.Integer(), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['bill_id'], ['bills.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['representative_id'], ['comments.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_comment_clusters_id'), 'comment_clusters', ['id'], unique=False)
+    op.create_index('ix_comment_clusters_bill_id_size', 'comment_clusters', ['bill_id', 'size'], unique=False)
+
+    op.create_table(
+        'comment_cluster_buckets',
+        sa.Column('bill_id', sa.Integer(), nullable=False),
+        sa.Column('band', sa.SmallInteger(), nullable=False),
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.Column('cluster_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['cluster_id'], ['comment_clusters.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bill_id', 'band', 'bucket')
+    )
+
+    op.create_table(
+        'comment_cluster_members',
+        sa.Column('comment_id', sa.Integer(), nullable=False),
+        sa.Column('cluster_id', sa.Integer(), nullable=False),
+        sa.Column('similarity', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['comment_id'], ['comments.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['cluster_id'], ['comment_clusters.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('comment_id')
+    )
+    op.create_index(op.f('ix_comment_cluster_members_cluster_id'), 'comment_cluster_members', ['cluster_id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_comment_cluster_members_cluster_id'), table_name='comment_cluster_members')
+    op.drop_table('comment_cluster_members')
+    op.drop_table('comment_cluster_buckets')
+    op.drop_index('ix_comment_clusters_bill_id_size', table_name='comment_clusters')
+    op.drop_index(op.f('ix_comment_clusters_id'), table_name='comment_clusters')
+    op.drop_table('comment_clusters')
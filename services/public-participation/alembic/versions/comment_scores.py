@@ -0,0 +1,43 @@
+"""comment scores
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'comment_scores',
+        sa.Column('comment_id', sa.Integer(), nullable=False),
+        sa.Column('bill_id', sa.Integer(), nullable=True),
+        sa.Column('sentiment', sa.Float(), nullable=False),
+        sa.Column('label', sa.String(), nullable=False),
+        sa.Column('topic', sa.String(), nullable=True),
+        sa.Column('scorer', sa.String(), nullable=False),
+        sa.Column('scored_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['comment_id'], ['comments.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['bill_id'], ['bills.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('comment_id')
+    )
+    op.create_index('ix_comment_scores_bill_id_label', 'comment_scores', ['bill_id', 'label'], unique=False)
+
+    op.create_table(
+        'scoring_state',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+def downgrade() -> None:
+    op.drop_table('scoring_state')
+    op.drop_index('ix_comment_scores_bill_id_label', table_name='comment_scores')
+    op.drop_table('comment_scores')
@@ -1,30 +1,54 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Any, List, Optional
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app import crud, models, schemas
 from app.api import deps
 from app.core.config import settings
-from app.services.neo4j_service import add_bill_to_graph
-from app.services.redis_service import cache_bill, get_cached_bill
+from app.crud.crud_bill import decode_cursor
+from app.services.comment_clusters import get_bill_clusters
+from app.services.comment_scoring import get_bill_sentiment
+from app.services.comment_stats import get_bill_comment_stats
+from app.services.graph_writer import enqueue_bill
+from app.services.redis_service import get_or_load_cached_bill, get_or_load_cached_bill_page
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.get("/", response_model=List[schemas.Bill])
 def read_bills(
+    response: Response,
     db: Session = Depends(deps.get_db),
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=100),
     status: str = Query(None, description="Filter bills by status"),
+    skip: Optional[int] = Query(None, ge=0, deprecated=True, description="Deprecated: page with cursor instead"),
 ) -> Any:
     """
-    Retrieve bills.
+    Retrieve bills, newest first. The cursor of the next page is returned in the
+    X-Next-Cursor header, which is absent on the last page.
     """
-    if status:
-        bills = crud.crud_bill.get_multi_by_status(
-            db, status=status, skip=skip, limit=limit
-        )
-    else:
-        bills = crud.crud_bill.get_multi(db, skip=skip, limit=limit)
+    if skip is not None:
+        # Offset paging is kept for one release so existing clients keep working
+        if cursor:
+            raise HTTPException(status_code=400, detail="Use either cursor or skip, not both")
+        logger.warning(f"Deprecated skip={skip} passed to GET /bills; clients should page with cursor")
+        response.headers["Deprecation"] = "true"
+        if status:
+            return crud.crud_bill.get_multi_by_status(db, status=status, skip=skip, limit=limit)
+        return crud.crud_bill.get_multi(db, skip=skip, limit=limit)
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    bills, next_cursor = get_or_load_cached_bill_page(
+        status, cursor, limit,
+        lambda: crud.crud_bill.get_page(db, status=status, cursor=cursor, limit=limit),
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return bills
 
 @router.post("/", response_model=schemas.Bill)
@@ -38,8 +62,8 @@ def create_bill(
     Create new bill.
     """
     bill = crud.crud_bill.create(db=db, obj_in=bill_in)
-    # Add to knowledge graph
-    add_bill_to_graph(bill)
+    # Queue for the knowledge graph; written in the background
+    enqueue_bill(bill)
     return bill
 
 @router.get("/{id}", response_model=schemas.Bill)
@@ -51,19 +75,59 @@ def read_bill(
     """
     Get bill by ID.
     """
-    # Try to get from cache first
-    cached_bill = get_cached_bill(id)
-    if cached_bill:
-        return cached_bill
-    
-    bill = crud.crud_bill.get(db=db, id=id)
+    # Concurrent misses share a single database load
+    bill = get_or_load_cached_bill(id, lambda: crud.crud_bill.get(db=db, id=id))
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
-    
-    # Cache the bill for future requests
-    cache_bill(bill)
     return bill
 
+@router.get("/{id}/stats", response_model=schemas.BillCommentStats)
+def read_bill_stats(
+    *,
+    db: Session = Depends(deps.get_db),
+    id: int,
+    days: int = Query(30, ge=1, le=366, description="Days of daily comment volume"),
+) -> Any:
+    """
+    Get comment count, latest comment time and daily comment volume of a bill.
+    """
+    stats = get_bill_comment_stats(db, id, days=days)
+    if stats is None:
+        if not crud.crud_bill.get(db=db, id=id):
+            raise HTTPException(status_code=404, detail="Bill not found")
+        stats = {"bill_id": id}
+    return stats
+
+@router.get("/{id}/sentiment", response_model=schemas.BillSentiment)
+def read_bill_sentiment(
+    *,
+    db: Session = Depends(deps.get_db),
+    id: int,
+) -> Any:
+    """
+    Get the sentiment and topic distribution of a bill's comments, as scored by the
+    background pipeline.
+    """
+    if not crud.crud_bill.get(db=db, id=id):
+        raise HTTPException(status_code=404, detail="Bill not found")
+    return get_bill_sentiment(db, id)
+
+@router.get("/{id}/clusters", response_model=List[schemas.CommentClusterSummary])
+def read_bill_clusters(
+    *,
+    db: Session = Depends(deps.get_db),
+    id: int,
+    min_size: int = Query(2, ge=1, description="Smallest cluster to list"),
+    limit: int = Query(50, ge=1, le=500),
+) -> Any:
+    """
+    Get a bill's largest clusters of near-duplicate comments, e.g. organized campaigns,
+    with the text of each cluster's representative comment.
+    """
+    if not crud.crud_bill.get(db=db, id=id):
+        raise HTTPException(status_code=404, detail="Bill not found")
+    return get_bill_clusters(db, id, min_size=min_size, limit=limit)
+
 @router.put("/{id}", response_model=schemas.Bill)
 def update_bill(
     *,
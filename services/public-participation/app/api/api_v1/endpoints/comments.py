@@ -1,9 +1,12 @@
 from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+import io
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from sqlalchemy.orm import Session
 from app import crud, models, schemas
 from app.api import deps
-from app.services.neo4j_service import add_comment_to_graph
+from app.services.comment_import import FORMATS, detect_format, import_comments
+from app.services.comment_clusters import comment_cluster_ids
+from app.services.graph_writer import enqueue_comment_clusters
 
 router = APIRouter()
 
@@ -43,10 +46,32 @@ def create_comment(
     comment = crud.crud_comment.create_with_user(
         db=db, obj_in=comment_in, user_id=current_user.id
     )
-    # Add to knowledge graph
-    add_comment_to_graph(comment)
+    # Queue for the knowledge graph, as its near-duplicate cluster; written in the background
+    enqueue_comment_clusters(db, [comment.id])
     return comment
 
+@router.post("/bulk", response_model=schemas.CommentImportReport)
+def bulk_import_comments(
+    *,
+    db: Session = Depends(deps.get_db),
+    file: UploadFile = File(..., description="NDJSON or CSV comments"),
+    format: str = Query(None, description="ndjson or csv; detected from the file by default"),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Import comments in bulk, e.g. from SMS, WhatsApp or paper forms.
+    Rows without a user_id are attributed to the importing user.
+    """
+    format = format or detect_format(file.filename, file.content_type)
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {format}")
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = import_comments(db, stream, format=format, user_id=current_user.id)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File is not UTF-8 text")
+    return report.as_dict()
+
 @router.get("/{id}", response_model=schemas.Comment)
 def read_comment(
     *,
@@ -77,7 +102,11 @@ def update_comment(
         raise HTTPException(status_code=404, detail="Comment not found")
     if comment.user_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    old_clusters = comment_cluster_ids(db, [comment.id])
     comment = crud.crud_comment.update(db=db, db_obj=comment, obj_in=comment_in)
+    # The comment may have moved to another near-duplicate cluster; the one it left
+    # has a new size, and a new representative if the comment represented it
+    enqueue_comment_clusters(db, [comment.id], cluster_ids=old_clusters, removed=[comment.id])
     return comment
 
 @router.delete("/{id}", response_model=schemas.Comment)
@@ -95,5 +124,7 @@ def delete_comment(
         raise HTTPException(status_code=404, detail="Comment not found")
     if comment.user_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    old_clusters = comment_cluster_ids(db, [id])
     comment = crud.crud_comment.remove(db=db, id=id)
+    enqueue_comment_clusters(db, [], cluster_ids=old_clusters, removed=[id])
     return comment 
\ No newline at end of file
@@ -36,6 +36,17 @@ class Settings(BaseSettings):
     NEO4J_USER: str
     NEO4J_PASSWORD: str
 
+    # Graph write-behind queue
+    GRAPH_SPOOL_PATH: str = "data/graph-spool.jsonl"
+    GRAPH_BATCH_SIZE: int = 500
+    GRAPH_FLUSH_INTERVAL: float = 1.0
+    GRAPH_SPOOL_FSYNC: bool = False
+
+    # Background comment scoring
+    COMMENT_SCORING_ENABLED: bool = True
+    COMMENT_SCORING_INTERVAL: float = 30.0
+    COMMENT_SCORING_BATCH_SIZE: int = 500
+
     class Config:
         case_sensitive = True
         env_file = ".env"
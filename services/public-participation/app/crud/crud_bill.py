@@ -1,10 +1,56 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from app.crud.base import CRUDBase
 from app.models.models import Bill
 from app.schemas.bill import BillCreate, BillUpdate
+from app.services.redis_service import cache_bill, invalidate_cached_bill, invalidate_cached_bill_lists
+
+def encode_cursor(bill: Bill) -> str:
+    """Opaque cursor pointing just past `bill` in the newest-first listing"""
+    raw = json.dumps([bill.created_at.isoformat(), bill.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError if the cursor was not made by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise ValueError("Invalid cursor")
 
 class CRUDBill(CRUDBase[Bill, BillCreate, BillUpdate]):
+    # Writes go through the bill cache once committed. The list generation is bumped
+    # before the bill is cached, so page loads racing the write drop their copy of it
+
+    def create(self, db: Session, *, obj_in: BillCreate) -> Bill:
+        bill = super().create(db, obj_in=obj_in)
+        invalidate_cached_bill_lists()
+        cache_bill(bill)
+        return bill
+
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Bill,
+        obj_in: Union[BillUpdate, Dict[str, Any]]
+    ) -> Bill:
+        bill = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        invalidate_cached_bill_lists()
+        cache_bill(bill)
+        return bill
+
+    def remove(self, db: Session, *, id: int) -> Bill:
+        bill = super().remove(db, id=id)
+        invalidate_cached_bill_lists()
+        invalidate_cached_bill(id)
+        return bill
+
     def get_by_title(self, db: Session, *, title: str) -> Optional[Bill]:
         return db.query(Bill).filter(Bill.title == title).first()
 
@@ -19,6 +65,33 @@ class CRUDBill(CRUDBase[Bill, BillCreate, BillUpdate]):
             .all()
         )
 
+    def get_page(
+        self,
+        db: Session,
+        *,
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> Tuple[List[Bill], Optional[str]]:
+        """
+        Newest bills first, starting after `cursor`. Seeks on (created_at, id) with the
+        listing indexes, so every page costs the same however deep it is.
+        Returns the page and the cursor of the next one (None on the last page).
+        """
+        query = db.query(Bill)
+        if status:
+            query = query.filter(Bill.status == status)
+        if cursor:
+            created_at, id = decode_cursor(cursor)
+            query = query.filter(tuple_(Bill.created_at, Bill.id) < tuple_(created_at, id))
+        bills = (
+            query.order_by(Bill.created_at.desc(), Bill.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        next_cursor = encode_cursor(bills[limit - 1]) if len(bills) > limit else None
+        return bills[:limit], next_cursor
+
     def get_with_comments(self, db: Session, *, id: int) -> Optional[Bill]:
         return (
             db.query(Bill)
@@ -1,8 +1,12 @@
-from typing import List
+from typing import Any, Dict, List, Union
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 from app.crud.base import CRUDBase
-from app.models.models import Comment, User
+from app.models.models import Comment, CommentScore, User
 from app.schemas.comment import CommentCreate, CommentUpdate
+from app.services.comment_clusters import cluster_comments, uncluster_comments
+from app.services.comment_stats import apply_comment_changes
 
 class CRUDComment(CRUDBase[Comment, CommentCreate, CommentUpdate]):
     def create_with_user(
@@ -14,16 +18,64 @@ class CRUDComment(CRUDBase[Comment, CommentCreate, CommentUpdate]):
             user_id=user_id,
         )
         db.add(db_obj)
+        db.flush()
+        db.refresh(db_obj)
+        # The bill's aggregates and near-duplicate clusters commit together with the comment
+        apply_comment_changes(db, added=[(db_obj.bill_id, db_obj.created_at)])
+        cluster_comments(db, [db_obj])
         db.commit()
         db.refresh(db_obj)
         return db_obj
 
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Comment,
+        obj_in: Union[CommentUpdate, Dict[str, Any]]
+    ) -> Comment:
+        old_bill_id, old_text = db_obj.bill_id, db_obj.text
+        obj_data = jsonable_encoder(db_obj)
+        if isinstance(obj_in, dict):
+            update_data = obj_in
+        else:
+            update_data = obj_in.dict(exclude_unset=True)
+        for field in obj_data:
+            if field in update_data:
+                setattr(db_obj, field, update_data[field])
+        db.add(db_obj)
+        if db_obj.bill_id != old_bill_id:
+            # Moved to another bill
+            apply_comment_changes(
+                db,
+                added=[(db_obj.bill_id, db_obj.created_at)],
+                removed=[(old_bill_id, db_obj.created_at)],
+            )
+        if db_obj.bill_id != old_bill_id or db_obj.text != old_text:
+            # Compared again under its new text or bill, and scored again by the scoring worker
+            uncluster_comments(db, [db_obj.id])
+            cluster_comments(db, [db_obj])
+            db.execute(delete(CommentScore).where(CommentScore.comment_id == db_obj.id))
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    def remove(self, db: Session, *, id: int) -> Comment:
+        obj = db.query(Comment).get(id)
+        uncluster_comments(db, [id])
+        db.delete(obj)
+        db.flush()
+        apply_comment_changes(db, removed=[(obj.bill_id, obj.created_at)])
+        db.commit()
+        return obj
+
     def get_multi_by_bill(
         self, db: Session, *, bill_id: int, skip: int = 0, limit: int = 100
     ) -> List[Comment]:
         return (
             db.query(Comment)
             .filter(Comment.bill_id == bill_id)
+            .order_by(Comment.created_at, Comment.id)
             .offset(skip)
             .limit(limit)
             .all()
@@ -1,7 +1,15 @@
+import threading
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 from app.core.config import settings
 from app.api.api_v1.api import api_router
+from app.db.session import SessionLocal, engine
+from app.services.comment_scoring import CommentScoringWorker
+from app.services.graph_writer import graph_writer
+from app.services.neo4j_service import neo4j_service
+from app.services.redis_service import redis_service
 
 app = FastAPI(
     title="Public Participation Service",
@@ -23,4 +31,52 @@ app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": settings.SERVICE_NAME}
\ No newline at end of file
+    return {"status": "healthy", "service": settings.SERVICE_NAME}
+
+def check_dependencies() -> dict:
+    """Check that PostgreSQL, Neo4j and Redis are reachable"""
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        database = True
+    except Exception:
+        database = False
+    return {
+        "database": database,
+        "neo4j": neo4j_service.ping(),
+        "redis": redis_service.ping(),
+    }
+
+@app.on_event("startup")
+async def warm_connections():
+    # Open connection pools in the background so startup does not wait on them
+    threading.Thread(target=check_dependencies, name="warm-connections", daemon=True).start()
+
+@app.on_event("startup")
+def start_graph_writer():
+    # Replays graph events spooled before the last shutdown
+    graph_writer.start()
+
+@app.on_event("shutdown")
+def stop_graph_writer():
+    graph_writer.close()
+
+comment_scoring = CommentScoringWorker(SessionLocal)
+
+@app.on_event("startup")
+def start_comment_scoring():
+    if settings.COMMENT_SCORING_ENABLED:
+        comment_scoring.start()
+
+@app.on_event("shutdown")
+def stop_comment_scoring():
+    comment_scoring.close()
+
+@app.get("/ready")
+def readiness_check():
+    checks = check_dependencies()
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "unavailable", "checks": checks},
+    )
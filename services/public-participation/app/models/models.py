@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Text, Date, DateTime, Float, ForeignKey, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
@@ -27,6 +27,12 @@ class Bill(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     comments = relationship("Comment", back_populates="bill")
 
+    # Keyset pagination of listings, newest first, optionally filtered by status
+    __table_args__ = (
+        Index("ix_bills_created_at_id", "created_at", "id"),
+        Index("ix_bills_status_created_at_id", "status", "created_at", "id"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
 
@@ -37,4 +43,85 @@ class Comment(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     bill = relationship("Bill", back_populates="comments")
-    user = relationship("User") 
\ No newline at end of file
+    user = relationship("User")
+
+    # Comments of a bill, oldest first
+    __table_args__ = (
+        Index("ix_comments_bill_id_created_at", "bill_id", "created_at"),
+    )
+
+class BillCommentStats(Base):
+    """Comment totals per bill, kept up to date by every comment write"""
+    __tablename__ = "bill_comment_stats"
+
+    bill_id = Column(Integer, ForeignKey("bills.id", ondelete="CASCADE"), primary_key=True)
+    comment_count = Column(Integer, nullable=False, default=0)
+    last_comment_at = Column(DateTime(timezone=True))
+
+class BillCommentDaily(Base):
+    """Comments per bill per (UTC) day"""
+    __tablename__ = "bill_comment_daily"
+
+    bill_id = Column(Integer, ForeignKey("bills.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    comment_count = Column(Integer, nullable=False, default=0) 
+
+class CommentScore(Base):
+    """Sentiment and topic of a comment, written by the scoring pipeline and cleared when the comment is edited"""
+    __tablename__ = "comment_scores"
+
+    comment_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), primary_key=True)
+    bill_id = Column(Integer, ForeignKey("bills.id", ondelete="CASCADE"))
+    sentiment = Column(Float, nullable=False)
+    label = Column(String, nullable=False)
+    topic = Column(String)
+    scorer = Column(String, nullable=False)
+    scored_at = Column(DateTime(timezone=True), nullable=False)
+
+    # Per-bill distributions
+    __table_args__ = (
+        Index("ix_comment_scores_bill_id_label", "bill_id", "label"),
+    )
+
+class ScoringState(Base):
+    """Lock row of a scoring pipeline, taken by each batch, with when it last scored"""
+    __tablename__ = "scoring_state"
+
+    name = Column(String, primary_key=True)
+    updated_at = Column(DateTime(timezone=True))
+
+class CommentCluster(Base):
+    """
+    Near-duplicate comments of a bill. New comments are compared with the MinHash
+    signature of its first comment; the representative is its earliest remaining member.
+    """
+    __tablename__ = "comment_clusters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    bill_id = Column(Integer, ForeignKey("bills.id", ondelete="CASCADE"), nullable=False)
+    representative_id = Column(Integer, ForeignKey("comments.id", ondelete="SET NULL"))
+    size = Column(Integer, nullable=False, default=1)
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True))
+
+    # Largest clusters of a bill
+    __table_args__ = (
+        Index("ix_comment_clusters_bill_id_size", "bill_id", "size"),
+    )
+
+class CommentClusterBucket(Base):
+    """LSH band bucket of a cluster representative's signature"""
+    __tablename__ = "comment_cluster_buckets"
+
+    bill_id = Column(Integer, primary_key=True)
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    cluster_id = Column(Integer, ForeignKey("comment_clusters.id", ondelete="CASCADE"), nullable=False)
+
+class CommentClusterMember(Base):
+    __tablename__ = "comment_cluster_members"
+
+    comment_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), primary_key=True)
+    cluster_id = Column(Integer, ForeignKey("comment_clusters.id", ondelete="CASCADE"), nullable=False, index=True)
+    similarity = Column(Float, nullable=False)
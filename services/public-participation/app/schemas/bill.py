@@ -1,5 +1,5 @@
-from typing import Optional, List
-from datetime import datetime
+from typing import Dict, Optional, List
+from datetime import date, datetime
 from pydantic import BaseModel
 from .comment import Comment
 
@@ -22,4 +22,27 @@ class Bill(BillBase):
     comments: List[Comment] = []
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class BillCommentDay(BaseModel):
+    day: date
+    comment_count: int
+
+class BillCommentStats(BaseModel):
+    bill_id: int
+    comment_count: int = 0
+    last_comment_at: Optional[datetime] = None
+    daily: List[BillCommentDay] = []
+
+class BillSentiment(BaseModel):
+    bill_id: int
+    scored: int
+    average_sentiment: Optional[float] = None
+    labels: Dict[str, int] = {}
+    topics: Dict[str, int] = {}
+
+class CommentClusterSummary(BaseModel):
+    cluster_id: int
+    size: int
+    representative_id: Optional[int] = None
+    text: Optional[str] = None
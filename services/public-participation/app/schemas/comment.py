@@ -1,6 +1,6 @@
-from typing import Optional
-from datetime import datetime
-from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime, timezone
+from pydantic import BaseModel, field_validator
 from .user import User
 
 class CommentBase(BaseModel):
@@ -21,4 +21,40 @@ class Comment(CommentBase):
     user: Optional[User] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class CommentImport(BaseModel):
+    """One row of a bulk comment import"""
+    text: str
+    bill_id: int
+    user_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+    @field_validator("text")
+    @classmethod
+    def text_not_blank(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("text is empty")
+        return value
+
+    @field_validator("created_at")
+    @classmethod
+    def created_at_not_in_future(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None:
+            aware = value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+            if aware > datetime.now(timezone.utc):
+                raise ValueError("created_at is in the future")
+        return value
+
+class CommentImportError(BaseModel):
+    line: int
+    error: str
+
+class CommentImportReport(BaseModel):
+    received: int
+    inserted: int
+    rejected: int
+    seconds: float
+    rows_per_second: float
+    errors: List[CommentImportError] = []
@@ -0,0 +1,233 @@
+from typing import Dict, Iterable, List, NamedTuple
+import hashlib
+import logging
+import re
+import zlib
+import numpy as np
+from sqlalchemy import delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+from app.models.models import Comment, CommentCluster, CommentClusterBucket, CommentClusterMember
+from app.services.comment_stats import dialect_insert
+from app.services.neo4j_service import comment_properties
+
+logger = logging.getLogger(__name__)
+
+# MinHash permutations, split into LSH bands of BAND_ROWS rows. With 16 bands of 4 rows,
+# pairs with Jaccard similarity 0.5 share a bucket ~65% of the time, 0.7 ~99%.
+NUM_PERM = 64
+BAND_ROWS = 4
+NUM_BANDS = NUM_PERM // BAND_ROWS
+# Estimated Jaccard similarity to a cluster's representative needed to join it
+SIMILARITY_THRESHOLD = 0.7
+# Words per shingle
+SHINGLE_WORDS = 3
+
+_PRIME = np.uint64(4294967291)  # Largest prime below 2**32
+_rng = np.random.RandomState(1)
+# Fixed seeds: signatures must stay comparable across processes and restarts
+_A = _rng.randint(1, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+
+WORDS = re.compile(r"[a-z0-9']+")
+
+
+class ClusterAssignment(NamedTuple):
+    cluster_id: int
+    similarity: float
+    is_new: bool
+
+
+def shingles(text: str) -> set:
+    """Word 3-grams of the normalized text (its words if it is shorter)"""
+    words = WORDS.findall((text or "").lower())
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of a text's shingles"""
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)), dtype=np.uint64)
+    if not len(hashes):
+        return np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+    # (a * h + b) mod p for every permutation and shingle; a < 2**31 and h < 2**32 fit in uint64
+    values = (np.outer(_A, hashes) + _B[:, None]) % _PRIME
+    return values.min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def band_buckets(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit bucket key per band"""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+        for band in signature.reshape(NUM_BANDS, BAND_ROWS)
+    ]
+
+
+def cluster_comments(db: Session, comments: Iterable) -> Dict[int, ClusterAssignment]:
+    """
+    Assign comments (with id, bill_id and text) to near-duplicate clusters of their
+    bill, creating a cluster, represented by the comment, for those matching none.
+    Runs in the caller's transaction.
+
+    A comment is compared only with the clusters sharing one of its LSH band buckets,
+    at most NUM_BANDS of them, so each insertion costs the same however many
+    comments the bill has. The whole batch is looked up with one query.
+    """
+    comments = [comment for comment in comments if comment.bill_id is not None]
+    if not comments:
+        return {}
+    signatures = {comment.id: minhash(comment.text) for comment in comments}
+    keys = {
+        comment.id: [(comment.bill_id, band, bucket) for band, bucket in enumerate(band_buckets(signatures[comment.id]))]
+        for comment in comments
+    }
+
+    all_keys = {key for comment_keys in keys.values() for key in comment_keys}
+    bucket_key = tuple_(CommentClusterBucket.bill_id, CommentClusterBucket.band, CommentClusterBucket.bucket)
+    buckets = {
+        (bill_id, band, bucket): cluster_id
+        for bill_id, band, bucket, cluster_id in db.execute(
+            select(CommentClusterBucket.bill_id, CommentClusterBucket.band, CommentClusterBucket.bucket,
+                   CommentClusterBucket.cluster_id)
+            .where(bucket_key.in_(all_keys))
+        )
+    }
+    cluster_signatures = {
+        row.id: np.frombuffer(row.signature, dtype=np.uint32)
+        for row in db.execute(
+            select(CommentCluster.id, CommentCluster.signature).where(CommentCluster.id.in_(set(buckets.values())))
+        )
+    }
+
+    # Clusters created in this batch are keyed by minus their comment's id until
+    # they are inserted; cluster ids are positive
+    matches = {}
+    new_clusters, grown = {}, {}
+    for comment in comments:
+        signature = signatures[comment.id]
+        best, best_similarity = None, 0.0
+        for cluster_id in {buckets[key] for key in keys[comment.id] if key in buckets}:
+            score = similarity(signature, cluster_signatures[cluster_id])
+            if score > best_similarity:
+                best, best_similarity = cluster_id, score
+        if best is not None and best_similarity >= SIMILARITY_THRESHOLD:
+            matches[comment.id] = (best, best_similarity)
+            if best < 0:
+                new_clusters[best]["size"] += 1
+            else:
+                grown[best] = grown.get(best, 0) + 1
+            continue
+        # A new cluster represented by this comment; later comments in the batch can join it
+        pending = -comment.id
+        matches[comment.id] = (pending, 1.0)
+        cluster_signatures[pending] = signature
+        new_clusters[pending] = {
+            "bill_id": comment.bill_id, "representative_id": comment.id, "size": 1, "signature": signature.tobytes(),
+        }
+        for key in keys[comment.id]:
+            buckets.setdefault(key, pending)
+
+    created = {}
+    if new_clusters:
+        created = {
+            -representative_id: cluster_id
+            for cluster_id, representative_id in db.execute(
+                insert(CommentCluster).returning(CommentCluster.id, CommentCluster.representative_id),
+                list(new_clusters.values()),
+            )
+        }
+        new_buckets = [
+            {"bill_id": key[0], "band": key[1], "bucket": key[2], "cluster_id": created[cluster_id]}
+            for key, cluster_id in buckets.items() if cluster_id < 0
+        ]
+        # A concurrent writer may have taken a bucket; the earlier cluster keeps it
+        db.execute(dialect_insert(db)(CommentClusterBucket).on_conflict_do_nothing(), new_buckets)
+
+    assignments = {
+        comment_id: ClusterAssignment(created.get(cluster_id, cluster_id), score, cluster_id < 0 and comment_id == -cluster_id)
+        for comment_id, (cluster_id, score) in matches.items()
+    }
+    db.execute(insert(CommentClusterMember), [
+        {"comment_id": comment_id, "cluster_id": assignment.cluster_id, "similarity": assignment.similarity}
+        for comment_id, assignment in assignments.items()
+    ])
+    for cluster_id, count in grown.items():
+        db.execute(update(CommentCluster).where(CommentCluster.id == cluster_id)
+                   .values(size=CommentCluster.size + count, updated_at=func.now()))
+    return assignments
+
+
+def uncluster_comments(db: Session, comment_ids: List[int]):
+    """
+    Take comments out of their clusters, before they are deleted or clustered again.
+    A cluster that loses its representative is represented by its earliest remaining
+    member; one left empty is deleted. Runs in the caller's transaction.
+    """
+    members = db.execute(
+        select(CommentClusterMember.cluster_id, func.count())
+        .where(CommentClusterMember.comment_id.in_(comment_ids))
+        .group_by(CommentClusterMember.cluster_id)
+    ).all()
+    if not members:
+        return
+    cluster_ids = [cluster_id for cluster_id, _ in members]
+    for cluster_id, count in members:
+        db.execute(update(CommentCluster).where(CommentCluster.id == cluster_id)
+                   .values(size=CommentCluster.size - count, updated_at=func.now()))
+    db.execute(delete(CommentClusterMember).where(CommentClusterMember.comment_id.in_(comment_ids)))
+    db.execute(
+        update(CommentCluster)
+        .where(CommentCluster.id.in_(cluster_ids), CommentCluster.representative_id.in_(comment_ids))
+        .values(representative_id=select(func.min(CommentClusterMember.comment_id))
+                .where(CommentClusterMember.cluster_id == CommentCluster.id)
+                .scalar_subquery())
+    )
+    empty = select(CommentCluster.id).where(CommentCluster.id.in_(cluster_ids), CommentCluster.size <= 0)
+    db.execute(delete(CommentClusterBucket).where(CommentClusterBucket.cluster_id.in_(empty)))
+    db.execute(delete(CommentCluster).where(CommentCluster.id.in_(empty)))
+
+
+def comment_cluster_ids(db: Session, comment_ids: List[int]) -> List[int]:
+    """The clusters the comments belong to"""
+    return list(db.scalars(
+        select(CommentClusterMember.cluster_id.distinct()).where(CommentClusterMember.comment_id.in_(comment_ids))
+    ))
+
+
+def cluster_representatives(db: Session, comment_ids: List[int], cluster_ids: Iterable[int] = ()) -> List[dict]:
+    """
+    Graph properties of the clusters the comments belong to, and of the given clusters
+    that still exist: one node per cluster, the representative comment, with the
+    cluster's size.
+    """
+    rows = db.execute(
+        select(Comment, CommentCluster.size)
+        .join(CommentCluster, CommentCluster.representative_id == Comment.id)
+        .where(or_(
+            CommentCluster.id.in_(
+                select(CommentClusterMember.cluster_id).where(CommentClusterMember.comment_id.in_(comment_ids))
+            ),
+            CommentCluster.id.in_(list(cluster_ids)),
+        ))
+    ).all()
+    return [comment_properties(comment, cluster_size=size) for comment, size in rows]
+
+
+def get_bill_clusters(db: Session, bill_id: int, min_size: int = 2, limit: int = 50) -> List[dict]:
+    """A bill's largest near-duplicate clusters, with their representative text"""
+    rows = db.execute(
+        select(CommentCluster.id, CommentCluster.size, CommentCluster.representative_id, Comment.text)
+        .outerjoin(Comment, Comment.id == CommentCluster.representative_id)
+        .where(CommentCluster.bill_id == bill_id, CommentCluster.size >= min_size)
+        .order_by(CommentCluster.size.desc(), CommentCluster.id)
+        .limit(limit)
+    ).all()
+    return [
+        {"cluster_id": id, "size": size, "representative_id": representative_id, "text": text}
+        for id, size, representative_id, text in rows
+    ]
@@ -0,0 +1,166 @@
+from typing import Iterator, List, TextIO, Tuple, Union
+import csv
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from app.models.models import Bill, Comment, User
+from app.schemas.comment import CommentImport
+from app.services.comment_clusters import cluster_comments
+from app.services.comment_stats import apply_comment_changes
+from app.services.graph_writer import enqueue_comment_clusters
+
+logger = logging.getLogger(__name__)
+
+NDJSON = "ndjson"
+CSV = "csv"
+FORMATS = (NDJSON, CSV)
+
+# Rows validated and inserted per statement and transaction
+IMPORT_BATCH_SIZE = 1000
+# Rejected rows reported back individually; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportReport:
+    received: int = 0
+    inserted: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+    errors: List[dict] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.received / self.seconds if self.seconds > 0 else 0.0
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+def detect_format(filename: str = None, content_type: str = None) -> str:
+    """CSV for .csv files or text/csv, NDJSON otherwise"""
+    if (filename or "").lower().endswith(".csv") or (content_type or "").startswith("text/csv"):
+        return CSV
+    return NDJSON
+
+
+def read_rows(stream: TextIO, format: str) -> Iterator[Tuple[int, Union[str, dict]]]:
+    """
+    Yields (line number, raw row) from an NDJSON or CSV stream, without loading it whole.
+    CSV streams need a header row naming the CommentImport fields.
+    """
+    if format == CSV:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Empty cells are missing values
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in (None, "")}
+    else:
+        for line, text in enumerate(stream, start=1):
+            if text.strip():
+                yield line, text
+
+
+def _parse(raw: Union[str, dict]) -> CommentImport:
+    return CommentImport.model_validate(json.loads(raw) if isinstance(raw, str) else raw)
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+    return str(error)
+
+
+def _known_ids(db: Session, column, ids: set) -> set:
+    if not ids:
+        return set()
+    return set(db.execute(select(column).where(column.in_(ids))).scalars())
+
+
+def _insert_batch(db: Session, batch: list, user_id: int, report: ImportReport):
+    rows = []
+    for line, raw in batch:
+        try:
+            rows.append((line, _parse(raw)))
+        except (ValueError, ValidationError) as e:
+            report.reject(line, _describe(e))
+
+    # One lookup per batch for the bills and users the rows refer to
+    bills = _known_ids(db, Bill.id, {row.bill_id for _, row in rows})
+    users = _known_ids(db, User.id, {row.user_id for _, row in rows if row.user_id is not None})
+    now = datetime.now(timezone.utc)
+    values = []
+    for line, row in rows:
+        if row.bill_id not in bills:
+            report.reject(line, f"Bill {row.bill_id} not found")
+        elif row.user_id is not None and row.user_id not in users:
+            report.reject(line, f"User {row.user_id} not found")
+        else:
+            values.append({
+                "text": row.text,
+                "bill_id": row.bill_id,
+                "user_id": row.user_id or user_id,
+                "created_at": row.created_at or now,
+            })
+    if not values:
+        return
+
+    # A multi-row INSERT ... RETURNING per batch instead of a round trip per comment
+    inserted = db.execute(
+        insert(Comment).returning(Comment.id, Comment.text, Comment.bill_id, Comment.created_at),
+        values,
+    ).all()
+    apply_comment_changes(db, added=[(comment.bill_id, comment.created_at) for comment in inserted])
+    cluster_comments(db, inserted)
+    db.commit()
+    report.inserted += len(inserted)
+    # One graph node per near-duplicate cluster, however many comments joined it
+    enqueue_comment_clusters(db, [comment.id for comment in inserted])
+
+
+def import_comments(
+    db: Session,
+    stream: TextIO,
+    *,
+    format: str,
+    user_id: int,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> ImportReport:
+    """
+    Import comments from an NDJSON or CSV stream in batches. Invalid rows, and rows
+    for unknown bills or users, are rejected and reported without stopping the import.
+    Rows without a user_id are attributed to `user_id`.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+    batch = []
+    for line, raw in read_rows(stream, format):
+        report.received += 1
+        batch.append((line, raw))
+        if len(batch) >= batch_size:
+            _insert_batch(db, batch, user_id, report)
+            batch = []
+    if batch:
+        _insert_batch(db, batch, user_id, report)
+    report.seconds = time.perf_counter() - started
+    logger.info(
+        f"Imported {report.inserted} of {report.received} comments "
+        f"({report.rejected} rejected) in {report.seconds:.1f}s, {report.rows_per_second:.0f} rows/s"
+    )
+    return report
@@ -0,0 +1,235 @@
+from typing import Callable, List, NamedTuple, Optional
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Comment, CommentScore, ScoringState
+
+logger = logging.getLogger(__name__)
+
+POSITIVE = "positive"
+NEGATIVE = "negative"
+NEUTRAL = "neutral"
+# Scores within this distance of zero are neutral
+NEUTRAL_BAND = 0.05
+
+POSITIVE_WORDS = {
+    "good", "great", "excellent", "support", "supports", "supported", "agree", "welcome", "fair",
+    "benefit", "benefits", "beneficial", "improve", "improves", "improvement", "helpful", "positive",
+    "progress", "approve", "endorse", "commend", "appreciate", "thank", "thanks", "protect", "protects",
+    "transparent", "affordable", "relief", "best", "better", "useful", "effective", "happy", "hope",
+    "nzuri", "asante", "sawa",
+}
+NEGATIVE_WORDS = {
+    "bad", "poor", "oppose", "opposes", "opposed", "against", "reject", "unfair", "burden", "punitive",
+    "corrupt", "corruption", "expensive", "harm", "harmful", "hurt", "hurts", "worse", "worst", "fail",
+    "fails", "failure", "exploit", "exploitative", "unjust", "unconstitutional", "scrap", "withdraw",
+    "overtax", "overtaxed", "suffer", "suffering", "angry", "disappointed", "concern", "concerned",
+    "problem", "wrong", "illegal", "mbaya", "hapana",
+}
+NEGATIONS = {"not", "no", "never", "nor", "without", "don't", "doesn't", "isn't", "won't", "cannot", "can't"}
+INTENSIFIERS = {"very": 1.5, "extremely": 2.0, "really": 1.5, "totally": 1.5, "strongly": 1.5, "completely": 1.5}
+# Words after a negation whose polarity is flipped
+NEGATION_SCOPE = 3
+
+TOPICS = {
+    "tax": {"tax", "taxes", "taxation", "vat", "levy", "levies", "duty", "excise", "kra", "revenue"},
+    "health": {"health", "hospital", "hospitals", "medical", "nhif", "shif", "doctors", "medicine", "insurance"},
+    "education": {"education", "school", "schools", "university", "students", "teachers", "fees", "helb"},
+    "agriculture": {"farmers", "farming", "agriculture", "crops", "fertilizer", "maize", "livestock", "food"},
+    "housing": {"housing", "houses", "rent", "landlords", "mortgage", "affordable"},
+    "employment": {"jobs", "employment", "unemployment", "salary", "salaries", "wages", "workers", "youth"},
+    "business": {"business", "businesses", "traders", "sme", "smes", "trade", "import", "imports", "export"},
+    "transport": {"fuel", "transport", "roads", "matatu", "petrol", "diesel", "boda"},
+    "governance": {"government", "parliament", "mps", "corruption", "accountability", "county", "counties"},
+    "environment": {"environment", "climate", "forest", "forests", "pollution", "water", "plastic"},
+}
+
+# Keyword -> topic, so each word is looked up once
+TOPIC_OF = {keyword: topic for topic, keywords in TOPICS.items() for keyword in keywords}
+
+WORDS = re.compile(r"[a-z']+")
+
+
+class CommentScores(NamedTuple):
+    sentiment: float
+    label: str
+    topic: Optional[str]
+
+
+class LexiconScorer:
+    """
+    Word-list sentiment and topic scorer: fast, CPU only and explainable.
+
+    Sentiment sums word polarities, flipping the words just after a negation and
+    boosting those after an intensifier, and squashes the sum into [-1, 1]. The topic
+    is the one whose keywords occur most often, if any do.
+    """
+
+    name = "lexicon-v1"
+
+    def score(self, text: str) -> CommentScores:
+        words = WORDS.findall(text.lower())
+        total = 0.0
+        negated = 0
+        boost = 1.0
+        topics = Counter()
+        for word in words:
+            if word in NEGATIONS:
+                negated = NEGATION_SCOPE
+                continue
+            if word in INTENSIFIERS:
+                boost = INTENSIFIERS[word]
+                continue
+            polarity = (word in POSITIVE_WORDS) - (word in NEGATIVE_WORDS)
+            if polarity:
+                total += polarity * boost * (-1 if negated else 1)
+            topic = TOPIC_OF.get(word)
+            if topic:
+                topics[topic] += 1
+            boost = 1.0
+            negated = max(0, negated - 1)
+        sentiment = total / math.sqrt(total * total + 15)
+        if sentiment > NEUTRAL_BAND:
+            label = POSITIVE
+        elif sentiment < -NEUTRAL_BAND:
+            label = NEGATIVE
+        else:
+            label = NEUTRAL
+        topic = topics.most_common(1)[0][0] if topics else None
+        return CommentScores(round(sentiment, 4), label, topic)
+
+    def score_batch(self, texts: List[str]) -> List[CommentScores]:
+        return [self.score(text or "") for text in texts]
+
+
+def score_new_comments(
+    db: Session,
+    scorer=None,
+    *,
+    batch_size: int = settings.COMMENT_SCORING_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+) -> int:
+    """
+    Score the comments that have no score yet, in batches of `batch_size`.
+
+    Comments are picked with an anti-join on comment_scores rather than from a
+    high-water mark, so a comment whose transaction commits after higher ids were
+    scored (a long bulk import, a slow request) is picked up by the next run. Each
+    batch is committed with its scores, so every comment is scored once even if
+    the run stops part way. Editing a comment deletes its score, and it is scored again.
+    Returns the number of comments scored.
+    """
+    scorer = scorer or LexiconScorer()
+    scored = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        # Locks the state row so concurrent runs take turns
+        state = db.execute(
+            select(ScoringState).where(ScoringState.name == scorer.name).with_for_update()
+        ).scalar_one_or_none()
+        if state is None:
+            state = ScoringState(name=scorer.name)
+            db.add(state)
+            db.flush()
+        rows = db.execute(
+            select(Comment.id, Comment.bill_id, Comment.text)
+            .outerjoin(CommentScore, CommentScore.comment_id == Comment.id)
+            .where(CommentScore.comment_id.is_(None))
+            .order_by(Comment.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            db.commit()
+            break
+        started = time.perf_counter()
+        scores = scorer.score_batch([row.text for row in rows])
+        now = datetime.now(timezone.utc)
+        db.execute(insert(CommentScore), [
+            {
+                "comment_id": row.id,
+                "bill_id": row.bill_id,
+                "sentiment": score.sentiment,
+                "label": score.label,
+                "topic": score.topic,
+                "scorer": scorer.name,
+                "scored_at": now,
+            }
+            for row, score in zip(rows, scores)
+        ])
+        state.updated_at = now
+        db.commit()
+        scored += len(rows)
+        batches += 1
+        logger.debug(f"Scored {len(rows)} comments up to id {rows[-1].id} in {time.perf_counter() - started:.3f}s")
+    if scored:
+        logger.info(f"Scored {scored} comments with {scorer.name}")
+    return scored
+
+
+def get_bill_sentiment(db: Session, bill_id: int) -> dict:
+    """Sentiment and topic distribution of a bill's scored comments"""
+    labels = db.execute(
+        select(CommentScore.label, func.count(), func.avg(CommentScore.sentiment))
+        .where(CommentScore.bill_id == bill_id)
+        .group_by(CommentScore.label)
+    ).all()
+    topics = db.execute(
+        select(CommentScore.topic, func.count())
+        .where(CommentScore.bill_id == bill_id, CommentScore.topic.is_not(None))
+        .group_by(CommentScore.topic)
+        .order_by(func.count().desc())
+    ).all()
+    scored = sum(count for _, count, _ in labels)
+    total = sum(count * average for _, count, average in labels)
+    return {
+        "bill_id": bill_id,
+        "scored": scored,
+        "average_sentiment": round(total / scored, 4) if scored else None,
+        "labels": {label: count for label, count, _ in labels},
+        "topics": {topic: count for topic, count in topics},
+    }
+
+
+class CommentScoringWorker:
+    """Runs score_new_comments every `interval` seconds on a background thread"""
+
+    def __init__(self, session_factory: Callable[[], Session], interval: float = settings.COMMENT_SCORING_INTERVAL, scorer=None):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.scorer = scorer or LexiconScorer()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="comment-scoring", daemon=True)
+            self._thread.start()
+
+    def run_once(self) -> int:
+        db = self.session_factory()
+        try:
+            return score_new_comments(db, self.scorer)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Comment scoring failed, retrying in {self.interval:.0f}s: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
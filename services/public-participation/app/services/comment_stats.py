@@ -0,0 +1,177 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.models.models import BillCommentDaily, BillCommentStats, Comment
+
+logger = logging.getLogger(__name__)
+
+# Rows written per statement when rebuilding
+REBUILD_BATCH_SIZE = 5000
+
+
+def comment_day(created_at: datetime) -> date:
+    """The UTC day a comment counts towards"""
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+
+def dialect_insert(db: Session):
+    """The insert construct of the session's dialect, which supports ON CONFLICT"""
+    # Both dialects share the ON CONFLICT upsert syntax; SQLite is used by the tests
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+
+def apply_comment_changes(
+    db: Session,
+    added: Iterable[Tuple[int, datetime]] = (),
+    removed: Iterable[Tuple[int, datetime]] = (),
+):
+    """
+    Fold added and removed comments, as (bill_id, created_at), into the aggregates.
+    Runs in the caller's transaction, so the aggregates commit with the comments.
+    """
+    totals = Counter()
+    days = Counter()
+    latest: Dict[int, Optional[datetime]] = {}
+    for sign, comments in ((1, added), (-1, removed)):
+        for bill_id, created_at in comments:
+            if bill_id is None:
+                continue
+            totals[bill_id] += sign
+            if created_at is not None:
+                days[bill_id, comment_day(created_at)] += sign
+                if sign > 0 and (latest.get(bill_id) is None or created_at > latest[bill_id]):
+                    latest[bill_id] = created_at
+            latest.setdefault(bill_id, None)
+    if not latest:
+        return
+    upsert = dialect_insert(db)
+
+    stmt = upsert(BillCommentStats).values([
+        {"bill_id": bill_id, "comment_count": totals[bill_id], "last_comment_at": latest[bill_id]}
+        for bill_id in sorted(latest)
+    ])
+    excluded = stmt.excluded
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[BillCommentStats.bill_id],
+        set_={
+            "comment_count": BillCommentStats.comment_count + excluded.comment_count,
+            "last_comment_at": case(
+                (BillCommentStats.last_comment_at.is_(None), excluded.last_comment_at),
+                (excluded.last_comment_at > BillCommentStats.last_comment_at, excluded.last_comment_at),
+                else_=BillCommentStats.last_comment_at,
+            ),
+        },
+    ))
+
+    changed_days = [(key, count) for key, count in sorted(days.items()) if count]
+    if changed_days:
+        stmt = upsert(BillCommentDaily).values([
+            {"bill_id": bill_id, "day": day, "comment_count": count}
+            for (bill_id, day), count in changed_days
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[BillCommentDaily.bill_id, BillCommentDaily.day],
+            set_={"comment_count": BillCommentDaily.comment_count + stmt.excluded.comment_count},
+        ))
+
+    removed_from = sorted({bill_id for (bill_id, _), count in days.items() if count < 0} |
+                          {bill_id for bill_id, count in totals.items() if count < 0})
+    if removed_from:
+        db.execute(delete(BillCommentDaily).where(
+            BillCommentDaily.bill_id.in_(removed_from), BillCommentDaily.comment_count <= 0
+        ))
+        # The latest comment may be gone; found again through ix_comments_bill_id_created_at
+        db.execute(
+            update(BillCommentStats)
+            .where(BillCommentStats.bill_id.in_(removed_from))
+            .values(last_comment_at=select(func.max(Comment.created_at))
+                    .where(Comment.bill_id == BillCommentStats.bill_id)
+                    .scalar_subquery())
+        )
+
+
+def get_bill_comment_stats(db: Session, bill_id: int, days: int = 30) -> Optional[dict]:
+    """
+    Comment count, latest comment time and the last `days` days of volume of a bill,
+    read from the aggregates. None if the bill has no comments.
+    """
+    stats = db.get(BillCommentStats, bill_id)
+    if stats is None:
+        return None
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    daily = db.execute(
+        select(BillCommentDaily.day, BillCommentDaily.comment_count)
+        .where(BillCommentDaily.bill_id == bill_id, BillCommentDaily.day >= since)
+        .order_by(BillCommentDaily.day)
+    ).all()
+    return {
+        "bill_id": bill_id,
+        "comment_count": stats.comment_count,
+        "last_comment_at": stats.last_comment_at,
+        "daily": [{"day": day, "comment_count": count} for day, count in daily],
+    }
+
+
+def rebuild_comment_stats(db: Session, bill_id: Optional[int] = None) -> int:
+    """
+    Recompute the aggregates from the comments table, for one bill or all of them,
+    in a single transaction. Returns the number of bills with comments.
+    """
+    stats_filter = [BillCommentStats.bill_id == bill_id] if bill_id is not None else []
+    daily_filter = [BillCommentDaily.bill_id == bill_id] if bill_id is not None else []
+    db.execute(delete(BillCommentStats).where(*stats_filter))
+    db.execute(delete(BillCommentDaily).where(*daily_filter))
+
+    query = select(Comment.bill_id, Comment.created_at).where(Comment.bill_id.is_not(None))
+    if bill_id is not None:
+        query = query.where(Comment.bill_id == bill_id)
+    rows = db.execute(query.order_by(Comment.bill_id).execution_options(yield_per=REBUILD_BATCH_SIZE))
+
+    # Comments arrive grouped by bill, so only one bill's days are held at a time
+    stats: List[dict] = []
+    daily: List[dict] = []
+    bills = 0
+    current, count, latest, days = None, 0, None, Counter()
+
+    def finish():
+        stats.append({"bill_id": current, "comment_count": count, "last_comment_at": latest})
+        daily.extend({"bill_id": current, "day": day, "comment_count": n} for day, n in sorted(days.items()))
+
+    for row_bill_id, created_at in rows:
+        if row_bill_id != current:
+            if current is not None:
+                finish()
+                bills += 1
+            current, count, latest, days = row_bill_id, 0, None, Counter()
+            if len(stats) >= REBUILD_BATCH_SIZE or len(daily) >= REBUILD_BATCH_SIZE:
+                _write(db, stats, daily)
+        count += 1
+        if created_at is not None:
+            days[comment_day(created_at)] += 1
+            if latest is None or created_at > latest:
+                latest = created_at
+    if current is not None:
+        finish()
+        bills += 1
+    _write(db, stats, daily)
+    db.commit()
+    logger.info(f"Rebuilt comment aggregates of {bills} bills")
+    return bills
+
+
+def _write(db: Session, stats: List[dict], daily: List[dict]):
+    if stats:
+        db.execute(insert(BillCommentStats), stats)
+        stats.clear()
+    if daily:
+        db.execute(insert(BillCommentDaily), daily)
+        daily.clear()
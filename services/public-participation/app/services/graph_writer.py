@@ -0,0 +1,323 @@
+from typing import Callable, Dict, List, Optional
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Bill, Comment
+from app.services.comment_clusters import cluster_representatives
+from app.services.neo4j_service import bill_properties, comment_properties, neo4j_service
+
+logger = logging.getLogger(__name__)
+
+BILL = "bill"
+COMMENT = "comment"
+DELETED_COMMENT = "deleted_comment"
+KINDS = (BILL, COMMENT, DELETED_COMMENT)
+# A comment's latest event wins, whether it writes or deletes its node
+_OPPOSITE = {COMMENT: DELETED_COMMENT, DELETED_COMMENT: COMMENT}
+# Suffixes of a writer's files after the spool path: "<pid>" (live spool),
+# "<pid>.<ns>" (sealed spool) and "<pid>.lock" (held while the writer runs)
+_SPOOL_FILE = re.compile(r"(\d+)(?:\.(\d+)|\.lock)?")
+
+
+class GraphWriter:
+    """
+    Write-behind queue for knowledge graph updates, so API requests never wait on Neo4j.
+
+    Events are coalesced by node (the latest properties of a bill or comment, or the
+    deletion of a comment, win) and written with UNWIND batches of up to `batch_size`
+    nodes, once `batch_size` events are pending or the oldest has waited
+    `flush_interval` seconds. A failed batch is retried with exponential backoff.
+
+    Every event is appended to a JSON lines spool before it is acknowledged. A spool
+    file is deleted only once all its events are in the graph; files left behind by a
+    crash or an outage are replayed when the writer next starts.
+
+    Each process writes its own spool, `spool_path` suffixed with its pid, and holds a
+    lock on it while it runs. A starting writer adopts only the spools whose lock is
+    free, those of writers that exited or crashed, never a running worker's.
+    """
+
+    def __init__(
+        self,
+        write_batch: Optional[Callable[..., None]] = None,
+        spool_path: str = settings.GRAPH_SPOOL_PATH,
+        batch_size: int = settings.GRAPH_BATCH_SIZE,
+        flush_interval: float = settings.GRAPH_FLUSH_INTERVAL,
+        max_backoff: float = 60.0,
+        fsync: bool = settings.GRAPH_SPOOL_FSYNC,
+    ):
+        self.write_batch = write_batch or neo4j_service.write_batch
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.fsync = fsync
+
+        self._pending = {kind: OrderedDict() for kind in KINDS}  # kind -> id -> properties
+        self._first_pending_at = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._path = None  # this process's spool, set on start
+        self._owner_lock = None
+        self._spool = None
+        self._sealed = []  # spool files whose events are all pending
+        self._failures = 0
+        self._retry_at = 0.0
+        self._closed = False
+        self._thread = None
+        self._stats = {"enqueued": 0, "coalesced": 0, "written": 0, "batches": 0, "failures": 0}
+
+    def _size(self) -> int:
+        return sum(len(nodes) for nodes in self._pending.values())
+
+    def _add(self, kind: str, properties: dict):
+        nodes = self._pending[kind]
+        replaced = nodes.pop(properties["id"], None) is not None
+        if kind in _OPPOSITE:
+            replaced |= self._pending[_OPPOSITE[kind]].pop(properties["id"], None) is not None
+        if replaced:
+            self._stats["coalesced"] += 1
+        nodes[properties["id"]] = properties
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+
+    def start(self):
+        """Replay any spooled events and start the flush thread (called on first use)"""
+        with self._condition:
+            if self._thread is not None or self._closed:
+                return
+            directory = os.path.dirname(self.spool_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Taken on start rather than on import: workers fork after importing the app
+            self._path = f"{self.spool_path}.{os.getpid()}"
+            self._owner_lock = self._try_lock(f"{self._path}.lock")
+            if self._owner_lock is None:
+                logger.warning(f"Graph spool {self._path} is already used by another writer in this process")
+            self._recover()
+            self._open_spool()
+            self._thread = threading.Thread(target=self._run, name="graph-writer", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _try_lock(path: str):
+        """Opens and locks the file, or returns None if another writer holds it"""
+        f = open(path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def _adopt(self) -> List[str]:
+        """
+        Moves the spool files of writers that are not running (including an earlier
+        process with this pid) under this writer's spool. Returns them, oldest first.
+        """
+        owners = {}
+        for path in glob.glob(f"{glob.escape(self.spool_path)}.*"):
+            match = _SPOOL_FILE.fullmatch(path[len(self.spool_path) + 1:])
+            if match:
+                owners.setdefault(match.group(1), []).append((path, match.group(2)))
+        adopted = []
+        for pid, files in owners.items():
+            base = f"{self.spool_path}.{pid}"
+            lock = None
+            if base != self._path:
+                lock = self._try_lock(f"{base}.lock")
+                if lock is None:
+                    # A running writer's spool
+                    continue
+            for path, sealed_at in files:
+                if path.endswith(".lock"):
+                    continue
+                # A live spool is sealed now; its events are newer than its sealed files'
+                target = f"{self._path}.{sealed_at or time.time_ns()}"
+                os.replace(path, target)
+                adopted.append(target)
+            if lock is not None:
+                os.remove(f"{base}.lock")
+                lock.close()
+        return sorted(adopted, key=lambda path: int(path.rsplit(".", 1)[1]))
+
+    def _recover(self):
+        # One writer recovers at a time, so a spool is adopted once
+        with open(f"{self.spool_path}.lock", "a") as recovery:
+            fcntl.flock(recovery, fcntl.LOCK_EX)
+            files = self._adopt()
+        replayed = 0
+        for path in files:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash
+                        logger.warning(f"Skipping a damaged event in {path}")
+                        continue
+                    self._add(event["kind"], event["properties"])
+                    replayed += 1
+            self._sealed.append(path)
+        if replayed:
+            logger.info(f"Replaying {replayed} spooled graph events ({self._size()} nodes)")
+
+    def _open_spool(self):
+        try:
+            self._spool = open(self._path, "a", encoding="utf-8")
+        except OSError as e:
+            self._spool = None
+            logger.error(f"Cannot open graph spool {self._path}, events are kept in memory only: {e}")
+
+    def _seal(self) -> List[str]:
+        """Close the current spool file and return every file covered by the pending events"""
+        if self._spool is not None and self._spool.tell():
+            self._spool.close()
+            sealed = f"{self._path}.{time.time_ns()}"
+            os.replace(self._path, sealed)
+            self._sealed.append(sealed)
+            self._open_spool()
+        files, self._sealed = self._sealed, []
+        return files
+
+    def enqueue(self, kind: str, properties: dict):
+        """Queue a bill or comment node, or a comment node's deletion, for the graph"""
+        if self._thread is None:
+            self.start()
+        with self._condition:
+            if self._spool is not None:
+                try:
+                    self._spool.write(json.dumps({"kind": kind, "properties": properties}) + "\n")
+                    self._spool.flush()
+                    if self.fsync:
+                        os.fsync(self._spool.fileno())
+                except OSError as e:
+                    logger.error(f"Cannot write to graph spool {self._path}: {e}")
+            self._add(kind, properties)
+            self._stats["enqueued"] += 1
+            if self._size() >= self.batch_size:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    now = time.monotonic()
+                    size = self._size()
+                    due = self._first_pending_at is not None and now - self._first_pending_at >= self.flush_interval
+                    if size and now >= self._retry_at and (size >= self.batch_size or due):
+                        break
+                    timeout = None
+                    if size:
+                        timeout = max(self._retry_at, self._first_pending_at + self.flush_interval) - now
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self) -> bool:
+        """Write every pending event to the graph. Returns False if the write failed"""
+        with self._flush_lock:
+            with self._condition:
+                batch = self._pending
+                self._pending = {kind: OrderedDict() for kind in KINDS}
+                self._first_pending_at = None
+                files = self._seal()
+            bills = list(batch[BILL].values())
+            comments = list(batch[COMMENT].values())
+            deleted = list(batch[DELETED_COMMENT])
+            written = len(bills) + len(comments) + len(deleted)
+            try:
+                # All bills before any comment, so comments find their bill
+                for start in range(0, len(bills), self.batch_size):
+                    self.write_batch(bills[start:start + self.batch_size], [])
+                for start in range(0, len(comments), self.batch_size):
+                    self.write_batch([], comments[start:start + self.batch_size])
+                for start in range(0, len(deleted), self.batch_size):
+                    self.write_batch([], [], deleted[start:start + self.batch_size])
+            except Exception as e:
+                with self._condition:
+                    # Events queued meanwhile are newer and win
+                    for kind, nodes in self._pending.items():
+                        for id, properties in nodes.items():
+                            batch[kind].pop(id, None)
+                            if kind in _OPPOSITE:
+                                batch[_OPPOSITE[kind]].pop(id, None)
+                            batch[kind][id] = properties
+                    self._pending = batch
+                    self._first_pending_at = self._first_pending_at or time.monotonic()
+                    self._sealed[:0] = files
+                    self._failures += 1
+                    self._stats["failures"] += 1
+                    backoff = min(self.max_backoff, self.flush_interval * 2 ** self._failures)
+                    self._retry_at = time.monotonic() + backoff
+                logger.warning(f"Graph write of {written} nodes failed, retrying in {backoff:.0f}s: {e}")
+                return False
+
+            with self._condition:
+                self._failures = 0
+                self._retry_at = 0.0
+                self._stats["written"] += written
+                self._stats["batches"] += bool(written)
+            for path in files:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Cannot remove graph spool file {path}: {e}")
+            return True
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return dict(self._stats, pending=self._size(), consecutive_failures=self._failures)
+
+    def close(self):
+        """Stop the flush thread and try a final flush; anything unwritten stays spooled"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is None:
+            return
+        thread.join()
+        self.flush()
+        with self._condition:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+            if self._owner_lock is not None:
+                # Anything still spooled can now be adopted by the next writer to start
+                self._owner_lock.close()
+                self._owner_lock = None
+
+
+graph_writer = GraphWriter()
+
+def enqueue_bill(bill: Bill):
+    graph_writer.enqueue(BILL, bill_properties(bill))
+
+def enqueue_comment(comment: Comment):
+    graph_writer.enqueue(COMMENT, comment_properties(comment))
+
+def enqueue_comment_clusters(
+    db: Session, comment_ids: List[int], cluster_ids: List[int] = (), removed: List[int] = ()
+):
+    """
+    Queue the near-duplicate clusters of comments, and the given clusters, for the graph:
+    one node each, its representative with the cluster size. The nodes of `removed`
+    comments are deleted unless they still represent a cluster.
+    """
+    written = set()
+    for properties in cluster_representatives(db, comment_ids, cluster_ids):
+        graph_writer.enqueue(COMMENT, properties)
+        written.add(properties["id"])
+    for comment_id in removed:
+        if comment_id not in written:
+            graph_writer.enqueue(DELETED_COMMENT, {"id": comment_id})
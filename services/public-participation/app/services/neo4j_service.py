@@ -1,17 +1,56 @@
+import threading
 from typing import Dict, List
 from neo4j import GraphDatabase
 from app.core.config import settings
 from app.models.models import Bill, Comment
 
+def bill_properties(bill: Bill) -> dict:
+    return {
+        "id": bill.id,
+        "title": bill.title,
+        "description": bill.description,
+        "status": bill.status,
+        "created_at": str(bill.created_at),
+    }
+
+def comment_properties(comment: Comment, cluster_size: int = 1) -> dict:
+    return {
+        "id": comment.id,
+        "text": comment.text,
+        "bill_id": comment.bill_id,
+        "created_at": str(comment.created_at),
+        "cluster_size": cluster_size,
+    }
+
 class Neo4jService:
     def __init__(self):
-        self.driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
+        # The driver is created on first use so importing the app never touches Neo4j
+        self._driver = None
+        self._lock = threading.Lock()
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            with self._lock:
+                if self._driver is None:
+                    self._driver = GraphDatabase.driver(
+                        settings.NEO4J_URI,
+                        auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+                    )
+        return self._driver
+
+    def ping(self) -> bool:
+        """Check that Neo4j is reachable"""
+        try:
+            self.driver.verify_connectivity()
+            return True
+        except Exception:
+            return False
 
     def close(self):
-        self.driver.close()
+        if self._driver is not None:
+            self._driver.close()
+            self._driver = None
 
     def add_bill(self, bill: Bill):
         with self.driver.session() as session:
@@ -30,9 +69,7 @@ class Neo4jService:
             "b.status = $status, "
             "b.created_at = $created_at"
         )
-        tx.run(query, id=bill.id, title=bill.title,
-               description=bill.description, status=bill.status,
-               created_at=str(bill.created_at))
+        tx.run(query, **bill_properties(bill))
 
     @staticmethod
     def _create_comment_node(tx, comment: Comment):
@@ -40,12 +77,48 @@ class Neo4jService:
             "MATCH (b:Bill {id: $bill_id}) "
             "MERGE (c:Comment {id: $id}) "
             "SET c.text = $text, "
-            "c.created_at = $created_at "
+            "c.created_at = $created_at, "
+            "c.cluster_size = $cluster_size "
             "MERGE (c)-[:COMMENTS_ON]->(b)"
         )
-        tx.run(query, id=comment.id, text=comment.text,
-               bill_id=comment.bill_id,
-               created_at=str(comment.created_at))
+        tx.run(query, **comment_properties(comment))
+
+    def write_batch(self, bills: List[dict], comments: List[dict], deleted_comments: List[int] = ()):
+        """Write many bill and comment nodes, and delete comment nodes, in one transaction"""
+        with self.driver.session() as session:
+            session.write_transaction(self._write_batch, bills, comments, list(deleted_comments))
+
+    @staticmethod
+    def _write_batch(tx, bills: List[dict], comments: List[dict], deleted_comments: List[int]):
+        # Bills first, so comments in the same batch find their bill
+        if bills:
+            tx.run(
+                "UNWIND $bills AS bill "
+                "MERGE (b:Bill {id: bill.id}) "
+                "SET b.title = bill.title, "
+                "b.description = bill.description, "
+                "b.status = bill.status, "
+                "b.created_at = bill.created_at",
+                bills=bills,
+            )
+        if comments:
+            tx.run(
+                "UNWIND $comments AS comment "
+                "MATCH (b:Bill {id: comment.bill_id}) "
+                "MERGE (c:Comment {id: comment.id}) "
+                "SET c.text = comment.text, "
+                "c.created_at = comment.created_at, "
+                "c.cluster_size = comment.cluster_size "
+                "MERGE (c)-[:COMMENTS_ON]->(b)",
+                comments=comments,
+            )
+        if deleted_comments:
+            tx.run(
+                "UNWIND $ids AS id "
+                "MATCH (c:Comment {id: id}) "
+                "DETACH DELETE c",
+                ids=deleted_comments,
+            )
 
     def get_bill_graph(self, bill_id: int) -> Dict:
         with self.driver.session() as session:
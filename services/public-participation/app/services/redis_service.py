@@ -1,66 +1,439 @@
-from typing import Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from redis import Redis
+from redis.exceptions import RedisError
 from app.core.config import settings
 from app.models.models import Bill
-from app.schemas.bill import Bill as BillSchema
 
-class RedisService:
+logger = logging.getLogger(__name__)
+
+
+def bill_to_dict(bill: Bill) -> dict:
+    return {
+        "id": bill.id,
+        "title": bill.title,
+        "description": bill.description,
+        "status": bill.status,
+        "pdf_url": bill.pdf_url,
+        "created_at": str(bill.created_at),
+        "updated_at": str(bill.updated_at) if bill.updated_at else None,
+    }
+
+
+class LocalCache:
+    """In-process LRU cache with a short TTL, in front of Redis"""
+
+    def __init__(self, ttl: float = 2.0, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _Flight:
+    """An in-process load that other threads wait for, and take the result of"""
+
     def __init__(self):
-        self.redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.event = threading.Event()
+        self.done = False
+        self.value = None
+
+
+class RedisService:
+    """
+    Two-tier bill cache: a per-process LocalCache (L1, a few seconds) over Redis (L2).
+
+    Cached values are stored with the time it took to load them and their expiry, so
+    reads can refresh a popular key shortly before it expires (probabilistic early
+    expiration) instead of all missing at once. Misses are single-flight: one caller
+    per process loads the bill, and across processes only the holder of a short Redis
+    lock does, while the others wait for its result. Bills that do not exist are
+    cached as misses for `negative_ttl` seconds.
+
+    Writes go through the cache: the CRUD layer stores updated bills and removes
+    deleted ones. Each write first bumps a per-bill version, and a load drops what it
+    cached if the version moved while it ran, so a load that read the row before a
+    write committed cannot replace the written bill. Other processes may still serve
+    the previous bill from their L1 for up to `local_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        ttl: int = 3600,
+        local_ttl: float = 2.0,
+        lock_timeout: float = 5.0,
+        early_refresh_beta: float = 1.0,
+        negative_ttl: int = 30,
+    ):
+        # The client is created on first use so importing the app never touches Redis
+        self._redis = None
+        self._lock = threading.Lock()
         self.bill_prefix = "bill:"
-        self.ttl = 3600  # 1 hour cache
+        self.list_prefix = "bills:list:"
+        self.lock_prefix = "lock:"
+        self.version_prefix = "version:"
+        self.generation_key = f"{self.list_prefix}generation"
+        self.ttl = ttl  # 1 hour cache
+        self.negative_ttl = negative_ttl
+        self.lock_timeout = lock_timeout
+        self.early_refresh_beta = early_refresh_beta
+        self.local = LocalCache(ttl=local_ttl)
+        self._flights = {}  # key -> _Flight of the in-process load
+        self._flights_lock = threading.Lock()
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            with self._lock:
+                if self._redis is None:
+                    self._redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+
+    def ping(self) -> bool:
+        """Check that Redis is reachable"""
+        try:
+            return bool(self.redis.ping())
+        except RedisError:
+            return False
+
+    def bill_key(self, bill_id: int) -> str:
+        return f"{self.bill_prefix}{bill_id}"
+
+    def _envelope(self, value, load_seconds: float, ttl: Optional[int] = None) -> str:
+        return json.dumps({"v": value, "d": load_seconds, "e": time.time() + (ttl or self.ttl)})
+
+    def _should_refresh(self, envelope: dict) -> bool:
+        # XFetch: refresh early with a probability that rises as expiry nears,
+        # scaled by how long the value takes to load
+        delta = envelope.get("d") or 0.0
+        return time.time() - delta * self.early_refresh_beta * math.log(1.0 - random.random()) >= envelope.get("e", 0)
+
+    # Single values
+
+    def _set(self, key: str, value, load_seconds: float = 0.0):
+        self.local.set(key, value)
+        try:
+            self.redis.setex(key, self.ttl, self._envelope(value, load_seconds))
+        except RedisError as e:
+            logger.warning(f"Could not write {key} to Redis: {e}")
+
+    def _read_version(self, version_key: str) -> Optional[str]:
+        try:
+            return self.redis.get(version_key)
+        except RedisError as e:
+            logger.warning(f"Could not read {version_key} from Redis: {e}")
+            return None
+
+    def _bump_version(self, version_key: str):
+        try:
+            self.redis.incr(version_key)
+        except RedisError as e:
+            logger.warning(f"Could not bump {version_key} in Redis: {e}")
+
+    def _store_loaded(self, key: str, value, load_seconds: float, version_key: Optional[str] = None, version=None):
+        """
+        Cache a value read from the database, or a miss if it is None. If a writer
+        bumped `version_key` since `version` was read, before the load, the value may
+        predate the write and is removed again.
+        """
+        ttl = self.ttl if value is not None else self.negative_ttl
+        try:
+            self.redis.setex(key, ttl, self._envelope(value, load_seconds, ttl))
+            if version_key is not None and self.redis.get(version_key) != version:
+                self.redis.delete(key)
+                return
+        except RedisError as e:
+            logger.warning(f"Could not write {key} to Redis: {e}")
+        if value is not None:
+            self.local.set(key, value)
+
+    def _get_envelope(self, key: str) -> Optional[dict]:
+        try:
+            data = self.redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Could not read {key} from Redis: {e}")
+            return None
+        return json.loads(data) if data else None
+
+    def get(self, key: str):
+        """Get a value from L1, then Redis"""
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        envelope = self._get_envelope(key)
+        if envelope is None or envelope["v"] is None:
+            return None
+        self.local.set(key, envelope["v"])
+        return envelope["v"]
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[dict]], version_key: Optional[str] = None):
+        """
+        Get a value, loading it with `loader` on a miss (or an early refresh) with
+        single-flight locking. Returns None if the loader does. Writers of the value
+        bump `version_key`, if given, before writing it.
+        """
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        envelope = self._get_envelope(key)
+        if envelope is not None and not self._should_refresh(envelope):
+            if envelope["v"] is not None:
+                self.local.set(key, envelope["v"])
+            return envelope["v"]
+        stale = envelope["v"] if envelope is not None else None
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            # Another thread of this process is loading it, misses included
+            if flight.event.wait(self.lock_timeout) and flight.done:
+                return flight.value
+            value = self.get(key)
+            return value if value is not None else (stale if stale is not None else loader())
+
+        try:
+            flight.value = self._load_across_processes(key, loader, stale, version_key)
+            flight.done = True
+            return flight.value
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _load_across_processes(self, key: str, loader, stale, version_key: Optional[str] = None):
+        token = uuid.uuid4().hex
+        lock_key = f"{self.lock_prefix}{key}"
+        try:
+            locked = self.redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except RedisError:
+            locked = True  # Redis is down; every process loads for itself
+        if not locked:
+            if stale is not None:
+                # Someone else is refreshing; the current value is still valid
+                return stale
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                envelope = self._get_envelope(key)
+                if envelope is not None:
+                    if envelope["v"] is not None:
+                        self.local.set(key, envelope["v"])
+                    return envelope["v"]
+
+        started = time.perf_counter()
+        try:
+            version = self._read_version(version_key) if version_key is not None else None
+            value = loader()
+            self._store_loaded(key, value, time.perf_counter() - started, version_key, version)
+            return value
+        finally:
+            if locked:
+                try:
+                    # Only release the lock if it is still ours
+                    if self.redis.get(lock_key) == token:
+                        self.redis.delete(lock_key)
+                except RedisError:
+                    pass
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self.local.delete(key)
+        try:
+            self.redis.delete(*keys)
+        except RedisError as e:
+            logger.warning(f"Could not delete {keys} from Redis: {e}")
+
+    # Many values in one round trip
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """Get the cached values among `keys`: L1 first, the rest with one MGET"""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            try:
+                values = self.redis.mget(missing)
+            except RedisError as e:
+                logger.warning(f"Could not read {len(missing)} keys from Redis: {e}")
+                values = []
+            for key, data in zip(missing, values):
+                value = json.loads(data)["v"] if data else None
+                if value is not None:
+                    self.local.set(key, value)
+                    found[key] = value
+        return found
+
+    def set_many(self, items: Dict[str, dict]):
+        """Write many values with one pipelined round trip"""
+        if not items:
+            return
+        for key, value in items.items():
+            self.local.set(key, value)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(key, self.ttl, self._envelope(value, 0.0))
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Could not write {len(items)} keys to Redis: {e}")
+
+    # Bills
+
+    def bill_version_key(self, bill_id: int) -> str:
+        return f"{self.version_prefix}{self.bill_key(bill_id)}"
 
     def cache_bill(self, bill: Bill):
-        """Cache bill data in Redis"""
-        bill_data = {
-            "id": bill.id,
-            "title": bill.title,
-            "description": bill.description,
-            "status": bill.status,
-            "pdf_url": bill.pdf_url,
-            "created_at": str(bill.created_at),
-            "updated_at": str(bill.updated_at) if bill.updated_at else None,
-        }
-        self.redis.setex(
-            f"{self.bill_prefix}{bill.id}",
-            self.ttl,
-            json.dumps(bill_data)
-        )
+        """Cache bill data in Redis, once the write is committed"""
+        self._bump_version(self.bill_version_key(bill.id))
+        self._set(self.bill_key(bill.id), bill_to_dict(bill))
 
     def get_bill(self, bill_id: int) -> Optional[dict]:
-        """Get bill data from Redis cache"""
-        data = self.redis.get(f"{self.bill_prefix}{bill_id}")
-        if data:
-            return json.loads(data)
-        return None
+        """Get bill data from the cache"""
+        return self.get(self.bill_key(bill_id))
+
+    def get_or_load_bill(self, bill_id: int, loader: Callable[[], Optional[Bill]]) -> Optional[dict]:
+        """Get bill data, loading the bill with `loader` at most once across concurrent misses"""
+        def load():
+            bill = loader()
+            return bill_to_dict(bill) if bill is not None else None
+        return self.get_or_load(self.bill_key(bill_id), load, version_key=self.bill_version_key(bill_id))
 
     def invalidate_bill(self, bill_id: int):
         """Remove bill from cache"""
-        self.redis.delete(f"{self.bill_prefix}{bill_id}")
-
-    def cache_bill_list(self, bills: list[Bill], key: str):
-        """Cache list of bills"""
-        bills_data = [
-            {
-                "id": bill.id,
-                "title": bill.title,
-                "description": bill.description,
-                "status": bill.status,
-                "pdf_url": bill.pdf_url,
-                "created_at": str(bill.created_at),
-                "updated_at": str(bill.updated_at) if bill.updated_at else None,
-            }
-            for bill in bills
-        ]
-        self.redis.setex(key, self.ttl, json.dumps(bills_data))
+        self._bump_version(self.bill_version_key(bill_id))
+        self.delete(self.bill_key(bill_id))
+
+    def cache_bills(self, bills: Iterable[Bill]):
+        """Cache many bills with one pipelined round trip"""
+        self.set_many({self.bill_key(bill.id): bill_to_dict(bill) for bill in bills})
+
+    def _cache_loaded_bills(self, bills: List[Bill], generation: Optional[str]):
+        """
+        Cache bills read from the database since the list generation was `generation`.
+        Every bill write bumps the generation first, so if it moved they are removed again.
+        """
+        self.cache_bills(bills)
+        if bills and self._read_version(self.generation_key) != generation:
+            self.delete(*[self.bill_key(bill.id) for bill in bills])
+
+    def get_bills(self, bill_ids: List[int]) -> Dict[int, dict]:
+        """Get the cached bills among `bill_ids` with one MGET"""
+        found = self.get_many([self.bill_key(bill_id) for bill_id in bill_ids])
+        return {bill_id: found[self.bill_key(bill_id)] for bill_id in bill_ids if self.bill_key(bill_id) in found}
+
+    # Bill list pages are cached as ids under a generation that every bill write bumps
+
+    def list_generation(self) -> int:
+        """Current generation of cached bill list pages"""
+        key = self.generation_key
+        generation = self.local.get(key)
+        if generation is None:
+            try:
+                generation = int(self.redis.get(key) or 0)
+            except RedisError as e:
+                logger.warning(f"Could not read {key} from Redis: {e}")
+                return 0
+            self.local.set(key, generation)
+        return generation
+
+    def invalidate_bill_lists(self):
+        """Retire every cached bill list page"""
+        key = self.generation_key
+        self.local.delete(key)
+        try:
+            self.local.set(key, self.redis.incr(key))
+        except RedisError as e:
+            logger.warning(f"Could not bump {key} in Redis: {e}")
+
+    def bill_list_key(self, status: Optional[str], cursor: Optional[str], limit: int) -> str:
+        return f"{self.list_prefix}{self.list_generation()}:{status or ''}:{limit}:{cursor or ''}"
+
+    def cache_bill_list(self, bills: list[Bill], key: str, next_cursor: Optional[str] = None):
+        """Cache a page of bills as their ids, with the bills themselves cached individually"""
+        self.cache_bills(bills)
+        self._set(key, {"ids": [bill.id for bill in bills], "next": next_cursor})
+
+    def get_bill_page(self, key: str) -> Optional[Tuple[list, Optional[str]]]:
+        """Get a page of bills and the next cursor from cache; None unless every bill in it is still cached"""
+        page = self.get(key)
+        if page is None:
+            return None
+        bills = self.get_bills(page["ids"])
+        if len(bills) < len(page["ids"]):
+            return None
+        return [bills[bill_id] for bill_id in page["ids"]], page["next"]
 
     def get_bill_list(self, key: str) -> Optional[list]:
         """Get list of bills from cache"""
-        data = self.redis.get(key)
-        if data:
-            return json.loads(data)
-        return None
+        page = self.get_bill_page(key)
+        return page[0] if page is not None else None
+
+    def get_or_load_bill_page(
+        self, key: str, loader: Callable[[], Tuple[List[Bill], Optional[str]]]
+    ) -> Tuple[list, Optional[str]]:
+        """Get a page of bills, loading it with `loader` at most once across concurrent misses"""
+        loaded = {}
+
+        def load():
+            generation = self._read_version(self.generation_key)
+            bills, next_cursor = loader()
+            loaded["bills"] = [bill_to_dict(bill) for bill in bills]
+            self._cache_loaded_bills(bills, generation)
+            return {"ids": [bill.id for bill in bills], "next": next_cursor}
+
+        page = self.get_or_load(key, load)
+        if "bills" in loaded:
+            return loaded["bills"], page["next"]
+        bills = self.get_bills(page["ids"])
+        if len(bills) == len(page["ids"]):
+            return [bills[bill_id] for bill_id in page["ids"]], page["next"]
+        # Some of the page's bills were evicted; reload it
+        generation = self._read_version(self.generation_key)
+        bills, next_cursor = loader()
+        self._cache_loaded_bills(bills, generation)
+        self._set(key, {"ids": [bill.id for bill in bills], "next": next_cursor})
+        return [bill_to_dict(bill) for bill in bills], next_cursor
 
 redis_service = RedisService()
 
@@ -70,11 +443,24 @@ def cache_bill(bill: Bill):
 def get_cached_bill(bill_id: int) -> Optional[dict]:
     return redis_service.get_bill(bill_id)
 
+def get_or_load_cached_bill(bill_id: int, loader: Callable[[], Optional[Bill]]) -> Optional[dict]:
+    return redis_service.get_or_load_bill(bill_id, loader)
+
 def invalidate_cached_bill(bill_id: int):
     redis_service.invalidate_bill(bill_id)
 
-def cache_bill_list(bills: list[Bill], key: str):
-    redis_service.cache_bill_list(bills, key)
+def invalidate_cached_bill_lists():
+    redis_service.invalidate_bill_lists()
+
+def cache_bill_list(bills: list[Bill], key: str, next_cursor: Optional[str] = None):
+    redis_service.cache_bill_list(bills, key, next_cursor)
 
 def get_cached_bill_list(key: str) -> Optional[list]:
-    return redis_service.get_bill_list(key) 
\ No newline at end of file
+    return redis_service.get_bill_list(key)
+
+def get_or_load_cached_bill_page(
+    status: Optional[str], cursor: Optional[str], limit: int,
+    loader: Callable[[], Tuple[List[Bill], Optional[str]]],
+) -> Tuple[list, Optional[str]]:
+    key = redis_service.bill_list_key(status, cursor, limit)
+    return redis_service.get_or_load_bill_page(key, loader)
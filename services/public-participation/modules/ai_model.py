@@ -1,5 +1,6 @@
 # modules/ai_model.py
 
+import asyncio
 import requests
 import json
 import logging
@@ -7,8 +8,15 @@ from dotenv import load_dotenv
 import os
 from neo4j import GraphDatabase, basic_auth
 import time
-from thefuzz import fuzz
-from thefuzz import process
+from typing import AsyncIterator
+from .bill_retriever import BillRetriever
+from .embeddings import VectorIndex
+from .llm_scheduler import LLMScheduler, request_key, request_priority
+from .retrieval import HybridRetriever
+from .ollama_client import AsyncOllamaClient, OllamaError
+from .response_cache import ResponseCache
+from .title_index import UNKNOWN_YEAR, extract_year, normalize_title
+from .token_budget import TokenBudget
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path='config/.env')
@@ -30,12 +38,21 @@ class OllamaResponder:
         model_name: str = "llama3.2:latest",
         base_url: str = "http://127.0.0.1:11434",
         max_retries: int = 3,
-        retry_delay: float = 2.0
+        retry_delay: float = 2.0,
+        response_cache: ResponseCache = None,
+        scheduler: LLMScheduler = None,
+        token_budget: TokenBudget = None,
     ):
         self.model_name = model_name
         self.base_url = base_url.rstrip('/')  # Ensure no trailing slash
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self._async_client = None
+        self.response_cache = response_cache if response_cache is not None else ResponseCache.from_env()
+        # Caps concurrent generations and orders waiting ones by priority and user
+        self.scheduler = scheduler if scheduler is not None else LLMScheduler()
+        # Sizes the context packed into prompts and the number of tokens to generate
+        self.token_budget = token_budget if token_budget is not None else TokenBudget()
 
         logger.info(f"Initialized OllamaResponder with model: {self.model_name} at {self.base_url}")
 
@@ -54,6 +71,12 @@ class OllamaResponder:
             logger.error(f"Failed to connect to Neo4j Knowledge Graph: {e}")
             self.driver = None
 
+        # Title index used to pick a bill before fetching its description, with
+        # passage embeddings written at ingest as the fallback for paraphrased questions
+        self.retriever = BillRetriever(self.driver, vector_index=VectorIndex()) if self.driver else None
+        # Fuses BM25, fuzzy title and vector rankings within a latency budget
+        self.search = HybridRetriever(self.retriever) if self.retriever else None
+
     def close_neo4j(self):
         if self.driver:
             self.driver.close()
@@ -65,13 +88,7 @@ class OllamaResponder:
         Normalize the text by removing underscores, dashes, and file extensions.
         Ensures that words are capitalized appropriately.
         """
-        # Remove the file extension if present
-        text = os.path.splitext(text)[0]
-        # Replace underscores and dashes with spaces
-        normalized = text.replace('_', ' ').replace('-', ' ').strip()
-        # Capitalize each word
-        normalized = ' '.join([word.capitalize() for word in normalized.split()])
-        return normalized
+        return normalize_title(text)
 
     def is_list_bills_request(self, prompt: str) -> bool:
         """
@@ -105,38 +122,30 @@ class OllamaResponder:
         Extracts the year from the title if present.
         Assumes the year is a four-digit number in the title.
         """
-        import re
-        match = re.search(r'20\d{2}', title)
-        if match:
-            return match.group(0)
-        else:
-            return "Unknown"
+        return extract_year(title)
 
-    def get_best_fuzzy_match(self, records, prompt: str):
+    def retrieval_deadline(self):
         """
-        Uses fuzzy matching to compare the normalized prompt with titles from the Knowledge Graph.
-        Returns the best match based on the highest similarity score.
+        Starts the latency budget shared by every retrieval made for one request.
+        """
+        return self.search.deadline() if self.search else None
+
+    def get_best_fuzzy_match(self, prompt: str, deadline: float = None):
         """
-        titles = [record[0] for record in records]
-        normalized_titles = [self.normalize_text(title) for title in titles]
-        # Normalize the prompt
-        normalized_prompt = self.normalize_text(prompt)
-        # Perform fuzzy matching between the prompt and the normalized titles
-        best_title, score = process.extractOne(normalized_prompt, normalized_titles, scorer=fuzz.partial_ratio)
-        logger.debug(f"Best fuzzy match: {best_title} with score {score}")
-        # Set a threshold to ensure the match is relevant (e.g., at least 70% similarity)
-        if score >= 70:
-            # Find the corresponding record with the best match
-            for record in records:
-                if self.normalize_text(record[0]) == best_title:
-                    return {'title': record[0], 'description': record[1]}
-        return None
-
-    def query_knowledge_graph(self, prompt: str) -> (str, str):
+        Finds the bill the prompt is about with the hybrid retriever, which fuses fuzzy
+        title matching with BM25 and vector rankings.
+        Returns the matching title index record, or None if no bill is similar enough.
+        """
+        if not self.search:
+            return None
+        return self.search.match_bills(prompt, deadline=deadline).match
+
+    def query_knowledge_graph(self, prompt: str, match: dict = None, deadline: float = None) -> (str, str):
         """
         Queries the Neo4j Knowledge Graph based on the prompt and returns relevant information.
         If the user requests a list of bills, return all bill titles grouped by year.
-        Otherwise, use fuzzy matching to find the most relevant bill.
+        Otherwise, use fuzzy matching to find the most relevant bill, unless the caller
+        already matched one. Retrieval stops at the request's `deadline`, if given.
 
         Returns:
             knowledge (str): The knowledge to include in the prompt.
@@ -148,109 +157,104 @@ class OllamaResponder:
 
         # Check if the prompt is requesting a list of bills
         if self.is_list_bills_request(prompt):
-            # Fetch all unique bill titles
-            query = """
-            MATCH (n)
-            RETURN DISTINCT n.title AS title
-            """
+            # Served from the cached listing built from the title index; no graph round trip
             try:
-                with self.driver.session() as session:
-                    result = session.run(query)
-                    records = result.values()
-                    if records:
-                        # Process records to group titles by year
-                        bills_by_year = {}
-                        titles_seen = set()
-                        for record in records:
-                            title = record[0]
-                            # Normalize the title
-                            normalized_title = self.normalize_text(title)
-                            # Ensure uniqueness
-                            if normalized_title in titles_seen:
-                                continue
-                            titles_seen.add(normalized_title)
-                            # Extract year from title (assuming year is in title)
-                            year = self.extract_year_from_title(title)
-                            if year:
-                                if year not in bills_by_year:
-                                    bills_by_year[year] = []
-                                bills_by_year[year].append(normalized_title)
-                        # Format the knowledge string
-                        knowledge = "List of Bills in Kenya grouped by year:\n"
-                        for year in sorted(bills_by_year.keys(), reverse=True):
-                            knowledge += f"\nYear {year}:\n"
-                            for bill_title in sorted(bills_by_year[year]):
-                                knowledge += f"- {bill_title}\n"
-                        return knowledge, "list"
-                    else:
-                        logger.info("No records found in Knowledge Graph.")
-                        return "", "general"
+                year = self.extract_year_from_title(prompt)
+                knowledge = ""
+                if year != UNKNOWN_YEAR:
+                    knowledge = self.retriever.bill_listing(year=year)
+                if not knowledge:
+                    knowledge = self.retriever.bill_listing()
+                if knowledge:
+                    return knowledge, "list"
+                else:
+                    logger.info("No records found in Knowledge Graph.")
+                    return "", "general"
             except Exception as e:
                 logger.error(f"Error querying Knowledge Graph: {e}", exc_info=True)
                 return "", "general"
         else:
-            # Proceed with previous code using fuzzy matching
-            # Fetch all nodes with their titles and descriptions
-            query = """
-            MATCH (n)
-            RETURN n.title AS title, n.description AS description
-            """
+            # Pick the best bill, then fetch only its most relevant passages
             try:
-                with self.driver.session() as session:
-                    result = session.run(query)
-                    records = result.values()
-                    if records:
-                        # Apply fuzzy matching to rank the best matches
-                        best_match = self.get_best_fuzzy_match(records, prompt)
-                        if best_match:
-                            title = best_match['title']
-                            description = best_match['description']
-                            logger.debug(f"Knowledge Graph Query Result: Title - {title}, Description Length - {len(description)}")
-                            # Limit description length
-                            if description and len(description) > 16000:
-                                description = description[:15970] + '...'
-                            # Format the knowledge into a readable string
-                            knowledge = f"**Knowledge Graph Data:**\n**Title:** {self.normalize_text(title)}\n**Description:**\n{description}\n"
-                            return knowledge, "detail"
-                        else:
-                            logger.info("No relevant data found in Knowledge Graph for the given prompt.")
-                            return "", "general"
-                    else:
-                        logger.info("No records found in Knowledge Graph.")
-                        return "", "general"
+                if match is None:
+                    match = self.get_best_fuzzy_match(prompt, deadline=deadline)
+                if not match:
+                    logger.info("No relevant data found in Knowledge Graph for the given prompt.")
+                    return "", "general"
+                header = self.knowledge_header(match['title'])
+                # Tokens left for passages once the instructions, question and title are counted
+                available = self.token_budget.context_budget(self.detail_prompt(prompt, header))
+                ranked = self.search.search_passages(
+                    prompt, bill_id=match['id'], k=self.token_budget.candidate_passages, deadline=deadline
+                ).passages
+                packed = self.pack_passages(ranked, available)
+                best_match = self.retriever.retrieve_passages(
+                    prompt, match=match, k=self.token_budget.candidate_passages, passages=packed
+                )
+                if best_match and best_match['passages']:
+                    # In document order; fallback passages are packed here too
+                    passages, context_tokens = self.token_budget.pack(best_match['passages'], available)
+                    logger.info(
+                        f"Packed {len(passages)} of {len(ranked) or len(best_match['passages'])} passages "
+                        f"({context_tokens}/{available} context tokens) for bill {match['id']}."
+                    )
+                    # Format the knowledge into a readable string
+                    excerpts = "\n\n...\n\n".join(passages)
+                    knowledge = f"{header}{excerpts}\n"
+                    return knowledge, "detail"
+                else:
+                    logger.info("No relevant data found in Knowledge Graph for the given prompt.")
+                    return "", "general"
             except Exception as e:
                 logger.error(f"Error querying Knowledge Graph: {e}", exc_info=True)
                 return "", "general"
 
 
 
-    def generate_response(
-        self,
-        prompt: str,
-        max_tokens: int = 150,
-        temperature: float = 0.7,
-    ) -> str:
-        if not prompt.strip():
-            logger.warning("Empty prompt received.")
-            return "Please provide a valid query."
+    def knowledge_header(self, title: str) -> str:
+        return f"**Knowledge Graph Data:**\n**Title:** {self.normalize_text(title)}\n**Relevant Passages:**\n"
+
+    def pack_passages(self, passages: list, max_tokens: int) -> list:
+        """
+        Keeps the most relevant passages (given best first) that fit in max_tokens.
+        """
+        texts, _ = self.token_budget.pack([passage['text'] for passage in passages], max_tokens)
+        kept = set(texts)
+        selected = [passage for passage in passages if passage['text'] in kept]
+        if not selected and texts:
+            # Not even the best passage fit; it was truncated
+            selected = [dict(passages[0], text=texts[0])]
+        return selected
+
+    @staticmethod
+    def detail_prompt(prompt: str, knowledge: str) -> str:
+        return (
+            f"You are an assistant knowledgeable about Kenyan bills.\n\n"
+            f"Here is some relevant information from the knowledge graph:\n{knowledge}\n\n"
+            f"User's question: {prompt}\n\n"
+            f"Based on the above information, provide a comprehensive and accurate response."
+        )
 
+    def build_prompt(self, prompt: str, match: dict = None, deadline: float = None):
+        """
+        Queries the Knowledge Graph and builds the prompt to send to the AI model.
+
+        Returns:
+            augmented_prompt (str or None): The prompt for the model, or None when the
+                knowledge itself is the answer (e.g. a list of bills).
+            knowledge (str): The knowledge retrieved from the graph.
+            response_type (str): 'list', 'detail', or 'general'.
+        """
         # Query the Knowledge Graph for additional context
-        knowledge, response_type = self.query_knowledge_graph(prompt)
+        knowledge, response_type = self.query_knowledge_graph(prompt, match=match, deadline=deadline)
 
         # Determine how to respond based on the response_type
         if response_type == "list" and knowledge:
             # For list of bills, return the knowledge directly
-            logger.debug("Returning list of bills directly without invoking AI model.")
-            return knowledge.strip()
+            return None, knowledge, response_type
         elif response_type == "detail" and knowledge:
             # For a specific bill, include user's question and knowledge
-            augmented_prompt = (
-                f"You are an assistant knowledgeable about Kenyan bills.\n\n"
-                f"Here is some relevant information from the knowledge graph:\n{knowledge}\n\n"
-                f"User's question: {prompt}\n\n"
-                f"Based on the above information, provide a comprehensive and accurate response."
-            )
-            use_knowledge = True
+            augmented_prompt = self.detail_prompt(prompt, knowledge)
         else:
             # General case
             augmented_prompt = (
@@ -258,19 +262,46 @@ class OllamaResponder:
                 f"User's question: {prompt}\n\n"
                 f"Provide a comprehensive and accurate response based on your knowledge."
             )
-            use_knowledge = False
+            response_type = "general"
+        return augmented_prompt, knowledge, response_type
 
-        logger.debug(f"Augmented Prompt:\n{augmented_prompt}")
-        
-        payload = {
-            "model": self.model_name,
-            "prompt": augmented_prompt,
-            "options": {
-                "max_tokens": max_tokens,
-                "temperature": temperature
-            }
-        }
+    def lookup_cached_response(self, prompt: str, max_tokens: int, temperature: float, deadline: float = None):
+        """
+        Matches the prompt to a bill and looks up a cached answer for that question and bill.
+        List requests are not cached since they are already served from the title index.
 
+        Returns:
+            cache_key (str or None): The key to store the generated answer under.
+            match (dict or None): The matched title index record, reusable by build_prompt.
+            cached_response (str or None): The cached answer, if any.
+        """
+        if self.response_cache is None or self.is_list_bills_request(prompt):
+            return None, None, None
+        try:
+            match = self.get_best_fuzzy_match(prompt, deadline=deadline)
+        except Exception as e:
+            logger.error(f"Error matching prompt to a bill: {e}", exc_info=True)
+            return None, None, None
+        cache_key = self.response_cache.make_key(
+            prompt, match, max_tokens=max_tokens, temperature=temperature, model=self.model_name
+        )
+        return cache_key, match, self.response_cache.get(cache_key)
+
+    def store_cached_response(self, cache_key, match, response: str, generation_seconds: float):
+        if cache_key is None:
+            return
+        bill_id = match['id'] if match else None
+        self.response_cache.set(cache_key, response, bill_id=bill_id, generation_seconds=generation_seconds)
+
+    def _call_ollama(self, payload: dict, record) -> (str, str):
+        """
+        Sends one generation request to Ollama, with retries, and collects the streamed answer.
+        Reports every token to the scheduler's request record.
+
+        Returns:
+            text (str): The generated text, empty on failure.
+            error (str or None): The reply to send instead when the request failed.
+        """
         url = f"{self.base_url}/api/generate"  # Adjust endpoint if necessary
         headers = {
             "Content-Type": "application/json",
@@ -295,10 +326,10 @@ class OllamaResponder:
                 time.sleep(self.retry_delay)
             else:
                 logger.error("Max retries exceeded. Unable to generate response.")
-                return "Sorry, I couldn't process your request at this time."
+                return "", "Sorry, I couldn't process your request at this time."
 
         # Process the streaming response
-        full_response = ""
+        chunks = []
         try:
             for line in response.iter_lines():
                 if line:
@@ -307,25 +338,193 @@ class OllamaResponder:
                     try:
                         data = json.loads(line_decoded)
                         chunk = data.get("response", "")
-                        full_response += chunk
+                        if chunk:
+                            record.token()
+                        chunks.append(chunk)
                         if data.get("done", False):
+                            self.record_usage(record, data)
                             break
                     except json.JSONDecodeError as json_err:
                         logger.error(f"JSON decode error: {json_err} - Line: {line_decoded}")
                         continue
         except Exception as e:
             logger.error(f"Error processing streaming response: {e}")
-            return "Sorry, an error occurred while processing the AI model's response."
+            return "", "Sorry, an error occurred while processing the AI model's response."
+        return "".join(chunks), None
+
+    def record_usage(self, record, data: dict):
+        """
+        Logs the token counts Ollama reports when a generation is done and feeds the
+        measured speeds back into the token budget.
+        """
+        record.set_eval(data.get("eval_count"), data.get("eval_duration"))
+        prompt_eval_count = data.get("prompt_eval_count")
+        prompt_eval_duration = data.get("prompt_eval_duration")
+        prompt_tps = prompt_eval_count / (prompt_eval_duration / 1e9) if prompt_eval_count and prompt_eval_duration else None
+        self.token_budget.observe(generation_tps=record.tokens_per_second, prompt_tps=prompt_tps)
+        logger.info(
+            f"Ollama usage: {prompt_eval_count} prompt tokens, {data.get('eval_count')} generated tokens, "
+            f"{record.tokens_per_second or 0:.1f} tokens/s."
+        )
+
+    def generate_response(
+        self,
+        prompt: str,
+        max_tokens: int = 150,
+        temperature: float = 0.7,
+        user: str = None,
+    ) -> str:
+        if not prompt.strip():
+            logger.warning("Empty prompt received.")
+            return "Please provide a valid query."
+
+        # One retrieval budget for the cache lookup's bill match and the prompt's passages
+        deadline = self.retrieval_deadline()
+        cache_key, match, cached_response = self.lookup_cached_response(prompt, max_tokens, temperature, deadline)
+        if cached_response is not None:
+            logger.info("Returning cached response.")
+            return cached_response
+
+        build_started_at = time.perf_counter()
+        augmented_prompt, knowledge, response_type = self.build_prompt(prompt, match=match, deadline=deadline)
+        if augmented_prompt is None:
+            logger.debug("Returning list of bills directly without invoking AI model.")
+            return knowledge.strip()
+        use_knowledge = response_type == "detail"
+        options, prompt_tokens = self.token_budget.options(augmented_prompt, max_tokens, temperature)
+        started_at = time.perf_counter()
+        logger.info(
+            f"Built {response_type} prompt in {(started_at - build_started_at) * 1000:.0f} ms: "
+            f"~{prompt_tokens} prompt tokens, num_predict {options['num_predict']}."
+        )
+
+        logger.debug(f"Augmented Prompt:\n{augmented_prompt}")
+        
+        payload = {
+            "model": self.model_name,
+            "prompt": augmented_prompt,
+            "options": options,
+        }
+
+        # Waits for a generation slot; identical in-flight requests share one generation
+        full_response, error = self.scheduler.run(
+            request_key(self.model_name, augmented_prompt, payload["options"]),
+            lambda record: self._call_ollama(payload, record),
+            user=user,
+            priority=request_priority(response_type, max_tokens, len(augmented_prompt)),
+        )
+        if error:
+            return error
 
         if full_response.strip():
             response_type_desc = "Knowledge-based" if use_knowledge else "General"
             logger.info(f"Generated {response_type_desc} response successfully.")
+            self.store_cached_response(cache_key, match, full_response.strip(), time.perf_counter() - started_at)
             return full_response.strip()
         else:
             logger.warning("AI returned an empty content.")
             return "Sorry, I couldn't generate a response."
 
 
+    @property
+    def async_client(self) -> AsyncOllamaClient:
+        if self._async_client is None:
+            self._async_client = AsyncOllamaClient(
+                model_name=self.model_name,
+                base_url=self.base_url,
+                max_retries=self.max_retries,
+                retry_delay=self.retry_delay,
+            )
+        return self._async_client
+
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 150,
+        temperature: float = 0.7,
+        user: str = None,
+    ) -> AsyncIterator[str]:
+        """
+        Asynchronous variant of generate_response that yields the answer token by token,
+        so callers can start sending or chunking it before generation finishes.
+        """
+        if not prompt.strip():
+            logger.warning("Empty prompt received.")
+            yield "Please provide a valid query."
+            return
+
+        # The graph lookup uses the synchronous Neo4j driver, keep it off the event loop
+        deadline = self.retrieval_deadline()
+        cache_key, match, cached_response = await asyncio.to_thread(
+            self.lookup_cached_response, prompt, max_tokens, temperature, deadline
+        )
+        if cached_response is not None:
+            logger.info("Returning cached response.")
+            yield cached_response
+            return
+
+        augmented_prompt, knowledge, response_type = await asyncio.to_thread(self.build_prompt, prompt, match, deadline)
+        if augmented_prompt is None:
+            logger.debug("Returning list of bills directly without invoking AI model.")
+            yield knowledge.strip()
+            return
+
+        logger.debug(f"Augmented Prompt:\n{augmented_prompt}")
+        options, prompt_tokens = self.token_budget.options(augmented_prompt, max_tokens, temperature)
+        logger.info(f"Built {response_type} prompt: ~{prompt_tokens} prompt tokens, num_predict {options['num_predict']}.")
+        started_at = time.perf_counter()
+        chunks = []
+
+        async def stream(record):
+            async for token in self.async_client.stream_generate(augmented_prompt, options):
+                record.token()
+                yield token
+
+        # Waits for a generation slot; identical in-flight streams share one generation,
+        # the later ones getting its whole answer at once
+        key = "stream:" + request_key(self.model_name, augmented_prompt, options)
+        try:
+            async for token in self.scheduler.astream(
+                key, stream, user=user, priority=request_priority(response_type, max_tokens, len(augmented_prompt))
+            ):
+                chunks.append(token)
+                yield token
+        except OllamaError as e:
+            logger.error(f"Error streaming response from Ollama after {len(chunks)} tokens: {e}")
+            # The caller already has part of the answer; end it there rather than
+            # appending the apology to it. The partial answer is not cached.
+            if not chunks:
+                yield "Sorry, I couldn't process your request at this time."
+            return
+
+        full_response = "".join(chunks).strip()
+        if full_response:
+            self.store_cached_response(cache_key, match, full_response, time.perf_counter() - started_at)
+
+    async def agenerate_response(
+        self,
+        prompt: str,
+        max_tokens: int = 150,
+        temperature: float = 0.7,
+        user: str = None,
+    ) -> str:
+        """
+        Asynchronous variant of generate_response returning the complete answer.
+        """
+        chunks = [token async for token in self.agenerate_stream(prompt, max_tokens, temperature, user)]
+        full_response = "".join(chunks).strip()
+        if full_response:
+            return full_response
+        logger.warning("AI returned an empty content.")
+        return "Sorry, I couldn't generate a response."
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
     def close(self):
         logger.info("OllamaResponder is shutting down.")
+        if self.search:
+            self.search.close()
         self.close_neo4j()
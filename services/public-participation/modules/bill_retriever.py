@@ -0,0 +1,282 @@
+# modules/bill_retriever.py
+
+import logging
+import os
+import re
+import threading
+import time
+from .embeddings import VectorIndex
+from .passages import PASSAGE_CHARS, PASSAGE_TOP_K
+from .title_index import TitleIndex, normalize_title
+
+logger = logging.getLogger(__name__)
+
+# Characters with special meaning in the Lucene query syntax used by fulltext indexes
+LUCENE_SPECIAL_CHARS = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+# Minimum cosine similarity for a vector match to stand in for a failed title match
+VECTOR_MATCH_THRESHOLD = float(os.environ.get("VECTOR_MATCH_THRESHOLD", 0.35))
+
+
+def escape_lucene_query(text: str) -> str:
+    """
+    Escapes Lucene special characters so free text can be passed to a fulltext index.
+    """
+    return LUCENE_SPECIAL_CHARS.sub(r'\\\1', text)
+
+
+class BillRetriever:
+    """
+    Retrieves bills from the Neo4j Knowledge Graph without scanning their descriptions.
+
+    Uses the persistent TitleIndex written at ingest time to pick the best match
+    (optionally narrowed by the 'billIndex' fulltext index), and only then fetches
+    the text of the winning bill by id: its most relevant :Passage nodes, found with
+    the 'passageIndex' fulltext index, rather than the whole description.
+
+    When a VectorIndex is given, questions that match no title or no passage words
+    fall back to nearest-neighbour search over the passage embeddings.
+    """
+
+    def __init__(
+        self,
+        driver,
+        index: TitleIndex = None,
+        match_threshold: int = 70,
+        refresh_interval: float = 300.0,
+        use_fulltext: bool = True,
+        fulltext_limit: int = 10,
+        vector_index: VectorIndex = None,
+        vector_threshold: float = VECTOR_MATCH_THRESHOLD,
+    ):
+        self.driver = driver
+        self.index = index if index is not None else TitleIndex()
+        self.match_threshold = match_threshold
+        self.refresh_interval = refresh_interval
+        self.use_fulltext = use_fulltext
+        self.fulltext_limit = fulltext_limit
+        self.vector_index = vector_index
+        self.vector_threshold = vector_threshold
+
+        self._persisted = False  # Whether the index is backed by a file written at ingest
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Rebuilds the title index from the Knowledge Graph. Only ids and titles are transferred.
+        Used when no index has been written at ingest time yet.
+        """
+        query = """
+        MATCH (b:Bill)
+        WHERE b.title IS NOT NULL
+        RETURN b.id AS id, b.title AS title
+        """
+        with self.driver.session() as session:
+            records = session.run(query).values()
+
+        self.index.replace_all({bill_id: title for bill_id, title in records})
+        self._loaded_at = time.monotonic()
+        logger.info(f"Loaded {len(records)} bill titles from the Knowledge Graph into the title index.")
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if self.vector_index is not None:
+                self.vector_index.reload_if_changed()
+            if self._persisted:
+                self.index.reload_if_changed()
+                return
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+                self._persisted = self.index.load()
+                if not self._persisted:
+                    self.refresh()
+                self._loaded_at = time.monotonic()
+
+    def fulltext_candidates(self, prompt: str) -> list:
+        """
+        Uses the 'billIndex' fulltext index as a first-stage filter.
+        Returns the ids of the top scoring Bill nodes, best first.
+        """
+        query_text = escape_lucene_query(normalize_title(prompt))
+        if not query_text.strip():
+            return []
+        query = """
+        CALL db.index.fulltext.queryNodes('billIndex', $query) YIELD node, score
+        RETURN node.id AS id
+        ORDER BY score DESC
+        LIMIT $limit
+        """
+        try:
+            with self.driver.session() as session:
+                result = session.run(query, query=query_text, limit=self.fulltext_limit)
+                return [record["id"] for record in result]
+        except Exception as e:
+            logger.warning(f"Fulltext pre-filter failed, falling back to the full title index: {e}")
+            return []
+
+    def match(self, prompt: str):
+        """
+        Finds the bill whose title best matches the prompt.
+        Returns the title index record {'id', 'title', 'normalized', 'score'} or None.
+        """
+        self._ensure_fresh()
+
+        best = None
+        if self.use_fulltext:
+            candidate_ids = self.fulltext_candidates(prompt)
+            if candidate_ids:
+                best = self.index.match(prompt, self.match_threshold, candidate_ids=candidate_ids)
+        if best is None:
+            best = self.index.match(prompt, self.match_threshold)
+        if best is None:
+            best = self.vector_match(prompt)
+        return best
+
+    def vector_match(self, prompt: str):
+        """
+        Finds the bill with the passage most similar to the prompt in embedding space.
+        Returns a title index record with the similarity as a 0-100 score, or None.
+        """
+        if self.vector_index is None or not len(self.vector_index):
+            return None
+        for bill_id, similarity in self.vector_index.search_bills(prompt, k=1):
+            record = self.index.get(bill_id)
+            if record is not None and similarity >= self.vector_threshold:
+                return dict(record, score=round(similarity * 100))
+        return None
+
+    def fetch_description(self, bill_id):
+        """
+        Fetches the description of a single bill by id.
+        """
+        query = """
+        MATCH (b:Bill {id: $id})
+        RETURN b.description AS description
+        LIMIT 1
+        """
+        with self.driver.session() as session:
+            record = session.run(query, id=bill_id).single()
+        if record:
+            return record["description"]
+        return None
+
+    def retrieve(self, prompt: str, match: dict = None):
+        """
+        Returns the best matching bill as {'id', 'title', 'description'} or None.
+        A match already found by the caller can be passed to skip matching again.
+        """
+        if match is None:
+            match = self.match(prompt)
+        if not match:
+            return None
+        description = self.fetch_description(match['id'])
+        return {'id': match['id'], 'title': match['title'], 'description': description or ""}
+
+    def fulltext_passages(self, prompt: str, bill_id=None, k: int = PASSAGE_TOP_K) -> list:
+        """
+        Returns the k passages ranked highest by the 'passageIndex' fulltext index (BM25),
+        optionally within one bill, as {'bill_id', 'index', 'text', 'score'} dicts, best first.
+        """
+        query_text = escape_lucene_query(prompt.strip())
+        if not query_text:
+            return []
+        query = """
+        CALL db.index.fulltext.queryNodes('passageIndex', $query) YIELD node, score
+        WHERE $bill_id IS NULL OR node.bill_id = $bill_id
+        RETURN node.bill_id AS bill_id, node.index AS index, node.text AS text, score
+        ORDER BY score DESC
+        LIMIT $k
+        """
+        try:
+            with self.driver.session() as session:
+                result = session.run(query, query=query_text, bill_id=bill_id, k=k)
+                return [dict(record) for record in result]
+        except Exception as e:
+            logger.warning(f"Passage search failed: {e}")
+            return []
+
+    def search_passages(self, prompt: str, bill_id=None, k: int = PASSAGE_TOP_K) -> list:
+        """
+        Returns the k passages that best match the prompt, optionally within one bill,
+        as {'bill_id', 'index', 'text', 'score'} dicts, best first. Falls back to
+        vector search when no passage contains the prompt's words.
+        """
+        return self.fulltext_passages(prompt, bill_id=bill_id, k=k) or self.vector_passages(prompt, bill_id=bill_id, k=k)
+
+    def vector_passages(self, prompt: str, bill_id=None, k: int = PASSAGE_TOP_K) -> list:
+        """
+        Returns the k passages nearest to the prompt in embedding space, in the same
+        form as search_passages; the texts are fetched from Neo4j by passage id.
+        """
+        if self.vector_index is None:
+            return []
+        self.vector_index.reload_if_changed()
+        hits = self.vector_index.search(prompt, k=k, bill_id=bill_id)
+        if not hits:
+            return []
+        query = """
+        MATCH (p:Passage)
+        WHERE p.id IN $ids
+        RETURN p.id AS id, p.text AS text
+        """
+        ids = [f"{item['bill_id']}:{item['index']}" for item, _ in hits]
+        try:
+            with self.driver.session() as session:
+                texts = {record["id"]: record["text"] for record in session.run(query, ids=ids)}
+        except Exception as e:
+            logger.warning(f"Fetching passages found by vector search failed: {e}")
+            return []
+        return [
+            {'bill_id': item['bill_id'], 'index': item['index'], 'text': texts[passage_id], 'score': score}
+            for passage_id, (item, score) in zip(ids, hits)
+            if passage_id in texts
+        ]
+
+    def bill_passages(self, bill_id, k: int = PASSAGE_TOP_K) -> list:
+        """
+        Returns the first k passages of a bill, in document order.
+        """
+        query = """
+        MATCH (p:Passage {bill_id: $id})
+        RETURN p.bill_id AS bill_id, p.index AS index, p.text AS text, 0.0 AS score
+        ORDER BY p.index
+        LIMIT $k
+        """
+        with self.driver.session() as session:
+            return [dict(record) for record in session.run(query, id=bill_id, k=k)]
+
+    def retrieve_passages(self, prompt: str, match: dict = None, k: int = PASSAGE_TOP_K, passages: list = None):
+        """
+        Returns the best matching bill as {'id', 'title', 'passages'} or None.
+
+        The passages are the k most relevant to the prompt, in document order; callers
+        that already ranked the bill's passages can pass them. Bills with no passage
+        matching the prompt fall back to their first k passages, and bills synced before
+        passages existed to the start of their description.
+        """
+        if match is None:
+            match = self.match(prompt)
+        if not match:
+            return None
+        if passages is None:
+            passages = self.search_passages(prompt, bill_id=match['id'], k=k)
+        passages = passages or self.bill_passages(match['id'], k)
+        texts = [passage['text'] for passage in sorted(passages, key=lambda passage: passage['index'])]
+        if not texts:
+            description = self.fetch_description(match['id'])
+            texts = [description[:k * PASSAGE_CHARS]] if description else []
+        return {'id': match['id'], 'title': match['title'], 'passages': texts}
+
+    def titles(self) -> dict:
+        """
+        Returns a snapshot of the title index as {bill id: original title}.
+        """
+        self._ensure_fresh()
+        return {record['id']: record['title'] for record in self.index.records()}
+
+    def bill_listing(self, year: str = None, offset: int = 0, limit: int = None) -> str:
+        """
+        Returns the cached "bills grouped by year" listing, optionally for a single year.
+        """
+        self._ensure_fresh()
+        return self.index.format_bill_listing(year=year, offset=offset, limit=limit)
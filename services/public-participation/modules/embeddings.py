@@ -0,0 +1,405 @@
+# modules/embeddings.py
+
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import zlib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "hashing" for the dependency-free vectorizer, or a sentence-transformers model name
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "hashing")
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", 384))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+DEFAULT_VECTOR_DIR = os.environ.get("VECTOR_INDEX_DIR", "data/vectors")
+
+TOKEN = re.compile(r'[a-z0-9]+')
+# Rows copied or scored per block when working through the memory-mapped matrix
+BLOCK_ROWS = 4096
+
+
+class HashingEmbedder:
+    """
+    Deterministic, dependency-free text vectorizer.
+
+    Words, word pairs and character trigrams of words are hashed into `dim` signed
+    buckets and the result is L2-normalized, so cosine similarity is a dot product.
+    It captures lexical overlap only; use a sentence-transformers model for paraphrases.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    @staticmethod
+    def _features(text: str):
+        words = TOKEN.findall(text.lower())
+        for word in words:
+            yield word, 1.0
+            if len(word) > 3:
+                padded = f"#{word}#"
+                for i in range(len(padded) - 2):
+                    yield padded[i:i + 3], 0.5
+        for first, second in zip(words, words[1:]):
+            yield f"{first} {second}", 1.0
+
+    def embed(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                hashed = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, hashed % self.dim] += weight if hashed & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """
+    Small CPU sentence-transformers model, e.g. 'sentence-transformers/all-MiniLM-L6-v2'.
+    Requires the optional sentence-transformers package.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = EMBEDDING_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts) -> np.ndarray:
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return vectors.astype(np.float32, copy=False)
+
+
+def get_embedder(model_name: str = EMBEDDING_MODEL):
+    """
+    Returns the configured embedder, falling back to the hashing vectorizer when
+    sentence-transformers is not installed or the model cannot be loaded.
+    """
+    if model_name == HashingEmbedder.name:
+        return HashingEmbedder()
+    try:
+        return SentenceTransformerEmbedder(model_name)
+    except Exception as e:
+        logger.warning(f"Cannot load embedding model '{model_name}', using the hashing vectorizer: {e}")
+        return HashingEmbedder()
+
+
+def train_ivf(vectors, nlist: int, iterations: int = 10, sample_size: int = 20000, seed: int = 0):
+    """
+    Trains IVF centroids with spherical k-means on a sample of the rows.
+
+    Returns:
+        np.ndarray: (nlist, dim) L2-normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    count = vectors.shape[0]
+    sample = np.asarray(vectors[np.sort(rng.choice(count, min(count, sample_size), replace=False))])
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(nlist):
+            members = sample[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class VectorIndex:
+    """
+    On-disk approximate nearest-neighbour index over bill passages.
+
+    Vectors are stored as a raw float32 matrix that is memory-mapped, not read, when
+    the index is loaded. An IVF (inverted file) index clusters the rows around
+    sqrt(n) centroids; a query only scores the rows of the `nprobe` closest clusters.
+    Small indexes are scanned exactly.
+
+    Files are written under a new generation number and meta.json is replaced last,
+    so processes reading the index switch to a rebuilt one atomically.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_VECTOR_DIR,
+        embedder=None,
+        nprobe: int = 8,
+        exact_below: int = 2048,
+    ):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.nprobe = nprobe
+        self.exact_below = exact_below
+        self._embedder = embedder
+        self._lock = threading.RLock()
+        self._version = None
+        self._reset()
+
+    def _reset(self):
+        self.generation = 0
+        self.items = []  # row -> {'bill_id', 'index'}
+        self.bill_hashes = {}  # bill id -> content hash of the embedded text
+        self.rows_by_bill = {}
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.centroids = None
+        self.list_offsets = None
+        self.list_rows = None
+
+    @property
+    def embedder(self):
+        # Created on first use; loading a model can take seconds
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    def __len__(self):
+        return len(self.items)
+
+    def _path(self, name: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{name}-{generation}")
+
+    def _file_version(self):
+        stat = os.stat(self.meta_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> bool:
+        """
+        Loads the index from disk. Returns False if there is no index, or it was built
+        with a different embedding model.
+        """
+        try:
+            version = self._file_version()
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load vector index from {self.directory}: {e}")
+            return False
+
+        if meta.get("model") != self.embedder.name or meta.get("dim") != self.embedder.dim:
+            logger.warning(
+                f"Vector index in {self.directory} was built with {meta.get('model')}; "
+                f"it will be rebuilt for {self.embedder.name} on the next sync."
+            )
+            return False
+
+        generation = meta["generation"]
+        count = len(meta["items"])
+        with self._lock:
+            self._reset()
+            self._version = version
+            self.generation = generation
+            self.items = meta["items"]
+            self.bill_hashes = {int(bill_id): value for bill_id, value in meta["bill_hashes"].items()}
+            for row, item in enumerate(self.items):
+                self.rows_by_bill.setdefault(item["bill_id"], []).append(row)
+            if count:
+                self.vectors = np.memmap(
+                    self._path("vectors", generation) + ".f32", dtype=np.float32, mode='r',
+                    shape=(count, meta["dim"]),
+                )
+                ivf_path = self._path("ivf", generation) + ".npz"
+                if os.path.exists(ivf_path):
+                    with np.load(ivf_path) as ivf:
+                        self.centroids = ivf["centroids"]
+                        self.list_offsets = ivf["offsets"]
+                        self.list_rows = ivf["rows"]
+        logger.info(f"Loaded {count} passage vectors from {self.directory}.")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        try:
+            version = self._file_version()
+        except OSError:
+            return False
+        if version != self._version:
+            return self.load()
+        return False
+
+    def search_vector(self, query: np.ndarray, k: int = 10, bill_id=None) -> list:
+        """
+        Returns up to k (row item, cosine similarity) pairs, best first.
+        """
+        with self._lock:
+            vectors, items = self.vectors, self.items
+            if not len(items):
+                return []
+            if bill_id is not None:
+                rows = np.asarray(self.rows_by_bill.get(bill_id, []), dtype=np.int64)
+            elif self.centroids is None or len(items) < self.exact_below:
+                rows = None
+            else:
+                probe = min(self.nprobe, len(self.centroids))
+                closest = np.argpartition(self.centroids @ query, -probe)[-probe:]
+                rows = np.sort(np.concatenate([
+                    self.list_rows[self.list_offsets[cluster]:self.list_offsets[cluster + 1]]
+                    for cluster in closest
+                ]))
+
+        if rows is None:
+            scores = np.concatenate([
+                np.asarray(vectors[start:start + BLOCK_ROWS]) @ query
+                for start in range(0, len(items), BLOCK_ROWS)
+            ])
+            rows = np.arange(len(items))
+        else:
+            if not len(rows):
+                return []
+            scores = np.asarray(vectors[rows]) @ query
+
+        top = min(k, len(rows))
+        best = np.argpartition(scores, -top)[-top:]
+        best = best[np.argsort(-scores[best])]
+        return [(items[rows[position]], float(scores[position])) for position in best]
+
+    def search(self, text: str, k: int = 10, bill_id=None) -> list:
+        """
+        Embeds the text and returns the k most similar passages as (item, similarity) pairs.
+        """
+        if not len(self.items):
+            return []
+        query = self.embedder.embed([text])[0]
+        return self.search_vector(query, k=k, bill_id=bill_id)
+
+    def search_bills(self, text: str, k: int = 5) -> list:
+        """
+        Returns up to k (bill id, similarity) pairs, scoring each bill by its best passage.
+        """
+        best = {}
+        for item, score in self.search(text, k=k * 4):
+            if score > best.get(item["bill_id"], -1.0):
+                best[item["bill_id"]] = score
+        return sorted(best.items(), key=lambda pair: pair[1], reverse=True)[:k]
+
+    def builder(self, batch_size: int = EMBEDDING_BATCH_SIZE) -> "VectorIndexBuilder":
+        return VectorIndexBuilder(self, batch_size=batch_size)
+
+
+class VectorIndexBuilder:
+    """
+    Embeds the passages of new or changed bills in batches, streaming the vectors to a
+    staging file, and on commit writes a new generation of the index that reuses the
+    existing vectors of every other bill. Committing costs as much as the whole index,
+    so a long ingest keeps one builder open and commits it once at the end. There
+    should be one writer at a time (the ingest sync); readers are never blocked.
+    """
+
+    def __init__(self, index: VectorIndex, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.index = index
+        self.batch_size = batch_size
+        os.makedirs(index.directory, exist_ok=True)
+        self._staging = tempfile.NamedTemporaryFile(
+            dir=index.directory, prefix="staging-", suffix=".f32", delete=False
+        )
+        self.staging_path = self._staging.name
+        self.items = []
+        self.staged_rows = []  # staging file row of each item
+        self.bill_hashes = {}
+        self._staged_count = 0
+
+    def __len__(self):
+        return len(self.bill_hashes)
+
+    def add_bill(self, bill_id, content_hash: str, passages: list):
+        """
+        Embeds a bill's passages and stages them, replacing any vectors it had before,
+        including ones staged earlier by this builder.
+        """
+        if bill_id in self.bill_hashes:
+            if self.bill_hashes[bill_id] == content_hash:
+                return
+            kept = [position for position, item in enumerate(self.items) if item["bill_id"] != bill_id]
+            self.items = [self.items[position] for position in kept]
+            self.staged_rows = [self.staged_rows[position] for position in kept]
+        self.bill_hashes[bill_id] = content_hash
+        for start in range(0, len(passages), self.batch_size):
+            batch = passages[start:start + self.batch_size]
+            vectors = self.index.embedder.embed(batch).astype(np.float32, copy=False)
+            self._staging.write(vectors.tobytes())
+            self.items.extend({"bill_id": bill_id, "index": start + offset} for offset in range(len(batch)))
+            self.staged_rows.extend(range(self._staged_count, self._staged_count + len(batch)))
+            self._staged_count += len(batch)
+
+    def commit(self):
+        """
+        Writes the new generation of the index and loads it.
+        """
+        self._staging.close()
+        index = self.index
+        index.reload_if_changed()
+        dim = index.embedder.dim
+        generation = index.generation + 1
+
+        kept_rows = [row for row, item in enumerate(index.items) if item["bill_id"] not in self.bill_hashes]
+        items = [index.items[row] for row in kept_rows] + self.items
+        bill_hashes = {
+            bill_id: value for bill_id, value in index.bill_hashes.items() if bill_id not in self.bill_hashes
+        }
+        bill_hashes.update(self.bill_hashes)
+
+        vectors_path = index._path("vectors", generation) + ".f32"
+        count = len(items)
+        if count:
+            vectors = np.memmap(vectors_path, dtype=np.float32, mode='w+', shape=(count, dim))
+            for start in range(0, len(kept_rows), BLOCK_ROWS):
+                block = kept_rows[start:start + BLOCK_ROWS]
+                vectors[start:start + len(block)] = index.vectors[block]
+            if self.items:
+                staged = np.memmap(self.staging_path, dtype=np.float32, mode='r', shape=(self._staged_count, dim))
+                for start in range(0, len(self.items), BLOCK_ROWS):
+                    block = staged[self.staged_rows[start:start + BLOCK_ROWS]]
+                    vectors[len(kept_rows) + start:len(kept_rows) + start + len(block)] = block
+                del staged
+            vectors.flush()
+
+            if count >= index.exact_below:
+                nlist = max(1, min(1024, int(math.sqrt(count))))
+                centroids = train_ivf(vectors, nlist)
+                assignment = np.concatenate([
+                    np.argmax(np.asarray(vectors[start:start + BLOCK_ROWS]) @ centroids.T, axis=1)
+                    for start in range(0, count, BLOCK_ROWS)
+                ])
+                rows = np.argsort(assignment, kind='stable')
+                offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))])
+                with open(index._path("ivf", generation) + ".npz", 'wb') as f:
+                    np.savez(f, centroids=centroids, offsets=offsets, rows=rows)
+            del vectors
+
+        meta = {
+            "generation": generation,
+            "model": index.embedder.name,
+            "dim": dim,
+            "items": items,
+            "bill_hashes": {str(bill_id): value for bill_id, value in bill_hashes.items()},
+        }
+        with open(f"{index.meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(f"{index.meta_path}.tmp", index.meta_path)
+        os.remove(self.staging_path)
+
+        # Readers that still map the previous generation keep their open file
+        for name, suffix in (("vectors", ".f32"), ("ivf", ".npz")):
+            previous = index._path(name, generation - 1) + suffix
+            if os.path.exists(previous):
+                os.remove(previous)
+        index.load()
+        logger.info(f"Vector index generation {generation}: {count} passages, {len(self.bill_hashes)} bills embedded.")
+
+    def abort(self):
+        if not self._staging.closed:
+            self._staging.close()
+        if os.path.exists(self.staging_path):
+            os.remove(self.staging_path)
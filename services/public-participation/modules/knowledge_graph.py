@@ -1,13 +1,20 @@
 # modules/knowledge_graph.py
 
 from neo4j import GraphDatabase
+import hashlib
 import logging
 import os
+import threading
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, Column, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import time
+from .bill_retriever import BillRetriever
+from .embeddings import VectorIndex
+from .passages import PASSAGE_SCHEME, PASSAGE_TOP_K, split_passages
+from .retrieval import HybridRetriever
+from .title_index import TitleIndex
 
 # Load environment variables
 load_dotenv(dotenv_path='config/.env')
@@ -28,8 +35,15 @@ class KenyaBill(Base):
     file_path = Column(String, nullable=False)
     text_content = Column(Text, nullable=True)  # Assuming you have this column
 
+def content_hash(*fields) -> str:
+    """
+    Returns the SHA-256 hex digest identifying a version of a bill's synchronized fields.
+    """
+    joined = "\x1f".join(field or "" for field in fields)
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()
+
 class KnowledgeGraph:
-    def __init__(self):
+    def __init__(self, response_cache=None, sync_on_init: bool = False, batch_size: int = 200):
         # PostgreSQL connection setup
         self.pg_engine = create_engine(os.environ.get("DATABASE_URL"))
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.pg_engine)
@@ -39,21 +53,60 @@ class KnowledgeGraph:
         user = os.environ.get("NEO4J_USER", "neo4j")
         password = os.environ.get("NEO4J_PASSWORD", "password")  # Replace with your Neo4j password
         self.neo4j_driver = GraphDatabase.driver(uri, auth=(user, password))
+
+        # Normalized titles are indexed at ingest so responders never normalize them per request
+        self.title_index = TitleIndex()
+        self.title_index.load()
+        # Passage embeddings are computed in batches as bills are written
+        self.vector_index = VectorIndex()
+        self.retriever = BillRetriever(self.neo4j_driver, index=self.title_index, vector_index=self.vector_index)
+        self.search = HybridRetriever(self.retriever)
+
+        # Cached answers about a bill are dropped when its text changes
+        self.response_cache = response_cache
+
+        # Number of bills written to Neo4j per UNWIND transaction
+        self.batch_size = batch_size
+
+        # Index writes held back by deferred syncs until finish_sync()
+        self._deferred_vectors = None
+        self._title_index_dirty = False
         
-        # Initialize the Neo4j index
-        self._ensure_fulltext_index()
+        # The fulltext index is checked on first use so construction never touches Neo4j
+        self._fulltext_index_ready = False
+        self._index_lock = threading.Lock()
         
-        # Perform initial data sync
-        self.sync_data()
+        # The sync is incremental and normally run by the ingest pipeline, not on every start
+        if sync_on_init:
+            self.sync_data()
         
     def _ensure_fulltext_index(self):
         """
-        Ensures that the full-text index 'billIndex' exists for Bill nodes.
-        If it doesn't exist, it creates the index.
+        Ensures that the full-text indexes 'billIndex' and 'passageIndex' exist, along
+        with the lookup indexes the sync and retrieval queries match on.
+        If they don't exist, it creates them. Runs once, on first use.
         """
+        if self._fulltext_index_ready:
+            return
+        with self._index_lock:
+            if self._fulltext_index_ready:
+                return
+            self._create_fulltext_index()
+            self._fulltext_index_ready = True
+
+    def _create_fulltext_index(self):
         with self.neo4j_driver.session() as session:
             result = session.run("SHOW INDEXES")
             indexes = [record["name"] for record in result]
+            if "passageIndex" not in indexes:
+                logger.info("Creating full-text index 'passageIndex'")
+                session.run(
+                    """
+                    CREATE FULLTEXT INDEX passageIndex
+                    FOR (p:Passage)
+                    ON EACH [p.text]
+                    """
+                )
             if "billIndex" not in indexes:
                 logger.info("Creating full-text index 'billIndex'")
                 session.run(
@@ -66,86 +119,261 @@ class KnowledgeGraph:
                 logger.info("Full-text index 'billIndex' created successfully.")
             else:
                 logger.info("Full-text index 'billIndex' already exists.")
+            # Passages are attached to their bill by id, and a bill's passages are read by bill_id
+            session.run("CREATE CONSTRAINT bill_id IF NOT EXISTS FOR (b:Bill) REQUIRE b.id IS UNIQUE")
+            session.run("CREATE INDEX passage_bill_id IF NOT EXISTS FOR (p:Passage) ON (p.bill_id)")
+            # Vector hits are turned back into text by passage id
+            session.run("CREATE CONSTRAINT passage_id IF NOT EXISTS FOR (p:Passage) REQUIRE p.id IS UNIQUE")
     
-    def sync_data(self):
+    def _fetch_graph_hashes(self, bill_ids=None) -> dict:
+        """
+        Returns {bill id: content hash} for the bills already in Neo4j,
+        optionally only for the given ids.
+        """
+        with self.neo4j_driver.session() as session:
+            result = session.run(
+                """
+                MATCH (b:Bill)
+                WHERE b.content_hash IS NOT NULL AND ($ids IS NULL OR b.id IN $ids)
+                RETURN b.id AS id, b.content_hash AS content_hash
+                """,
+                ids=bill_ids
+            )
+            return {record["id"]: record["content_hash"] for record in result}
+
+    @staticmethod
+    def _write_bills(tx, rows):
+        """
+        Writes bills and replaces their passages, all in the caller's transaction.
+        """
+        tx.run(
+            """
+            UNWIND $rows AS row
+            MERGE (b:Bill {id: row.id})
+            SET b.title = row.title,
+                b.url = row.url,
+                b.file_path = row.file_path,
+                b.description = row.description,
+                b.content_hash = row.content_hash
+            """,
+            rows=[{key: value for key, value in row.items() if key != "passages"} for row in rows]
+        )
+        tx.run(
+            """
+            MATCH (b:Bill)-[:HAS_PASSAGE]->(p:Passage)
+            WHERE b.id IN $ids
+            DETACH DELETE p
+            """,
+            ids=[row["id"] for row in rows]
+        )
+        passages = [
+            {"bill_id": row["id"], "index": index, "text": text}
+            for row in rows
+            for index, text in enumerate(row["passages"])
+        ]
+        if passages:
+            tx.run(
+                """
+                UNWIND $passages AS passage
+                MATCH (b:Bill {id: passage.bill_id})
+                CREATE (b)-[:HAS_PASSAGE]->(:Passage {
+                    id: toString(passage.bill_id) + ':' + toString(passage.index),
+                    bill_id: passage.bill_id,
+                    index: passage.index,
+                    text: passage.text
+                })
+                """,
+                passages=passages
+            )
+
+    def _flush(self, rows, vector_builder=None):
+        """
+        Writes a batch of bills to Neo4j in one transaction, then updates the title index,
+        embeds their passages and drops cached answers about bills that changed.
+        """
+        with self.neo4j_driver.session() as neo_session:
+            neo_session.execute_write(self._write_bills, rows)
+        for row in rows:
+            if vector_builder is not None:
+                vector_builder.add_bill(row["id"], row["content_hash"], row["passages"])
+            previous = self.title_index.get(row["id"])
+            if self.response_cache is not None and previous and previous.get('content_hash') != row["content_hash"]:
+                self.response_cache.invalidate_bill(row["id"])
+            self.title_index.add(row["id"], row["title"], content_hash=row["content_hash"])
+        logger.debug(f"Synchronized a batch of {len(rows)} bills.")
+
+    def sync_data(self, full: bool = False, bill_ids=None, defer_index_writes: bool = False) -> dict:
         """
         Synchronizes data from PostgreSQL to Neo4j.
-        Fetches all bills from PostgreSQL and ensures they exist in Neo4j.
+
+        Bills are streamed from PostgreSQL and compared with the content hash stored on
+        their Neo4j node; only new or changed bills are written, in batched UNWIND
+        transactions. Pass full=True to rewrite every bill, or bill_ids to only
+        consider those bills (as the ingest pipeline does for each stored batch).
+
+        Each sync normally ends by writing a new vector index generation and saving the
+        title index, both of which cost as much as the whole index. With
+        defer_index_writes=True the embeddings are staged and the title index kept in
+        memory until finish_sync(), so a run of many small syncs writes them once.
+
+        Returns:
+            dict: Counts of scanned, written and unchanged bills.
         """
         logger.info("Starting data synchronization from PostgreSQL to Neo4j.")
+        stats = {"scanned": 0, "written": 0, "unchanged": 0}
         session = self.SessionLocal()
+        vector_builder = None
         try:
-            bills = session.query(KenyaBill).all()
-            logger.info(f"Fetched {len(bills)} bills from PostgreSQL.")
-            
-            with self.neo4j_driver.session() as neo_session:
-                for bill in bills:
-                    # Clean and prepare data
-                    bill_id = bill.id
-                    title = bill.title.strip()
-                    url = bill.url.strip()
-                    file_path = bill.file_path.strip()
-                    description = bill.text_content.strip() if bill.text_content else ""
-                    
-                    # MERGE ensures that the node is created if it doesn't exist
-                    # and updated if it does
-                    neo_session.run(
-                        """
-                        MERGE (b:Bill {id: $id})
-                        SET b.title = $title,
-                            b.url = $url,
-                            b.file_path = $file_path,
-                            b.description = $description
-                        """,
-                        id=bill_id,
-                        title=title,
-                        url=url,
-                        file_path=file_path,
-                        description=description
-                    )
-                    logger.debug(f"Synchronized Bill ID {bill_id}: {title}")
-            
-            logger.info("Data synchronization completed successfully.")
+            self._ensure_fulltext_index()
+            if defer_index_writes:
+                vector_builder = self._deferred_vector_builder()
+            elif self.vector_index is not None:
+                self.vector_index.load()
+                vector_builder = self.vector_index.builder()
+            if bill_ids is not None:
+                bill_ids = list(bill_ids)
+            graph_hashes = {} if full else self._fetch_graph_hashes(bill_ids)
+            index_changed = False
+            batch = []
+            query = session.query(KenyaBill)
+            if bill_ids is not None:
+                query = query.filter(KenyaBill.id.in_(bill_ids))
+            for bill in query.order_by(KenyaBill.id).yield_per(self.batch_size):
+                stats["scanned"] += 1
+                # Clean and prepare data
+                title = bill.title.strip()
+                url = bill.url.strip()
+                file_path = bill.file_path.strip()
+                description = bill.text_content.strip() if bill.text_content else ""
+                text_hash = content_hash(title, url, file_path, description, PASSAGE_SCHEME)
+
+                if graph_hashes.get(bill.id) == text_hash:
+                    stats["unchanged"] += 1
+                    # Backfill the title index on hosts that have not ingested this bill yet
+                    if bill.id not in self.title_index:
+                        self.title_index.add(bill.id, title, content_hash=text_hash)
+                        index_changed = True
+                    # Backfill embeddings for bills synced before them or with another model
+                    if vector_builder is not None and self.vector_index.bill_hashes.get(bill.id) != text_hash:
+                        vector_builder.add_bill(bill.id, text_hash, split_passages(description))
+                    continue
+
+                batch.append({
+                    "id": bill.id,
+                    "title": title,
+                    "url": url,
+                    "file_path": file_path,
+                    "description": description,
+                    "content_hash": text_hash,
+                    "passages": split_passages(description),
+                })
+                if len(batch) >= self.batch_size:
+                    self._flush(batch, vector_builder)
+                    stats["written"] += len(batch)
+                    batch = []
+
+            if batch:
+                self._flush(batch, vector_builder)
+                stats["written"] += len(batch)
+
+            if defer_index_writes:
+                self._title_index_dirty |= bool(stats["written"] or index_changed)
+                vector_builder = None
+            else:
+                if stats["written"] or index_changed:
+                    self.title_index.save()
+                if vector_builder is not None:
+                    if len(vector_builder):
+                        vector_builder.commit()
+                    else:
+                        vector_builder.abort()
+                    stats["embedded"] = len(vector_builder)
+                    vector_builder = None
+            logger.info(
+                f"Data synchronization completed successfully: {stats['scanned']} scanned, "
+                f"{stats['written']} written, {stats['unchanged']} unchanged."
+            )
         except Exception as e:
             logger.error(f"Error during data synchronization: {e}")
         finally:
+            # A deferred builder is shared by the run and outlives a failed sync
+            if vector_builder is not None and not defer_index_writes:
+                vector_builder.abort()
             session.close()
+        return stats
     
-    def query_knowledge_graph(self, prompt):
+    def _deferred_vector_builder(self):
+        if self.vector_index is not None and self._deferred_vectors is None:
+            self.vector_index.load()
+            self._deferred_vectors = self.vector_index.builder()
+        return self._deferred_vectors
+
+    def finish_sync(self) -> dict:
+        """
+        Writes what deferred syncs held back: one vector index generation with all the
+        staged embeddings (IVF is trained once, over the final matrix) and the title index.
+
+        Returns:
+            dict: The number of bills embedded.
+        """
+        vector_builder, self._deferred_vectors = self._deferred_vectors, None
+        embedded = len(vector_builder) if vector_builder is not None else 0
+        try:
+            if self._title_index_dirty:
+                self.title_index.save()
+                self._title_index_dirty = False
+            if vector_builder is not None:
+                if embedded:
+                    vector_builder.commit()
+                else:
+                    vector_builder.abort()
+                vector_builder = None
+        except Exception as e:
+            logger.error(f"Error writing the deferred indexes: {e}")
+        finally:
+            if vector_builder is not None:
+                vector_builder.abort()
+        return {"embedded": embedded}
+
+    def query_knowledge_graph(self, prompt, k: int = PASSAGE_TOP_K, budget_ms: float = None):
         """
         Queries the knowledge graph using the provided prompt.
-        Utilizes the full-text index 'billIndex' to find relevant Bill nodes.
+        Uses the hybrid retriever: when the prompt names a bill, the passages come from
+        that bill, otherwise from all bills, ranked by fusing the 'passageIndex' fulltext
+        index with vector search.
 
         Args:
             prompt (str): The search term or query.
+            k (int): The number of passages to return.
+            budget_ms (float, optional): Latency budget; defaults to RETRIEVAL_BUDGET_MS.
 
         Returns:
-            str or None: The description of the matching Bill, or None if no match is found.
+            list: The text of the best matching passages, best first (empty if none match).
         """
         try:
-            with self.neo4j_driver.session() as session:
-                result = session.run(
-                    """
-                    CALL db.index.fulltext.queryNodes('billIndex', $prompt) YIELD node, score
-                    RETURN node.description AS description
-                    ORDER BY score DESC
-                    LIMIT 1
-                    """,
-                    prompt=prompt
+            self._ensure_fulltext_index()
+            result = self.search.retrieve(prompt, k=k, budget_ms=budget_ms)
+            if result.passages:
+                logger.info(
+                    f"Found {len(result.passages)} matching passages in knowledge graph "
+                    f"in {result.elapsed_ms:.0f} ms{' (partial)' if result.partial else ''}."
                 )
-                record = result.single()
-                if record and record["description"]:
-                    logger.info("Found matching bill in knowledge graph.")
-                    return record["description"]
-                else:
-                    logger.info("No matching bills found in knowledge graph.")
-                    return None
+            else:
+                logger.info("No matching passages found in knowledge graph.")
+            return [passage["text"] for passage in result.passages]
         except Exception as e:
             logger.error(f"Error querying knowledge graph: {e}")
-            return None
+            return []
     
     def close(self):
         """
         Closes the Neo4j driver connection.
         """
+        self.search.close()
         self.neo4j_driver.close()
+
+if __name__ == "__main__":
+    import sys
+    kg = KnowledgeGraph()
+    kg.sync_data(full="--full" in sys.argv)
+    kg.close()
@@ -0,0 +1,357 @@
+# modules/llm_scheduler.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from .ollama_client import WHATSAPP_MESSAGE_LIMIT
+from .token_budget import CHARS_PER_WORD_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Generations sent to Ollama at the same time
+OLLAMA_CONCURRENCY = int(os.environ.get("OLLAMA_CONCURRENCY", 2))
+# Answers up to this many tokens count as short and are served first; by default
+# anything that fits in one WhatsApp message, the bot's reply size
+SHORT_ANSWER_TOKENS = int(os.environ.get("SHORT_ANSWER_TOKENS", WHATSAPP_MESSAGE_LIMIT // CHARS_PER_WORD_TOKEN))
+# Prompts longer than this (in characters) are served after shorter ones
+LONG_PROMPT_CHARS = int(os.environ.get("LONG_PROMPT_CHARS", 4000))
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+
+def request_priority(response_type: str, max_tokens: int, prompt_chars: int = 0) -> int:
+    """
+    Short and list-type answers go first; long answers and long prompts go last.
+    """
+    if response_type == "list":
+        return HIGH
+    if max_tokens > SHORT_ANSWER_TOKENS:
+        return LOW
+    if prompt_chars > LONG_PROMPT_CHARS:
+        return NORMAL
+    return HIGH if response_type == "general" else NORMAL
+
+
+def request_key(model: str, prompt: str, options: dict) -> str:
+    """
+    Identifies a generation request; identical in-flight requests share one generation.
+
+    num_predict is left out: the token budget moves it with every observed
+    generation speed, so identical questions asked together would otherwise rarely
+    match. Requests that share a generation get the first request's answer length.
+    """
+    options = {name: value for name, value in options.items() if name != "num_predict"}
+    payload = json.dumps({"model": model, "prompt": prompt, "options": options}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class RequestRecord:
+    """
+    Timings of one scheduled generation. Callers report tokens with token() as they
+    stream in, and may pass Ollama's own eval counters with set_eval().
+    """
+    user: str
+    priority: int
+    submitted_at: float
+    started_at: float = None
+    first_token_at: float = None
+    finished_at: float = None
+    tokens: int = 0
+    eval_count: int = None
+    eval_seconds: float = None
+
+    def token(self, count: int = 1):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.tokens += count
+
+    def set_eval(self, eval_count, eval_duration_ns):
+        if eval_count and eval_duration_ns:
+            self.eval_count = eval_count
+            self.eval_seconds = eval_duration_ns / 1e9
+
+    @property
+    def queue_wait(self):
+        return None if self.started_at is None else self.started_at - self.submitted_at
+
+    @property
+    def time_to_first_token(self):
+        return None if self.first_token_at is None else self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_second(self):
+        if self.eval_count and self.eval_seconds:
+            return self.eval_count / self.eval_seconds
+        if self.first_token_at is None or self.finished_at is None or self.tokens < 2:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return (self.tokens - 1) / elapsed if elapsed > 0 else None
+
+
+class _Ticket:
+    """
+    A waiting request. Threads wait on `event`; asyncio tasks await `waiter`, a future of
+    their own loop that is completed from whichever thread grants the slot.
+    """
+    __slots__ = ("record", "event", "waiter", "granted")
+
+    def __init__(self, record: RequestRecord, loop: asyncio.AbstractEventLoop = None):
+        self.record = record
+        self.event = threading.Event()
+        self.waiter = loop.create_future() if loop is not None else None
+        self.granted = False
+
+    def wake(self):
+        self.event.set()
+        if self.waiter is not None:
+            self.waiter.get_loop().call_soon_threadsafe(_resolve, self.waiter)
+
+
+def _resolve(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _Abandoned(Exception):
+    """Set on a shared request whose owner stopped before it finished"""
+
+
+def _percentile(values, fraction):
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class LLMScheduler:
+    """
+    Admits generation requests to a single model server.
+
+    At most `max_concurrency` requests run at once. Waiting requests are served by
+    priority (HIGH, NORMAL, LOW) and, within a priority, round-robin across users, so
+    one user's burst of questions cannot starve everyone else. Identical requests
+    (same request key) that are already queued or running share its result instead
+    of generating again.
+
+    Works for threads (run, slot) and asyncio tasks (astream, aslot); waiting tasks hold
+    no thread. Every completed request is recorded with its queue wait, time to first
+    token and tokens per second.
+    """
+
+    def __init__(self, max_concurrency: int = OLLAMA_CONCURRENCY, history: int = 1000):
+        self.max_concurrency = max(1, max_concurrency)
+        self._lock = threading.Lock()
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}  # user -> deque of tickets
+        self._running = 0
+        self._inflight = {}  # request key -> Future
+        self._history = deque(maxlen=history)
+        self._counts = {"completed": 0, "failed": 0, "deduplicated": 0}
+
+    def _waiting(self) -> int:
+        return sum(len(tickets) for queue in self._queues.values() for tickets in queue.values())
+
+    def _enqueue(self, user, priority, loop: asyncio.AbstractEventLoop = None) -> _Ticket:
+        ticket = _Ticket(RequestRecord(user=user, priority=priority, submitted_at=time.monotonic()), loop)
+        with self._lock:
+            if self._running < self.max_concurrency and not self._waiting():
+                self._grant(ticket)
+            else:
+                self._queues[priority].setdefault(user, deque()).append(ticket)
+        return ticket
+
+    def _grant(self, ticket: _Ticket):
+        self._running += 1
+        ticket.granted = True
+        ticket.record.started_at = time.monotonic()
+        ticket.wake()
+
+    def _next_ticket(self):
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            if queue:
+                user, tickets = queue.popitem(last=False)
+                ticket = tickets.popleft()
+                if tickets:
+                    # The user goes to the back of the rotation
+                    queue[user] = tickets
+                return ticket
+        return None
+
+    def _release(self):
+        with self._lock:
+            self._running -= 1
+            while self._running < self.max_concurrency:
+                ticket = self._next_ticket()
+                if ticket is None:
+                    break
+                self._grant(ticket)
+
+    def _withdraw(self, ticket: _Ticket):
+        """
+        Removes a ticket whose caller gave up; releases its slot if it was already granted.
+        """
+        with self._lock:
+            if not ticket.granted:
+                tickets = self._queues[ticket.record.priority].get(ticket.record.user)
+                if tickets and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._queues[ticket.record.priority][ticket.record.user]
+                ticket.wake()
+                return
+        self._release()
+
+    def _finish(self, record: RequestRecord, failed: bool):
+        record.finished_at = time.monotonic()
+        self._release()
+        with self._lock:
+            self._counts["failed" if failed else "completed"] += 1
+            self._history.append(record)
+        logger.debug(
+            f"LLM request for {record.user} ({PRIORITY_NAMES[record.priority]}): "
+            f"waited {record.queue_wait:.2f}s, first token {record.time_to_first_token or 0:.2f}s, "
+            f"{record.tokens_per_second or 0:.1f} tokens/s"
+        )
+
+    @contextmanager
+    def slot(self, user: str = None, priority: int = NORMAL):
+        """
+        Blocks until the request may run, then yields its RequestRecord.
+        """
+        ticket = self._enqueue(user, priority)
+        try:
+            ticket.event.wait()
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        failed = True
+        try:
+            yield ticket.record
+            failed = False
+        finally:
+            self._finish(ticket.record, failed)
+
+    @asynccontextmanager
+    async def aslot(self, user: str = None, priority: int = NORMAL):
+        """
+        Asynchronous variant of slot; waiting blocks neither the event loop nor a thread.
+        """
+        ticket = self._enqueue(user, priority, asyncio.get_running_loop())
+        try:
+            await ticket.waiter
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        failed = True
+        try:
+            yield ticket.record
+            failed = False
+        finally:
+            self._finish(ticket.record, failed)
+
+    def _claim(self, key: str):
+        """
+        Returns (future, True) for a new request key, which the caller must complete,
+        or the in-flight request's (future, False).
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = Future()
+                return future, True
+            self._counts["deduplicated"] += 1
+            return future, False
+
+    def run(self, key: str, fn, user: str = None, priority: int = NORMAL):
+        """
+        Runs fn(record) in a slot and returns its result. If a request with the same
+        key is already queued or running, waits for it and returns its result instead.
+        """
+        future, owner = self._claim(key)
+        while not owner:
+            logger.debug(f"Sharing an in-flight generation with {user}.")
+            try:
+                return future.result()
+            except _Abandoned:
+                future, owner = self._claim(key)
+
+        try:
+            with self.slot(user, priority) as record:
+                result = fn(record)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def astream(self, key: str, stream, user: str = None, priority: int = NORMAL):
+        """
+        Asynchronous, streaming variant of run: runs stream(record), an async iterator of
+        text chunks, in a slot and yields the chunks as they arrive. If a request with
+        the same key is already queued or running, waits for it and yields its whole
+        text at once instead. Keys share run()'s in-flight map, so a streamed request
+        needs a key of its own: its result is the text, not fn's result.
+        """
+        future, owner = self._claim(key)
+        while not owner:
+            logger.debug(f"Sharing an in-flight generation with {user}.")
+            try:
+                # Shielded: a cancelled waiter must not cancel the shared future
+                text = await asyncio.shield(asyncio.wrap_future(future))
+            except _Abandoned:
+                future, owner = self._claim(key)
+                continue
+            yield text
+            return
+
+        chunks = []
+        try:
+            async with self.aslot(user, priority) as record:
+                async for chunk in stream(record):
+                    chunks.append(chunk)
+                    yield chunk
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            # Cancelled, or the caller stopped reading; whoever waits runs it again
+            future.set_exception(_Abandoned())
+            raise
+        else:
+            future.set_result("".join(chunks))
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        Returns queue state, counters and wait / time-to-first-token / tokens-per-second
+        percentiles over the recent requests.
+        """
+        with self._lock:
+            history = list(self._history)
+            stats = dict(self._counts, running=self._running, waiting=self._waiting(),
+                         max_concurrency=self.max_concurrency)
+        for name, values in (
+            ("queue_wait_seconds", [record.queue_wait for record in history]),
+            ("time_to_first_token_seconds", [record.time_to_first_token for record in history]),
+            ("tokens_per_second", [record.tokens_per_second for record in history]),
+        ):
+            stats[name] = {"p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+        return stats
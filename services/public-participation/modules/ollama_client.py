@@ -0,0 +1,166 @@
+# modules/ollama_client.py
+
+import asyncio
+import json
+import logging
+import random
+from typing import AsyncIterator, Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Twilio rejects WhatsApp message bodies longer than this
+WHATSAPP_MESSAGE_LIMIT = 1600
+
+
+class OllamaError(Exception):
+    """
+    Raised when the Ollama API cannot produce a response after all retries.
+    """
+
+
+class AsyncOllamaClient:
+    """
+    Asynchronous Ollama client.
+
+    Uses one pooled httpx.AsyncClient with keep-alive connections for every request
+    and streams generated tokens to the caller as they arrive. Failed requests are
+    retried with exponential backoff using asyncio.sleep, so the event loop is never blocked.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "llama3.2:latest",
+        base_url: str = "http://127.0.0.1:11434",
+        max_retries: int = 3,
+        retry_delay: float = 2.0,
+        max_retry_delay: float = 30.0,
+        timeout: float = 300.0,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.model_name = model_name
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.transport = transport
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                headers={"Content-Type": "application/json"},
+                transport=self.transport,
+            )
+        return self._client
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Exponential backoff with jitter for the given (1-based) attempt.
+        """
+        delay = min(self.max_retry_delay, self.retry_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            return status_code == 429 or status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    async def stream_generate(self, prompt: str, options: Optional[dict] = None) -> AsyncIterator[str]:
+        """
+        Streams the model's response token by token.
+
+        Requests are retried with backoff only until the first token has been yielded;
+        a failure after that point is raised so callers never receive duplicated text.
+        """
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "options": options or {},
+        }
+
+        for attempt in range(1, self.max_retries + 1):
+            yielded = False
+            try:
+                async with self.client.stream("POST", "/api/generate", json=payload) as response:
+                    response.raise_for_status()
+                    logger.debug(f"Received response status: {response.status_code}")
+                    async for line in response.aiter_lines():
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except json.JSONDecodeError as json_err:
+                            logger.error(f"JSON decode error: {json_err} - Line: {line}")
+                            continue
+                        chunk = data.get("response", "")
+                        if chunk:
+                            yielded = True
+                            yield chunk
+                        if data.get("done", False):
+                            return
+                return
+            except (httpx.HTTPStatusError, httpx.TransportError) as err:
+                if yielded or not self._is_retryable(err):
+                    raise OllamaError(f"Ollama request failed: {err}") from err
+                logger.error(f"Ollama request failed: {err} (Attempt {attempt}/{self.max_retries})")
+                if attempt == self.max_retries:
+                    raise OllamaError("Max retries exceeded. Unable to generate response.") from err
+                delay = self.backoff_delay(attempt)
+                logger.info(f"Retrying after {delay:.2f} seconds...")
+                await asyncio.sleep(delay)
+
+    async def generate(self, prompt: str, options: Optional[dict] = None) -> str:
+        """
+        Returns the complete response. Tokens are collected in a list and joined once.
+        """
+        chunks = [chunk async for chunk in self.stream_generate(prompt, options)]
+        return "".join(chunks)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+
+async def chunk_stream(
+    tokens: AsyncIterator[str], max_chars: int = WHATSAPP_MESSAGE_LIMIT
+) -> AsyncIterator[str]:
+    """
+    Groups a token stream into message-sized chunks so a reply can be sent in parts
+    while generation is still running. Chunks are split on the last whitespace that
+    keeps them within max_chars.
+    """
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        while len(buffer) > max_chars:
+            split_at = buffer.rfind(' ', 0, max_chars + 1)
+            if split_at <= 0:
+                split_at = max_chars
+            chunk, buffer = buffer[:split_at].strip(), buffer[split_at:].lstrip()
+            if chunk:
+                yield chunk
+    if buffer.strip():
+        yield buffer.strip()
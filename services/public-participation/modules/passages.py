@@ -0,0 +1,53 @@
+# modules/passages.py
+
+import os
+
+# Characters per passage and characters shared by consecutive passages
+PASSAGE_CHARS = int(os.environ.get("PASSAGE_CHARS", 1200))
+PASSAGE_OVERLAP = int(os.environ.get("PASSAGE_OVERLAP", 200))
+# Passages put in a prompt
+PASSAGE_TOP_K = int(os.environ.get("PASSAGE_TOP_K", 4))
+
+# Identifies how passages were produced; part of a bill's content hash so that
+# changing the chunking re-writes the passages of every bill on the next sync
+PASSAGE_SCHEME = f"passages:v1:{PASSAGE_CHARS}:{PASSAGE_OVERLAP}"
+
+
+def split_passages(text: str, size: int = PASSAGE_CHARS, overlap: int = PASSAGE_OVERLAP) -> list:
+    """
+    Splits a bill's text into overlapping passages of about `size` characters.
+
+    Passages end at the last paragraph break, line break or space before the limit
+    (when there is one in the second half of the window), so words are not cut, and
+    each passage starts `overlap` characters before the previous one ended.
+
+    Returns:
+        list: Passage texts, in document order.
+    """
+    text = text.strip() if text else ""
+    if not text:
+        return []
+    overlap = max(0, min(overlap, size // 2))
+
+    passages = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            for separator in ("\n\n", "\n", " "):
+                split_at = text.rfind(separator, start + size // 2, end)
+                if split_at != -1:
+                    end = split_at
+                    break
+        passage = text[start:end].strip()
+        if passage:
+            passages.append(passage)
+        if end >= length:
+            break
+        next_start = end - overlap
+        # Start the next passage on a word boundary
+        space = text.find(" ", next_start, end)
+        next_start = space + 1 if space != -1 else next_start
+        start = max(next_start, start + 1)
+    return passages
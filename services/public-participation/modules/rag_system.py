@@ -15,18 +15,13 @@ class RAGSystem:
     
     def retrieve_information(self, prompt):
         """
-        Retrieves relevant information from the knowledge graph based on the prompt using full-text search.
+        Retrieves the passages most relevant to the prompt from the knowledge graph
+        using full-text search. Returns them joined into one string, or None.
         """
-        description = self.kg.query_knowledge_graph(prompt)
-        return description
-    
-    def retrieve_information(self, prompt):
         logger.debug(f"Retrieving information for prompt: {prompt}")
-
-    def retrieve_information(self, prompt):
-        description = self.kg.query_knowledge_graph(prompt)
-        if description:
-            return description
+        passages = self.kg.query_knowledge_graph(prompt)
+        if passages:
+            return "\n\n".join(passages)
         else:
             return None
     
@@ -0,0 +1,201 @@
+# modules/reply_dispatcher.py
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Worker threads answering queued questions
+REPLY_WORKERS = int(os.environ.get("WHATSAPP_REPLY_WORKERS", 8))
+# Questions waiting across all numbers before new ones are turned away
+REPLY_MAX_PENDING = int(os.environ.get("WHATSAPP_REPLY_MAX_PENDING", 1000))
+
+
+class TwilioSender:
+    """
+    Sends replies as WhatsApp messages through the Twilio REST API.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str):
+        from twilio.rest import Client
+
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def send(self, to_number: str, body: str):
+        message = self.client.messages.create(from_=self.from_number, to=to_number, body=body)
+        logger.info(f"Sent reply {message.sid} to {to_number}.")
+
+
+class LogSender:
+    """
+    Local stand-in for Twilio: logs replies and keeps them in `sent` as (number, body).
+    """
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to_number: str, body: str):
+        with self._lock:
+            self.sent.append((to_number, body))
+        logger.info(f"Reply to {to_number} (not sent, no Twilio credentials): {body[:200]}")
+
+
+def get_sender():
+    """
+    Returns a TwilioSender when TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and
+    TWILIO_WHATSAPP_NUMBER are set, otherwise a LogSender.
+    """
+    account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
+    auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
+    from_number = os.environ.get("TWILIO_WHATSAPP_NUMBER")
+    if account_sid and auth_token and from_number:
+        return TwilioSender(account_sid, auth_token, from_number)
+    logger.warning("Twilio credentials are not configured; deferred replies will only be logged.")
+    return LogSender()
+
+
+class ReplyDispatcher:
+    """
+    Answers queued WhatsApp questions on a pool of worker threads and sends the
+    replies as separate messages, so the webhook can return immediately.
+
+    Each number has its own FIFO queue and at most one of its questions is being
+    answered at a time, so a user's replies arrive in the order they asked. Numbers
+    with queued questions take turns on the workers, so one busy user cannot hold
+    them all. Questions beyond `max_pending` are refused.
+
+    Args:
+        handler (callable): handler(number, text) -> reply body.
+        sender: Object with send(number, body), e.g. TwilioSender or LogSender.
+        workers (int): Worker threads.
+        max_pending (int): Maximum number of queued questions across all numbers.
+        error_reply (str): Sent when the handler fails.
+    """
+
+    def __init__(
+        self,
+        handler,
+        sender,
+        workers: int = REPLY_WORKERS,
+        max_pending: int = REPLY_MAX_PENDING,
+        error_reply: str = "Sorry, an error occurred while processing your request.",
+    ):
+        self.handler = handler
+        self.sender = sender
+        self.max_pending = max_pending
+        self.error_reply = error_reply
+
+        self._queues = {}  # number -> deque of (text, enqueued at)
+        self._ready = deque()  # numbers with queued questions and none in progress
+        self._pending = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = {"queued": 0, "rejected": 0, "sent": 0, "failed": 0, "max_wait_seconds": 0.0}
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"reply-worker-{n}", daemon=True)
+            for n in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, number: str, text: str) -> bool:
+        """
+        Queues a question. Returns False if the queue is full or the dispatcher is closed.
+        """
+        with self._condition:
+            if self._closed or self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                return False
+            queue = self._queues.get(number)
+            if queue is None:
+                # Not queued and not in progress: ready for the next free worker
+                queue = self._queues[number] = deque()
+                self._ready.append(number)
+            queue.append((text, time.monotonic()))
+            self._pending += 1
+            self._stats["queued"] += 1
+            self._condition.notify()
+        return True
+
+    def _next(self):
+        with self._condition:
+            while not self._ready and not self._closed:
+                self._condition.wait()
+            if not self._ready:
+                return None
+            number = self._ready.popleft()
+            text, enqueued_at = self._queues[number].popleft()
+            self._pending -= 1
+            wait = time.monotonic() - enqueued_at
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+            return number, text
+
+    def _done(self, number: str):
+        with self._condition:
+            if self._queues[number]:
+                # Back of the line, behind numbers that have been waiting
+                self._ready.append(number)
+                self._condition.notify()
+            else:
+                del self._queues[number]
+                self._condition.notify_all()
+
+    def _work(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            number, text = item
+            try:
+                try:
+                    body = self.handler(number, text)
+                except Exception as e:
+                    logger.error(f"Error answering {number}: {e}", exc_info=True)
+                    body = self.error_reply
+                    self._count("failed")
+                if body:
+                    self.sender.send(number, body)
+                    self._count("sent")
+            except Exception as e:
+                logger.error(f"Error sending reply to {number}: {e}")
+                self._count("failed")
+            finally:
+                self._done(number)
+
+    def _count(self, key: str):
+        with self._condition:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        with self._condition:
+            return dict(self._stats, pending=self._pending, active_numbers=len(self._queues))
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Waits until every queued question has been answered. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._queues:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, wait: bool = True):
+        """
+        Stops accepting questions; workers exit once the queued ones are answered.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
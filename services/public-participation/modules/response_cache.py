@@ -0,0 +1,216 @@
+# modules/response_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from redis import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Words that change the wording of a question but not what is being asked
+FILLER_WORDS = {"please", "kindly", "hi", "hello", "hey", "thanks", "thank", "you"}
+NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalizes a question for use in a cache key: lowercase, punctuation and
+    filler words removed, whitespace collapsed.
+    """
+    words = NON_WORD.sub(' ', prompt.lower()).split()
+    return ' '.join(word for word in words if word not in FILLER_WORDS)
+
+
+class ResponseCache:
+    """
+    Cache of generated answers keyed on the normalized question and the matched bill.
+
+    The key includes the bill's content hash, so answers about a bill whose text has
+    changed are never served; invalidate_bill also drops them eagerly. Entries expire
+    after a TTL and the least recently used ones are evicted beyond max_entries.
+
+    Backed by Redis (the same instance as app/services/redis_service.py) when it is
+    reachable, with an in-process LRU fallback otherwise.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[Redis] = None,
+        ttl: int = 3600,
+        max_entries: int = 10000,
+        prefix: str = "response:",
+    ):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.lru_key = f"{prefix}lru"
+
+        self._local = OrderedDict()  # key -> (expires_at, response, generation_seconds, bill_id)
+        self._local_by_bill = {}  # bill id -> set of keys
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_generation_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "ResponseCache":
+        """
+        Builds a cache on the Redis instance at REDIS_URL, falling back to in-process storage.
+        """
+        redis_url = os.environ.get("REDIS_URL")
+        redis_client = None
+        if redis_url:
+            try:
+                redis_client = Redis.from_url(redis_url, decode_responses=True, socket_connect_timeout=1)
+                redis_client.ping()
+                logger.info("Response cache is using Redis.")
+            except RedisError as e:
+                logger.warning(f"Redis unavailable for the response cache, using in-process cache: {e}")
+                redis_client = None
+        return cls(redis_client=redis_client, **kwargs)
+
+    @property
+    def backend(self) -> str:
+        return "redis" if self.redis is not None else "memory"
+
+    def make_key(self, prompt: str, bill: Optional[dict] = None, **params) -> str:
+        """
+        Builds the cache key from the normalized prompt, the matched bill (id and
+        content hash) and generation parameters such as max_tokens and temperature.
+        """
+        parts = {
+            "prompt": normalize_prompt(prompt),
+            "bill_id": bill.get('id') if bill else None,
+            "content_hash": bill.get('content_hash') if bill else None,
+            "params": params,
+        }
+        digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return f"{self.prefix}{digest}"
+
+    def _bill_key(self, bill_id) -> str:
+        return f"{self.prefix}bill:{bill_id}"
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached response, or None. Updates hit/miss metrics.
+        """
+        entry = self._redis_get(key) if self.redis is not None else self._local_get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            response, generation_seconds = entry
+            self.hits += 1
+            self.saved_generation_seconds += generation_seconds
+        return response
+
+    def set(self, key: str, response: str, bill_id=None, generation_seconds: float = 0.0):
+        if self.redis is not None:
+            self._redis_set(key, response, bill_id, generation_seconds)
+        else:
+            self._local_set(key, response, bill_id, generation_seconds)
+
+    def invalidate_bill(self, bill_id):
+        """
+        Drops every cached answer about the given bill.
+        """
+        if self.redis is not None:
+            try:
+                bill_key = self._bill_key(bill_id)
+                keys = list(self.redis.smembers(bill_key))
+                pipe = self.redis.pipeline()
+                if keys:
+                    pipe.delete(*keys)
+                    pipe.zrem(self.lru_key, *keys)
+                pipe.delete(bill_key)
+                pipe.execute()
+            except RedisError as e:
+                logger.error(f"Failed to invalidate cached responses for bill {bill_id}: {e}")
+            return
+        with self._lock:
+            for key in self._local_by_bill.pop(bill_id, set()):
+                self._local.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_generation_seconds": round(self.saved_generation_seconds, 3),
+            }
+
+    def _redis_get(self, key: str):
+        try:
+            data = self.redis.get(key)
+            if data is None:
+                return None
+            # Record the access for LRU eviction
+            self.redis.zadd(self.lru_key, {key: time.time()})
+            entry = json.loads(data)
+            return entry["response"], entry.get("generation_seconds", 0.0)
+        except (RedisError, ValueError) as e:
+            logger.error(f"Response cache lookup failed: {e}")
+            return None
+
+    def _redis_set(self, key: str, response: str, bill_id, generation_seconds: float):
+        entry = json.dumps({"response": response, "generation_seconds": generation_seconds})
+        try:
+            pipe = self.redis.pipeline()
+            pipe.setex(key, self.ttl, entry)
+            pipe.zadd(self.lru_key, {key: time.time()})
+            if bill_id is not None:
+                pipe.sadd(self._bill_key(bill_id), key)
+                pipe.expire(self._bill_key(bill_id), self.ttl)
+            pipe.zcard(self.lru_key)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                evicted = [member for member, _ in self.redis.zpopmin(self.lru_key, size - self.max_entries)]
+                if evicted:
+                    self.redis.delete(*evicted)
+        except RedisError as e:
+            logger.error(f"Failed to cache response: {e}")
+
+    def _local_get(self, key: str):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, response, generation_seconds, bill_id = entry
+            if expires_at < time.monotonic():
+                self._local_remove(key)
+                return None
+            self._local.move_to_end(key)
+            return response, generation_seconds
+
+    def _local_set(self, key: str, response: str, bill_id, generation_seconds: float):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl, response, generation_seconds, bill_id)
+            self._local.move_to_end(key)
+            if bill_id is not None:
+                self._local_by_bill.setdefault(bill_id, set()).add(key)
+            while len(self._local) > self.max_entries:
+                oldest = next(iter(self._local))
+                self._local_remove(oldest)
+
+    def _local_remove(self, key: str):
+        entry = self._local.pop(key, None)
+        if entry is None:
+            return
+        bill_id = entry[3]
+        keys = self._local_by_bill.get(bill_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._local_by_bill[bill_id]
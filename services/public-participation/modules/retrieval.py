@@ -0,0 +1,277 @@
+# modules/retrieval.py
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from .bill_retriever import BillRetriever
+from .passages import PASSAGE_TOP_K
+
+logger = logging.getLogger(__name__)
+
+# Time a single retrieval may take before partial results are returned
+RETRIEVAL_BUDGET_MS = float(os.environ.get("RETRIEVAL_BUDGET_MS", 250))
+# Reciprocal rank fusion constant; larger values flatten the weight of top ranks
+RRF_K = int(os.environ.get("RRF_K", 60))
+# Candidates taken from each source before fusion
+RETRIEVAL_DEPTH = int(os.environ.get("RETRIEVAL_DEPTH", 10))
+
+BM25 = "bm25"
+FUZZY = "fuzzy"
+VECTOR = "vector"
+ALL_SOURCES = (BM25, FUZZY, VECTOR)
+
+
+def reciprocal_rank_fusion(rankings: dict, rrf_k: int = RRF_K) -> list:
+    """
+    Fuses ranked lists of keys with reciprocal rank fusion: score = sum of 1 / (rrf_k + rank).
+
+    Args:
+        rankings (dict): {source name: [key, ...] best first}.
+        rrf_k (int): Fusion constant.
+
+    Returns:
+        list: (key, fused score, {source: 1-based rank}) tuples, best first.
+    """
+    scores = {}
+    ranks = {}
+    for source, keys in rankings.items():
+        for rank, key in enumerate(keys, start=1):
+            if key in ranks and source in ranks[key]:
+                continue
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            ranks.setdefault(key, {})[source] = rank
+    ordered = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [(key, scores[key], ranks[key]) for key in ordered]
+
+
+@dataclass
+class RetrievalResult:
+    """
+    Outcome of one retrieval. `partial` is set when a source missed the latency budget;
+    `timings` has the milliseconds taken by every source that answered in time, keyed
+    '<stage>.<source>' (e.g. 'bills.fuzzy', 'passages.vector').
+    """
+    match: dict = None
+    bills: list = field(default_factory=list)
+    passages: list = field(default_factory=list)
+    partial: bool = False
+    elapsed_ms: float = 0.0
+    timings: dict = field(default_factory=dict)
+
+
+class HybridRetriever:
+    """
+    One retrieval engine for bill questions, built on a BillRetriever.
+
+    Bills are ranked by three sources: BM25 over titles and descriptions (the 'billIndex'
+    fulltext index), fuzzy title matching (the TitleIndex) and passage embeddings (the
+    VectorIndex). Passages are ranked by BM25 ('passageIndex') and embeddings. The lists
+    are combined with reciprocal rank fusion, so scores on different scales never need
+    to be compared.
+
+    Remote sources run concurrently on a shared thread pool while the local fuzzy
+    ranking runs in the calling thread. Sources that have not answered when the latency
+    budget runs out are left out and the result is marked partial. A request makes one
+    deadline with deadline() and passes it to each of its calls, so all of its
+    retrievals share one budget. Tasks that missed their budget keep running, so each
+    source may hold at most `max_source_tasks` pool threads; a source at that limit is
+    skipped rather than queued, and one slow source cannot delay the others.
+
+    A fused bill is only accepted as the match when the fuzzy title score or the vector
+    similarity clears its threshold; BM25 contributes rank but never confirms a match
+    on its own.
+    """
+
+    def __init__(
+        self,
+        retriever: BillRetriever,
+        budget_ms: float = RETRIEVAL_BUDGET_MS,
+        rrf_k: int = RRF_K,
+        depth: int = RETRIEVAL_DEPTH,
+        sources=ALL_SOURCES,
+        max_workers: int = 8,
+        max_source_tasks: int = None,
+    ):
+        self.retriever = retriever
+        self.budget_ms = budget_ms
+        self.rrf_k = rrf_k
+        self.depth = depth
+        self.sources = tuple(sources)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        self.max_source_tasks = max_source_tasks or max(1, max_workers // 2)
+        self._running = {}  # source -> tasks submitted to the pool and not yet done
+        self._running_lock = threading.Lock()
+
+    def _enabled(self, source: str) -> bool:
+        if source not in self.sources:
+            return False
+        if source == BM25:
+            return self.retriever.use_fulltext
+        if source == VECTOR:
+            return self.retriever.vector_index is not None
+        return True
+
+    @staticmethod
+    def _timed(fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        return result, (time.perf_counter() - start) * 1000
+
+    def _submit(self, source: str, fn):
+        """Runs fn on the pool, or returns None if the source already holds its share of it"""
+        with self._running_lock:
+            if self._running.get(source, 0) >= self.max_source_tasks:
+                return None
+            self._running[source] = self._running.get(source, 0) + 1
+        future = self.executor.submit(self._timed, fn)
+        future.add_done_callback(lambda _: self._release(source))
+        return future
+
+    def _release(self, source: str):
+        with self._running_lock:
+            self._running[source] -= 1
+
+    def _gather(self, stage: str, remote: dict, local: dict, deadline: float, result: RetrievalResult) -> dict:
+        """
+        Runs the remote tasks on the pool and the local ones inline, then waits for the
+        remote ones until the deadline. Returns {source: ranked list} for the sources
+        that answered in time.
+        """
+        futures = {}
+        for source, fn in remote.items():
+            future = self._submit(source, fn)
+            if future is None:
+                result.partial = True
+                logger.info(f"Retrieval source '{stage}.{source}' skipped, its earlier tasks are still running.")
+            else:
+                futures[future] = source
+        answers = {}
+        for source, fn in local.items():
+            try:
+                answers[source], result.timings[f"{stage}.{source}"] = self._timed(fn)
+            except Exception as e:
+                logger.warning(f"Retrieval source '{source}' failed: {e}")
+
+        done, pending = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for future in done:
+            source = futures[future]
+            try:
+                answers[source], result.timings[f"{stage}.{source}"] = future.result()
+            except Exception as e:
+                logger.warning(f"Retrieval source '{source}' failed: {e}")
+        for future in pending:
+            future.cancel()
+            result.partial = True
+            logger.info(f"Retrieval source '{stage}.{futures[future]}' missed the latency budget.")
+        return answers
+
+    def deadline(self, budget_ms: float = None) -> float:
+        """
+        The time.monotonic() by which a request's retrievals must finish, `budget_ms`
+        (the retriever's budget by default) from now.
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        return time.monotonic() + budget_ms / 1000
+
+    def _finish(self, result: RetrievalResult, started: float) -> RetrievalResult:
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    def _rank_bills(self, prompt: str, deadline: float, result: RetrievalResult):
+        retriever = self.retriever
+        retriever._ensure_fresh()
+        remote = {}
+        if self._enabled(BM25):
+            remote[BM25] = lambda: retriever.fulltext_candidates(prompt)
+        if self._enabled(VECTOR):
+            remote[VECTOR] = lambda: retriever.vector_index.search_bills(prompt, k=self.depth)
+        local = {}
+        if self._enabled(FUZZY):
+            local[FUZZY] = lambda: retriever.index.rank(prompt, limit=self.depth)
+        answers = self._gather("bills", remote, local, deadline, result)
+
+        fuzzy_scores = {record['id']: record['score'] for record in answers.get(FUZZY, [])}
+        if FUZZY in answers and answers.get(BM25):
+            # BM25 candidates the n-gram pre-filter skipped can still confirm a title match
+            for record in retriever.index.rank(prompt, limit=self.depth, candidate_ids=answers[BM25]):
+                fuzzy_scores.setdefault(record['id'], record['score'])
+        similarities = dict(answers.get(VECTOR, []))
+        rankings = {
+            BM25: answers.get(BM25, []),
+            FUZZY: [record['id'] for record in answers.get(FUZZY, [])],
+            VECTOR: [bill_id for bill_id, _ in answers.get(VECTOR, [])],
+        }
+        for bill_id, score, ranks in reciprocal_rank_fusion(rankings, self.rrf_k):
+            record = retriever.index.get(bill_id)
+            if record is None:
+                continue
+            result.bills.append(dict(record, score=score, ranks=ranks))
+            if result.match is not None:
+                continue
+            if fuzzy_scores.get(bill_id, 0) >= retriever.match_threshold:
+                result.match = dict(record, score=fuzzy_scores[bill_id])
+            elif similarities.get(bill_id, 0.0) >= retriever.vector_threshold:
+                result.match = dict(record, score=round(similarities[bill_id] * 100))
+
+    def _rank_passages(self, prompt: str, bill_id, k: int, deadline: float, result: RetrievalResult):
+        retriever = self.retriever
+        remote = {}
+        if self._enabled(BM25):
+            remote[BM25] = lambda: retriever.fulltext_passages(prompt, bill_id=bill_id, k=self.depth)
+        if self._enabled(VECTOR):
+            remote[VECTOR] = lambda: retriever.vector_passages(prompt, bill_id=bill_id, k=self.depth)
+        answers = self._gather("passages", remote, {}, deadline, result)
+
+        passages = {}
+        rankings = {}
+        for source, found in answers.items():
+            rankings[source] = []
+            for passage in found:
+                key = (passage['bill_id'], passage['index'])
+                passages.setdefault(key, passage)
+                rankings[source].append(key)
+        result.passages = [
+            dict(passages[key], score=score)
+            for key, score, _ in reciprocal_rank_fusion(rankings, self.rrf_k)[:k]
+        ]
+
+    def match_bills(self, prompt: str, budget_ms: float = None, deadline: float = None) -> RetrievalResult:
+        """
+        Ranks bills for the prompt. `result.match` is the confident best bill or None.
+        Runs until `deadline`, if given, rather than for a budget of its own.
+        """
+        started = time.perf_counter()
+        result = RetrievalResult()
+        self._rank_bills(prompt, self.deadline(budget_ms) if deadline is None else deadline, result)
+        return self._finish(result, started)
+
+    def search_passages(
+        self, prompt: str, bill_id=None, k: int = PASSAGE_TOP_K, budget_ms: float = None, deadline: float = None
+    ) -> RetrievalResult:
+        """
+        Ranks passages for the prompt, optionally within one bill. Runs until
+        `deadline`, if given, rather than for a budget of its own.
+        """
+        started = time.perf_counter()
+        result = RetrievalResult()
+        self._rank_passages(prompt, bill_id, k, self.deadline(budget_ms) if deadline is None else deadline, result)
+        return self._finish(result, started)
+
+    def retrieve(self, prompt: str, k: int = PASSAGE_TOP_K, budget_ms: float = None, deadline: float = None) -> RetrievalResult:
+        """
+        Ranks bills, then passages within the matched bill (or across all bills when
+        none matched), both within one latency budget or until `deadline`.
+        """
+        started = time.perf_counter()
+        deadline = self.deadline(budget_ms) if deadline is None else deadline
+        result = RetrievalResult()
+        self._rank_bills(prompt, deadline, result)
+        bill_id = result.match['id'] if result.match else None
+        self._rank_passages(prompt, bill_id, k, deadline, result)
+        return self._finish(result, started)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
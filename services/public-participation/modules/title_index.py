@@ -0,0 +1,357 @@
+# modules/title_index.py
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz import process
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.environ.get("TITLE_INDEX_PATH", "data/title_index.json")
+
+NGRAM_SIZE = 3
+NON_ALNUM = re.compile(r'[^a-z0-9]')
+YEAR_PATTERN = re.compile(r'20\d{2}')
+UNKNOWN_YEAR = "Unknown"
+
+
+def normalize_title(text: str) -> str:
+    """
+    Normalize a bill title by removing underscores, dashes, and file extensions.
+    Ensures that words are capitalized appropriately.
+    """
+    # Remove the file extension if present
+    text = os.path.splitext(text)[0]
+    # Replace underscores and dashes with spaces
+    normalized = text.replace('_', ' ').replace('-', ' ').strip()
+    # Capitalize each word
+    return ' '.join([word.capitalize() for word in normalized.split()])
+
+
+def extract_year(title: str) -> str:
+    """
+    Extracts the year from the title if present.
+    Assumes the year is a four-digit number in the title.
+    """
+    match = YEAR_PATTERN.search(title)
+    if match:
+        return match.group(0)
+    return UNKNOWN_YEAR
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> set:
+    """
+    Returns the set of character n-grams of the text with case, spaces and punctuation removed,
+    so 'TheFinanceBill' and 'the finance bill' share the same grams.
+    """
+    compact = NON_ALNUM.sub('', text.lower())
+    if len(compact) < n:
+        return {compact} if compact else set()
+    return {compact[i:i + n] for i in range(len(compact) - n + 1)}
+
+
+class TitleIndex:
+    """
+    Persistent index of normalized bill titles.
+
+    Titles are normalized once, when a bill is ingested, and saved to a JSON file so
+    every process answering questions can load them without touching the graph.
+    A query is first scored against all titles at once with character n-gram TF-IDF,
+    and only the top candidates are re-ranked with rapidfuzz's partial ratio in one
+    batched pass. The matching record is returned directly.
+
+    The "bills grouped by year" listing is derived from the same records and cached
+    until the index changes, so list requests never need a graph round trip.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_INDEX_PATH,
+        rerank_candidates: int = 32,
+        max_df_ratio: float = 0.5,
+    ):
+        self.path = path
+        self.rerank_candidates = rerank_candidates
+        self.max_df_ratio = max_df_ratio
+        self._records = {}  # bill id -> {'id', 'title', 'normalized'}
+        # (ids, normalized titles, n-gram -> (positions, weights), norms), rebuilt after changes
+        self._snapshot = ([], [], {}, np.zeros(0, dtype=np.float32))
+        self._listing = None  # year -> sorted unique normalized titles
+        self._formatted_listings = {}  # (year, offset, limit) -> formatted text
+        self._dirty = True
+        self._mtime = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, bill_id):
+        return bill_id in self._records
+
+    def get(self, bill_id):
+        return self._records.get(bill_id)
+
+    def records(self) -> list:
+        with self._lock:
+            return list(self._records.values())
+
+    def add(self, bill_id, title: str, content_hash: str = None):
+        """
+        Adds or updates a bill, normalizing its title once.
+        The optional content hash identifies the version of the bill's text.
+        """
+        with self._lock:
+            self._records[bill_id] = {
+                'id': bill_id,
+                'title': title,
+                'normalized': normalize_title(title),
+                'year': extract_year(title),
+                'content_hash': content_hash,
+            }
+            self._invalidate()
+
+    def remove(self, bill_id):
+        with self._lock:
+            if self._records.pop(bill_id, None) is not None:
+                self._invalidate()
+
+    def _invalidate(self):
+        """
+        Marks the scoring arrays and the cached listings as stale. Caller holds the lock.
+        """
+        self._dirty = True
+        self._listing = None
+        self._formatted_listings = {}
+
+    def replace_all(self, titles: dict):
+        """
+        Replaces the index contents with {bill id: title}.
+        """
+        with self._lock:
+            self._records = {}
+            self._invalidate()
+            for bill_id, title in titles.items():
+                self.add(bill_id, title)
+
+    def _file_version(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> bool:
+        """
+        Loads the index from disk. Returns False if no index file exists yet.
+        """
+        try:
+            mtime = self._file_version()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load title index from {self.path}: {e}")
+            return False
+
+        with self._lock:
+            self._records = {record['id']: record for record in data.get('records', [])}
+            self._mtime = mtime
+            self._invalidate()
+        logger.info(f"Loaded {len(self._records)} titles from {self.path}.")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the index when another process (e.g. the ingest job) has rewritten the file.
+        """
+        try:
+            mtime = self._file_version()
+        except OSError:
+            return False
+        if mtime != self._mtime:
+            return self.load()
+        return False
+
+    def save(self):
+        """
+        Atomically writes the index to disk.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            data = {'records': list(self._records.values())}
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._mtime = self._file_version()
+        logger.info(f"Saved {len(data['records'])} titles to {self.path}.")
+
+    def _build(self):
+        """
+        Rebuilds the arrays and the n-gram postings used for scoring. Runs only after changes.
+        """
+        with self._lock:
+            if not self._dirty:
+                return self._snapshot
+            ids = list(self._records.keys())
+            choices = [self._records[bill_id]['normalized'] for bill_id in ids]
+
+            positions_by_gram = {}
+            for position, normalized in enumerate(choices):
+                for gram in char_ngrams(normalized):
+                    positions_by_gram.setdefault(gram, []).append(position)
+
+            total = len(ids)
+            norms = np.zeros(total, dtype=np.float32)
+            postings = {}
+            for gram, positions in positions_by_gram.items():
+                idf = math.log((1 + total) / (1 + len(positions))) + 1.0
+                positions = np.asarray(positions, dtype=np.int32)
+                postings[gram] = (positions, np.full(len(positions), idf * idf, dtype=np.float32))
+                norms[positions] += idf * idf
+
+            self._snapshot = (ids, choices, postings, np.sqrt(np.maximum(norms, 1e-12)))
+            self._dirty = False
+            return self._snapshot
+
+    def _candidate_positions(self, normalized_prompt: str, postings: dict, norms):
+        """
+        Scores the prompt against every title with n-gram TF-IDF and returns the best positions.
+        """
+        total = len(norms)
+        matched = [postings[gram] for gram in char_ngrams(normalized_prompt) if gram in postings]
+        if not matched:
+            return np.zeros(0, dtype=np.int64)
+        # Grams that appear in most titles ("the", "bil", ...) carry no signal
+        max_df = max(1, int(total * self.max_df_ratio))
+        selective = [posting for posting in matched if len(posting[0]) <= max_df] or matched
+
+        positions = np.concatenate([posting[0] for posting in selective])
+        weights = np.concatenate([posting[1] for posting in selective])
+        scores = np.bincount(positions, weights=weights, minlength=total) / norms
+
+        k = min(self.rerank_candidates, total)
+        if k < total:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(total)
+        return top[scores[top] > 0]
+
+    def rank(self, prompt: str, limit: int = 10, candidate_ids=None) -> list:
+        """
+        Ranks titles by their partial ratio with the prompt.
+
+        Args:
+            prompt (str): The user's question.
+            limit (int): Maximum number of records to return.
+            candidate_ids (iterable, optional): Restrict scoring to these bill ids.
+
+        Returns:
+            list: Up to `limit` records with their 'score', best first.
+        """
+        normalized_prompt = normalize_title(prompt)
+        if not normalized_prompt:
+            return []
+        if candidate_ids is not None:
+            ids = [bill_id for bill_id in candidate_ids if bill_id in self._records]
+            choices = [self._records[bill_id]['normalized'] for bill_id in ids]
+        else:
+            all_ids, all_choices, postings, norms = self._build()
+            top = self._candidate_positions(normalized_prompt, postings, norms)
+            ids = [all_ids[position] for position in top]
+            choices = [all_choices[position] for position in top]
+        if not choices:
+            return []
+
+        scores = process.cdist(
+            [normalized_prompt], choices,
+            scorer=fuzz.partial_ratio,
+            dtype=np.uint8,
+        )[0]
+        ranked = []
+        for position in np.argsort(-scores.astype(np.int16), kind='stable')[:limit]:
+            record = self._records.get(ids[position])
+            if record is not None:
+                ranked.append(dict(record, score=int(scores[position])))
+        return ranked
+
+    def match(self, prompt: str, threshold: int = 70, candidate_ids=None):
+        """
+        Finds the title that best matches the prompt.
+
+        Args:
+            prompt (str): The user's question.
+            threshold (int): Minimum partial ratio for a match to be considered relevant.
+            candidate_ids (iterable, optional): Restrict scoring to these bill ids.
+
+        Returns:
+            dict or None: The matching record with its 'score', or None.
+        """
+        ranked = self.rank(prompt, limit=1, candidate_ids=candidate_ids)
+        if not ranked:
+            return None
+        logger.debug(f"Best fuzzy match: {ranked[0]['normalized']} with score {ranked[0]['score']}")
+        if ranked[0]['score'] < threshold:
+            return None
+        return ranked[0]
+
+    def bills_by_year(self) -> dict:
+        """
+        Returns unique normalized titles grouped by year, newest year first.
+        Built once and cached until the index changes.
+        """
+        with self._lock:
+            if self._listing is None:
+                grouped = {}
+                seen = set()
+                for record in self._records.values():
+                    normalized = record['normalized']
+                    if normalized in seen:
+                        continue
+                    seen.add(normalized)
+                    year = record.get('year') or extract_year(record['title'])
+                    grouped.setdefault(year, []).append(normalized)
+                self._listing = {
+                    year: sorted(grouped[year]) for year in sorted(grouped.keys(), reverse=True)
+                }
+            return self._listing
+
+    def list_bills(self, year: str = None, offset: int = 0, limit: int = None) -> list:
+        """
+        Returns a page of (year, title) pairs from the cached listing, optionally for a single year.
+        """
+        listing = self.bills_by_year()
+        years = [year] if year is not None else list(listing.keys())
+        rows = [(bill_year, title) for bill_year in years for title in listing.get(bill_year, [])]
+        end = offset + limit if limit is not None else None
+        return rows[offset:end]
+
+    def format_bill_listing(self, year: str = None, offset: int = 0, limit: int = None) -> str:
+        """
+        Formats a page of the listing as the "List of Bills in Kenya grouped by year" answer.
+        Returns an empty string when there is nothing to list.
+        """
+        key = (year, offset, limit)
+        with self._lock:
+            cached = self._formatted_listings.get(key)
+            if cached is not None:
+                return cached
+
+            rows = self.list_bills(year=year, offset=offset, limit=limit)
+            if not rows:
+                return ""
+            lines = ["List of Bills in Kenya grouped by year:"]
+            current_year = None
+            for bill_year, title in rows:
+                if bill_year != current_year:
+                    lines.append(f"\nYear {bill_year}:")
+                    current_year = bill_year
+                lines.append(f"- {title}")
+            formatted = "\n".join(lines) + "\n"
+            self._formatted_listings[key] = formatted
+            return formatted
@@ -0,0 +1,172 @@
+# modules/token_budget.py
+
+import logging
+import math
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Context window requested from Ollama (num_ctx)
+NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", 4096))
+# Most tokens a prompt may use, instructions and question included
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 2048))
+# Answers are sized so prompt processing plus generation fits in this many seconds
+TARGET_RESPONSE_SECONDS = float(os.environ.get("TARGET_RESPONSE_SECONDS", 20))
+# Throughput assumed until generations have been measured
+GENERATION_TOKENS_PER_SECOND = float(os.environ.get("GENERATION_TOKENS_PER_SECOND", 15))
+PROMPT_TOKENS_PER_SECOND = float(os.environ.get("PROMPT_TOKENS_PER_SECOND", 150))
+# Fewest tokens ever requested for an answer
+MIN_PREDICT = int(os.environ.get("MIN_PREDICT", 64))
+# Passages retrieved as candidates for packing into the prompt
+CONTEXT_PASSAGES = int(os.environ.get("CONTEXT_PASSAGES", 8))
+# Optional tokenizer.json of the served model for exact counts
+TOKENIZER_PATH = os.environ.get("TOKENIZER_PATH")
+
+# Words, numbers and single punctuation marks; roughly what BPE tokenizers split on
+PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+# Average characters per token within a long word
+CHARS_PER_WORD_TOKEN = 4
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Fast token estimate: one token per word, number or punctuation mark, with long
+    words and numbers counted as one token per CHARS_PER_WORD_TOKEN characters.
+    Within about 10-15% of llama-family tokenizers on English legal text.
+    """
+    if not text:
+        return 0
+    return sum(
+        max(1, math.ceil(len(piece) / CHARS_PER_WORD_TOKEN)) if len(piece) > 6 else 1
+        for piece in PIECES.findall(text)
+    )
+
+
+def get_token_counter(tokenizer_path: str = TOKENIZER_PATH):
+    """
+    Returns a function counting tokens with the model's tokenizer when TOKENIZER_PATH
+    points to a tokenizer.json and the optional tokenizers package is installed,
+    otherwise approximate_tokens.
+    """
+    if tokenizer_path:
+        try:
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+            return lambda text: len(tokenizer.encode(text or "", add_special_tokens=False).ids)
+        except Exception as e:
+            logger.warning(f"Cannot load tokenizer from {tokenizer_path}, using the approximation: {e}")
+    return approximate_tokens
+
+
+class TokenBudget:
+    """
+    Sizes prompts and answers for the served model.
+
+    The prompt is kept within `prompt_budget` tokens by packing the most relevant
+    passages first, and the number of tokens to generate (num_predict) is chosen so
+    the answer fits the rest of the context window and, at the measured generation
+    speed, the target response time.
+    """
+
+    def __init__(
+        self,
+        num_ctx: int = NUM_CTX,
+        prompt_budget: int = PROMPT_TOKEN_BUDGET,
+        target_seconds: float = TARGET_RESPONSE_SECONDS,
+        generation_tps: float = GENERATION_TOKENS_PER_SECOND,
+        prompt_tps: float = PROMPT_TOKENS_PER_SECOND,
+        min_predict: int = MIN_PREDICT,
+        candidate_passages: int = CONTEXT_PASSAGES,
+        count_tokens=None,
+    ):
+        self.num_ctx = num_ctx
+        self.prompt_budget = min(prompt_budget, num_ctx - min_predict)
+        self.target_seconds = target_seconds
+        self.generation_tps = generation_tps
+        self.prompt_tps = prompt_tps
+        self.min_predict = min_predict
+        self.candidate_passages = candidate_passages
+        self.count_tokens = count_tokens or get_token_counter()
+        self._lock = threading.Lock()
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Cuts text to about max_tokens tokens, at a word boundary.
+        """
+        if max_tokens <= 0:
+            return ""
+        tokens = self.count_tokens(text)
+        if tokens <= max_tokens:
+            return text
+        cut = text[:int(len(text) * max_tokens / tokens)]
+        if text[len(cut)].isspace():
+            return cut
+        # Drop the partial last word
+        space = cut.rfind(" ")
+        return cut[:space] if space > len(cut) // 2 else cut
+
+    def pack(self, texts: list, max_tokens: int, separator_tokens: int = 3) -> (list, int):
+        """
+        Keeps texts, in the given (relevance) order, while they fit in max_tokens.
+        Texts that do not fit are skipped; if not even the first fits it is truncated.
+
+        Returns:
+            selected (list): The texts kept, in their original order.
+            tokens (int): Tokens used by the selected texts.
+        """
+        selected = []
+        used = 0
+        for text in texts:
+            cost = self.count_tokens(text) + (separator_tokens if selected else 0)
+            if used + cost <= max_tokens:
+                selected.append(text)
+                used += cost
+        if not selected and texts and max_tokens > 0:
+            first = self.truncate(texts[0], max_tokens)
+            if first:
+                selected, used = [first], self.count_tokens(first)
+        return selected, used
+
+    def context_budget(self, *fixed_texts) -> int:
+        """
+        Tokens left for retrieved context once the fixed parts of the prompt
+        (instructions, question, title) are counted.
+        """
+        return max(0, self.prompt_budget - sum(self.count_tokens(text) for text in fixed_texts))
+
+    def num_predict(self, prompt_tokens: int, max_tokens: int) -> int:
+        """
+        Tokens to generate: at most max_tokens, within the remaining context window,
+        and within the target response time at the measured speeds.
+        """
+        with self._lock:
+            generation_tps, prompt_tps = self.generation_tps, self.prompt_tps
+        generation_seconds = self.target_seconds - prompt_tokens / prompt_tps
+        by_latency = max(self.min_predict, int(generation_seconds * generation_tps))
+        room = self.num_ctx - prompt_tokens
+        return max(1, min(max_tokens, by_latency, room))
+
+    def options(self, prompt: str, max_tokens: int, temperature: float) -> (dict, int):
+        """
+        Returns the Ollama options for a prompt and the prompt's token count.
+        """
+        prompt_tokens = self.count_tokens(prompt)
+        options = {
+            "num_ctx": self.num_ctx,
+            "num_predict": self.num_predict(prompt_tokens, max_tokens),
+            "temperature": temperature,
+        }
+        return options, prompt_tokens
+
+    def observe(self, generation_tps: float = None, prompt_tps: float = None, weight: float = 0.2):
+        """
+        Folds measured throughput into the estimates (exponentially weighted).
+        """
+        with self._lock:
+            if generation_tps:
+                self.generation_tps += weight * (generation_tps - self.generation_tps)
+            if prompt_tps:
+                self.prompt_tps += weight * (prompt_tps - self.prompt_tps)
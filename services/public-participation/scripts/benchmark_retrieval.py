@@ -0,0 +1,136 @@
+# scripts/benchmark_retrieval.py
+
+import json
+import logging
+import random
+import re
+import sys
+import time
+from modules.retrieval import ALL_SOURCES, BM25, FUZZY, VECTOR, HybridRetriever
+
+logger = logging.getLogger(__name__)
+
+# Retrieval configurations compared by the benchmark
+MODES = {
+    "fuzzy": (FUZZY,),
+    "bm25": (BM25,),
+    "vector": (VECTOR,),
+    "hybrid": ALL_SOURCES,
+}
+K_VALUES = (1, 3, 5, 10)
+BUDGETS_MS = (50, 100, 250, 1000)
+
+# Words dropped from titles to turn them into the kind of question users ask
+TITLE_STOP_WORDS = {"the", "bill", "bills", "of", "and", "act", "amendment", "pdf"}
+
+
+def load_queries(path: str) -> list:
+    """
+    Loads labelled queries from a JSON lines file of {"query": ..., "bill_id": ...} objects.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_queries(retriever, sample_size: int = 100, words: int = 12, seed: int = 0) -> list:
+    """
+    Builds labelled queries from the indexed bills: a shortened title (the words users
+    type, without "the", "bill", the year, ...) and a window of words from one of the
+    bill's passages, for a sample of bills.
+    """
+    rng = random.Random(seed)
+    records = sorted(retriever.index.records(), key=lambda record: record['id'])
+    queries = []
+    for record in rng.sample(records, min(sample_size, len(records))):
+        title_words = [
+            word for word in record['normalized'].lower().split()
+            if word not in TITLE_STOP_WORDS and not re.fullmatch(r'\d{4}', word)
+        ]
+        if title_words:
+            queries.append({"query": " ".join(title_words), "bill_id": record['id'], "kind": "title"})
+
+        passages = retriever.bill_passages(record['id'], k=20)
+        if passages:
+            text_words = rng.choice(passages)['text'].split()
+            start = rng.randrange(max(1, len(text_words) - words))
+            queries.append({"query": " ".join(text_words[start:start + words]), "bill_id": record['id'], "kind": "passage"})
+    return queries
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def evaluate(search: HybridRetriever, queries: list, budget_ms: float, ks=K_VALUES) -> dict:
+    """
+    Runs every query through the retriever and returns recall@k for each k, latency
+    percentiles and the share of partial results.
+    """
+    hits = {k: 0 for k in ks}
+    latencies = []
+    partial = 0
+    for query in queries:
+        start = time.perf_counter()
+        result = search.match_bills(query["query"], budget_ms=budget_ms)
+        latencies.append((time.perf_counter() - start) * 1000)
+        partial += result.partial
+        ranked = [bill['id'] for bill in result.bills]
+        for k in ks:
+            hits[k] += query["bill_id"] in ranked[:k]
+    total = max(1, len(queries))
+    return {
+        "recall": {k: hits[k] / total for k in ks},
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "partial_rate": partial / total,
+    }
+
+
+def run_benchmark(retriever, queries: list, modes: dict = None, budgets=BUDGETS_MS, ks=K_VALUES) -> list:
+    """
+    Evaluates each retrieval mode under each latency budget.
+
+    Returns:
+        list: One {'mode', 'budget_ms', 'recall', 'p50_ms', 'p95_ms', 'partial_rate'} row per run.
+    """
+    rows = []
+    for mode, sources in (modes or MODES).items():
+        search = HybridRetriever(retriever, sources=sources)
+        try:
+            for budget_ms in budgets:
+                rows.append(dict(evaluate(search, queries, budget_ms, ks), mode=mode, budget_ms=budget_ms))
+        finally:
+            search.close()
+    return rows
+
+
+def format_report(rows: list, ks=K_VALUES) -> str:
+    header = f"{'mode':<8} {'budget':>7} " + " ".join(f"{f'R@{k}':>6}" for k in ks) + f" {'p50 ms':>8} {'p95 ms':>8} {'partial':>8}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        recalls = " ".join(f"{row['recall'][k]:>6.2f}" for k in ks)
+        lines.append(
+            f"{row['mode']:<8} {row['budget_ms']:>7.0f} {recalls} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['partial_rate']:>8.0%}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from modules.knowledge_graph import KnowledgeGraph
+
+    logging.basicConfig(level=logging.WARNING)
+    kg = KnowledgeGraph()
+    try:
+        if len(sys.argv) > 1:
+            queries = load_queries(sys.argv[1])
+        else:
+            kg.retriever._ensure_fresh()
+            queries = make_queries(kg.retriever)
+        print(f"{len(queries)} queries")
+        print(format_report(run_benchmark(kg.retriever, queries)))
+    finally:
+        kg.close()
@@ -0,0 +1,75 @@
+# scripts/benchmark_scoring.py
+
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from app.db.base_class import Base
+from app.models.models import Bill, Comment, CommentScore, ScoringState, User
+from app.services.comment_scoring import NEGATIVE_WORDS, POSITIVE_WORDS, TOPICS, LexiconScorer, score_new_comments
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZES = (100, 500, 2000)
+FILLER = "the bill this we our people county should will for and is a to of in".split()
+
+
+def make_comments(count: int, words: int = 40, seed: int = 0) -> list:
+    """Synthetic comments mixing filler, sentiment and topic words."""
+    rng = random.Random(seed)
+    vocabulary = FILLER * 4 + sorted(POSITIVE_WORDS) + sorted(NEGATIVE_WORDS) + ["not", "very"]
+    vocabulary += [word for keywords in TOPICS.values() for word in sorted(keywords)]
+    return [" ".join(rng.choice(vocabulary) for _ in range(rng.randint(words // 2, words * 2))) for _ in range(count)]
+
+
+def benchmark_scorer(texts: list) -> float:
+    """Comments per second through the scorer alone."""
+    scorer = LexiconScorer()
+    start = time.perf_counter()
+    scorer.score_batch(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def benchmark_pipeline(texts: list, batch_size: int) -> float:
+    """
+    Comments per second through score_new_comments (read, score, write and advance
+    the high-water mark) against an in-memory SQLite database.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, Bill.__table__, Comment.__table__, CommentScore.__table__, ScoringState.__table__,
+    ])
+    db = sessionmaker(bind=engine)()
+    try:
+        db.add_all([User(id=1, email="bench@example.com", hashed_password="x"), Bill(id=1, title="Bench Bill")])
+        created_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.execute(insert(Comment), [
+            {"text": text, "bill_id": 1, "user_id": 1, "created_at": created_at} for text in texts
+        ])
+        db.commit()
+        start = time.perf_counter()
+        scored = score_new_comments(db, batch_size=batch_size)
+        return scored / (time.perf_counter() - start)
+    finally:
+        db.close()
+
+
+def format_report(scorer_rate: float, pipeline_rates: dict) -> str:
+    lines = [f"scorer only: {scorer_rate:>10.0f} comments/s"]
+    for batch_size, rate in pipeline_rates.items():
+        lines.append(f"pipeline, batches of {batch_size:>5}: {rate:>10.0f} comments/s")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    texts = make_comments(count)
+    print(f"{count} comments")
+    print(format_report(
+        benchmark_scorer(texts),
+        {batch_size: benchmark_pipeline(texts, batch_size) for batch_size in BATCH_SIZES},
+    ))
@@ -41,6 +41,7 @@ class Bill(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
+    url = Column(String, nullable=True)
     file_path = Column(String, nullable=False)  # Updated from pdf_path to file_path
     text_content = Column(Text, nullable=True)
 
@@ -0,0 +1,210 @@
+# scripts/downloader.py
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_DIR = "bills_pdfs"
+
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 8))
+# Concurrent requests allowed against a single host
+DOWNLOAD_PER_HOST = int(os.environ.get("DOWNLOAD_PER_HOST", 2))
+CHUNK_SIZE = 64 * 1024
+
+DOWNLOADED = "downloaded"
+NOT_MODIFIED = "not_modified"
+FAILED = "failed"
+
+
+def sanitize_filename(url):
+    parsed_url = urlparse(url)
+    filename = os.path.basename(parsed_url.path)
+    # Remove any query parameters
+    filename = filename.split('?')[0]
+    return filename
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    file_path: str
+    status: str
+    bytes_received: int = 0
+    resumed: bool = False
+    error: Optional[str] = None
+
+
+class Downloader:
+    """
+    Concurrent, resumable PDF downloader.
+
+    All requests go through one keep-alive requests.Session shared by a thread pool,
+    with at most `per_host_limit` requests in flight per host. Bodies are streamed to
+    a .part file in chunks; an interrupted download resumes with a Range request
+    (guarded by If-Range). The ETag and Last-Modified of every finished download are
+    kept in a <file>.meta.json sidecar and sent back as If-None-Match/If-Modified-Since,
+    so unchanged PDFs are answered with 304 and never fetched again.
+    """
+
+    def __init__(
+        self,
+        download_dir: str = DOWNLOAD_DIR,
+        max_workers: int = DOWNLOAD_WORKERS,
+        per_host_limit: int = DOWNLOAD_PER_HOST,
+        chunk_size: int = CHUNK_SIZE,
+        timeout: float = 30.0,
+        session: requests.Session = None,
+    ):
+        self.download_dir = download_dir
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def file_path(self, url: str) -> str:
+        return os.path.join(self.download_dir, sanitize_filename(url))
+
+    @staticmethod
+    def _meta_path(file_path: str) -> str:
+        return f"{file_path}.meta.json"
+
+    def load_meta(self, file_path: str) -> dict:
+        try:
+            with open(self._meta_path(file_path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, file_path: str, meta: dict):
+        meta_path = self._meta_path(file_path)
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_limits[host]
+
+    def _conditional_headers(self, file_path: str, meta: dict) -> dict:
+        """
+        Validators for a file we already have: its ETag and Last-Modified, or its mtime
+        for files downloaded before validators were recorded.
+        """
+        if not os.path.exists(file_path):
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        if not headers:
+            headers["If-Modified-Since"] = formatdate(os.path.getmtime(file_path), usegmt=True)
+        return headers
+
+    def download(self, url: str) -> DownloadResult:
+        """
+        Downloads one URL into the download directory, resuming or skipping it when possible.
+        """
+        file_path = self.file_path(url)
+        with self._host_limit(url):
+            try:
+                return self._download(url, file_path)
+            except (RequestException, OSError) as e:
+                logger.error(f"Failed to download {url}: {e}")
+                return DownloadResult(url, file_path, FAILED, error=str(e))
+
+    def _download(self, url: str, file_path: str, allow_resume: bool = True) -> DownloadResult:
+        partial_path = f"{file_path}.part"
+        meta = self.load_meta(file_path)
+        headers = self._conditional_headers(file_path, meta)
+
+        offset = os.path.getsize(partial_path) if allow_resume and os.path.exists(partial_path) else 0
+        partial = meta.get("partial", {})
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            # The server only honours the range if the file has not changed since the part was written
+            validator = partial.get("etag") or partial.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                logger.info(f"{url} has not changed. Skipping.")
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                return DownloadResult(url, file_path, NOT_MODIFIED)
+            if response.status_code == 416:
+                # The part is not a prefix of the current file; start over
+                os.remove(partial_path)
+                return self._download(url, file_path, allow_resume=False)
+            response.raise_for_status()
+
+            resumed = offset > 0 and response.status_code == 206
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            # Record the validators first so an interrupted download can be resumed safely
+            self._save_meta(file_path, dict(meta, url=url, partial=validators))
+
+            received = 0
+            with open(partial_path, 'ab' if resumed else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        received += len(chunk)
+
+        os.replace(partial_path, file_path)
+        self._save_meta(file_path, dict(validators, url=url, size=os.path.getsize(file_path)))
+        logger.info(f"Downloaded {url} ({received} bytes{', resumed' if resumed else ''}).")
+        return DownloadResult(url, file_path, DOWNLOADED, bytes_received=received, resumed=resumed)
+
+    def unique_urls(self, urls: Iterable[str]) -> list:
+        """
+        Keeps the first URL for each file. Several links can point at the same file, and
+        two downloads of one file would write the same partial file at once.
+        """
+        unique = {}
+        for url in urls:
+            unique.setdefault(self.file_path(url), url)
+        return list(unique.values())
+
+    def iter_downloads(self, urls: Iterable[str]) -> Iterator[DownloadResult]:
+        """
+        Downloads the URLs concurrently and yields each result as soon as it finishes.
+        """
+        os.makedirs(self.download_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.download, url) for url in self.unique_urls(urls)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def download_all(self, urls: Iterable[str]) -> list:
+        return list(self.iter_downloads(urls))
+
+    def close(self):
+        self.session.close()
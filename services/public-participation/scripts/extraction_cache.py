@@ -0,0 +1,205 @@
+# scripts/extraction_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Extracted text keyed by the SHA-256 of the PDF, next to processed_bills/
+EXTRACTION_CACHE_DIR = os.environ.get("EXTRACTION_CACHE_DIR", "extraction_cache")
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a file, read in 1 MB chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of text extracted from PDFs.
+
+    Entries are stored as <dir>/<first two hex chars>/<sha256>.txt with a .json sidecar
+    recording how long the extraction took, so identical PDFs (re-downloaded, or published
+    under different URLs) are never run through pdfminer or tesseract twice. Hits,
+    misses and the extraction time saved are counted per run and accumulated in stats.json.
+    """
+
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.stats_path = os.path.join(cache_dir, "stats.json")
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def text_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.txt")
+
+    def _meta_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def contains(self, digest: str) -> bool:
+        return os.path.exists(self._meta_path(digest))
+
+    def extraction_seconds(self, digest: str) -> float:
+        try:
+            with open(self._meta_path(digest), 'r', encoding='utf-8') as f:
+                return float(json.load(f).get("seconds", 0.0))
+        except (OSError, ValueError):
+            return 0.0
+
+    def iter_chunks(self, digest: str, chunk_chars: int = READ_CHUNK_BYTES):
+        """
+        Yields the cached text of a PDF in pieces of at most chunk_chars characters.
+        """
+        with open(self.text_path(digest), 'r', encoding='utf-8') as f:
+            for chunk in iter(lambda: f.read(chunk_chars), ""):
+                yield chunk
+
+    def open_entry(self, digest: str) -> "CacheEntryWriter":
+        """
+        Starts writing a new entry. Text is written to a partial file and only becomes
+        visible to lookups once the writer is committed.
+        """
+        return CacheEntryWriter(self, digest)
+
+    def put_text(self, digest: str, text: str, seconds: float):
+        with self.open_entry(digest) as entry:
+            entry.write(text)
+            entry.commit(seconds)
+
+    def record_hit(self, digest: str):
+        seconds = self.extraction_seconds(digest)
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += seconds
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def run_stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+    def load_stats(self) -> dict:
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def save_stats(self):
+        """
+        Adds this run's counts to the totals in stats.json and resets them.
+        """
+        run = self.run_stats()
+        totals = self.load_stats()
+        for key, value in run.items():
+            totals[key] = round(totals.get(key, 0) + value, 3)
+        totals["last_run"] = dict(run, finished_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.stats_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(totals, f, indent=2)
+        os.replace(tmp_path, self.stats_path)
+        with self._lock:
+            self.hits = self.misses = 0
+            self.saved_seconds = 0.0
+
+    def report(self) -> dict:
+        """
+        Returns the cached entry count and size together with the accumulated statistics.
+        """
+        entries = 0
+        size = 0
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".txt"):
+                        entries += 1
+                        size += os.path.getsize(os.path.join(root, name))
+        totals = self.load_stats()
+        lookups = totals.get("hits", 0) + totals.get("misses", 0)
+        return dict(
+            totals,
+            entries=entries,
+            size_bytes=size,
+            hit_rate=round(totals.get("hits", 0) / lookups, 3) if lookups else 0.0,
+        )
+
+
+class CacheEntryWriter:
+    """
+    Writes one cache entry incrementally; used for OCR text that arrives window by window.
+    """
+
+    def __init__(self, cache: ExtractionCache, digest: str):
+        self.cache = cache
+        self.digest = digest
+        self.path = cache.text_path(digest)
+        self.partial_path = f"{self.path}.{os.getpid()}.part"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.partial_path, 'w', encoding='utf-8')
+
+    def write(self, text: str):
+        self._file.write(text)
+
+    def commit(self, seconds: float):
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+        meta_path = self.cache._meta_path(self.digest)
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({"seconds": round(seconds, 3), "size": os.path.getsize(self.path)}, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.abort()
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Cached extractions: {report['entries']} ({report['size_bytes'] / (1024 * 1024):.1f} MB)",
+        f"Hits: {report.get('hits', 0)}",
+        f"Misses: {report.get('misses', 0)}",
+        f"Hit rate: {report['hit_rate']:.1%}",
+        f"Extraction time saved: {report.get('saved_seconds', 0.0):.1f} s",
+    ]
+    last_run = report.get("last_run")
+    if last_run:
+        lines.append(
+            f"Last run ({last_run.get('finished_at')}): {last_run['hits']} hits, "
+            f"{last_run['misses']} misses, {last_run['saved_seconds']:.1f} s saved"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    cache_dir = sys.argv[1] if len(sys.argv) > 1 else EXTRACTION_CACHE_DIR
+    print(format_report(ExtractionCache(cache_dir).report()))
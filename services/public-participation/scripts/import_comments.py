@@ -0,0 +1,42 @@
+# scripts/import_comments.py
+
+import argparse
+import logging
+from app.db.session import SessionLocal
+from app.services.comment_import import FORMATS, detect_format, import_comments
+from app.services.graph_writer import graph_writer
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import comments from an NDJSON or CSV file.")
+    parser.add_argument("path", help="NDJSON or CSV file of comments")
+    parser.add_argument("--user-id", type=int, required=True, help="User credited with rows that name no user_id")
+    parser.add_argument("--format", choices=FORMATS, help="Detected from the file extension by default")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.path, "r", encoding="utf-8-sig", newline="") as stream:
+            report = import_comments(
+                db, stream,
+                format=args.format or detect_format(args.path),
+                user_id=args.user_id,
+                batch_size=args.batch_size,
+            )
+    finally:
+        db.close()
+        # Writes the queued graph updates before exiting
+        graph_writer.close()
+
+    print(f"Received {report.received}, inserted {report.inserted}, rejected {report.rejected} "
+          f"in {report.seconds:.1f}s ({report.rows_per_second:.0f} rows/s)")
+    for error in report.errors:
+        print(f"  line {error['line']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
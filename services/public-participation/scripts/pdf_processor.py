@@ -4,12 +4,18 @@ from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env
 
 import os
+import sys
+import time
 import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import pytesseract
 from pdfminer.high_level import extract_text
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
+from sqlalchemy import update
 from sqlalchemy.exc import SQLAlchemyError
 from .database_setup import SessionLocal, Bill, engine
+from .extraction_cache import ExtractionCache, file_digest, format_report
 
 # Configure logging
 logging.basicConfig(
@@ -25,103 +31,401 @@ logger = logging.getLogger(__name__)
 DOWNLOAD_DIR = "bills_pdfs"
 PROCESSED_DIR = "processed_bills"
 
-def is_scanned_pdf(pdf_path):
+# Worker processes used for text extraction and OCR
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+# Pages of a scanned PDF rendered and OCR'd by a single task
+OCR_WINDOW_PAGES = int(os.environ.get("OCR_WINDOW_PAGES", 4))
+# Bills updated in the database per commit
+COMMIT_BATCH_SIZE = int(os.environ.get("PDF_COMMIT_BATCH_SIZE", 50))
+# Resolution scanned pages are rendered at for OCR
+OCR_DPI = int(os.environ.get("OCR_DPI", 200))
+# Characters of extracted text sent to the database per UPDATE
+DB_TEXT_CHUNK_CHARS = 1024 * 1024
+
+def probe_pdf(pdf_path):
+    """
+    Extracts the first page with pdfminer. Returns its text, or None if it cannot be read.
+    The result decides whether the PDF is scanned and is reused as the first page of the text.
+    """
     try:
-        text = extract_text(pdf_path, maxpages=1)
-        return not bool(text.strip())
+        return extract_text(pdf_path, maxpages=1)
     except Exception as e:
         logger.warning(f"Could not determine if PDF is scanned: {e}")
-        return True
+        return None
 
-def extract_text_with_ocr(pdf_path):
+def is_scanned_pdf(pdf_path):
+    first_page = probe_pdf(pdf_path)
+    return not (first_page and first_page.strip())
+
+def count_pages(pdf_path):
     try:
-        pages = convert_from_path(pdf_path)
+        return int(pdfinfo_from_path(pdf_path)["Pages"])
     except Exception as e:
-        logger.error(f"Error converting PDF to images: {e}")
-        return ""
+        logger.error(f"Could not read the page count of {pdf_path}: {e}")
+        return 0
 
-    text = ""
-    for page_number, page in enumerate(pages, start=1):
-        logger.info(f"Performing OCR on page {page_number} of {pdf_path}")
+def page_windows(page_count, window=OCR_WINDOW_PAGES):
+    """
+    Splits pages 1..page_count into (first_page, last_page) windows of at most `window` pages.
+    """
+    window = max(1, window)
+    return [
+        (first_page, min(first_page + window - 1, page_count))
+        for first_page in range(1, page_count + 1, window)
+    ]
+
+def ocr_pages(pdf_path, first_page, last_page, dpi=OCR_DPI):
+    """
+    OCRs pages first_page..last_page (1-based, inclusive).
+    Pages are rendered one at a time, so only a single page image is ever held in memory.
+    """
+    texts = []
+    for page_number in range(first_page, last_page + 1):
         try:
-            page_text = pytesseract.image_to_string(page, lang='eng')
-            text += page_text + "\n"
+            pages = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
         except Exception as e:
-            logger.error(f"OCR error on page {page_number}: {e}")
-    return text
+            logger.error(f"Error converting page {page_number} of {pdf_path} to an image: {e}")
+            continue
+        logger.info(f"Performing OCR on page {page_number} of {pdf_path}")
+        for page in pages:
+            try:
+                texts.append(pytesseract.image_to_string(page, lang='eng') + "\n")
+            except Exception as e:
+                logger.error(f"OCR error on page {page_number}: {e}")
+            finally:
+                page.close()
+    return "".join(texts)
+
+def iter_ocr_text(pdf_path, window=OCR_WINDOW_PAGES, dpi=OCR_DPI):
+    """
+    Yields the OCR text of a scanned PDF window by window, in page order.
+    """
+    for first_page, last_page in page_windows(count_pages(pdf_path), window):
+        yield ocr_pages(pdf_path, first_page, last_page, dpi)
+
+def extract_text_with_ocr(pdf_path):
+    return "".join(iter_ocr_text(pdf_path))
+
+def extract_remaining_text(pdf_path, first_page):
+    """
+    Extracts a text-based PDF, reusing the first page already extracted by probe_pdf.
+    """
+    try:
+        return first_page + extract_text(pdf_path, page_numbers=range(1, sys.maxsize))
+    except Exception as e:
+        logger.error(f"Error extracting text from {pdf_path}: {e}")
+        return ""
 
 def extract_text_from_pdf(pdf_path):
-    if is_scanned_pdf(pdf_path):
-        logger.info(f"{pdf_path} is a scanned PDF. Using OCR.")
-        return extract_text_with_ocr(pdf_path)
-    else:
+    first_page = probe_pdf(pdf_path)
+    if first_page and first_page.strip():
+        logger.info(f"{pdf_path} is a text-based PDF. Extracting text.")
+        return extract_remaining_text(pdf_path, first_page)
+    logger.info(f"{pdf_path} is a scanned PDF. Using OCR.")
+    return extract_text_with_ocr(pdf_path)
+
+def extract_or_count_pages(pdf_path, cache_dir=None):
+    """
+    Worker task: extracts a text-based PDF, or returns the page count of a scanned one
+    so its OCR can be split into page windows. When a cache directory is given, the
+    PDF is hashed first and nothing is extracted if its text is already cached.
+
+    Returns:
+        tuple: (text, page_count, digest, cached). text is None for a scanned PDF;
+        digest is None without a cache; cached is True on a cache hit.
+    """
+    digest = None
+    if cache_dir:
+        digest = file_digest(pdf_path)
+        if ExtractionCache(cache_dir).contains(digest):
+            logger.info(f"Using cached text for {pdf_path}.")
+            return None, 0, digest, True
+    first_page = probe_pdf(pdf_path)
+    if first_page and first_page.strip():
         logger.info(f"{pdf_path} is a text-based PDF. Extracting text.")
+        return extract_remaining_text(pdf_path, first_page), 0, digest, False
+    logger.info(f"{pdf_path} is a scanned PDF. Using OCR.")
+    return None, count_pages(pdf_path), digest, False
+
+def run_timed(function, *args):
+    """
+    Worker task wrapper returning (result, seconds spent).
+    """
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+def extract_bills(jobs, max_workers=None, executor=None, ocr_window=OCR_WINDOW_PAGES, dpi=OCR_DPI, cache=None):
+    """
+    Extracts the text of many PDFs across worker processes.
+
+    Every PDF is probed and, if text-based, extracted by one task. Scanned PDFs are
+    split into OCR tasks of `ocr_window` pages that run in parallel; their text is
+    streamed back in page order as soon as the preceding windows are done. At most two
+    tasks per worker are in flight, so memory stays bounded however many bills are
+    queued and however many pages they have.
+
+    With an ExtractionCache, PDFs whose SHA-256 is cached are streamed from the cache
+    without any extraction, and newly extracted text is added to it.
+
+    Args:
+        jobs (iterable): (bill id, pdf path) pairs.
+        max_workers (int, optional): Worker processes, PDF_WORKERS by default.
+        executor (Executor, optional): Executor to use instead of a new process pool.
+        ocr_window (int): Pages per OCR task.
+        dpi (int): Resolution scanned pages are rendered at.
+        cache (ExtractionCache, optional): Cache of extracted text.
+
+    Yields:
+        tuple: (bill id, text chunk, done). A bill's chunks arrive in page order and
+        its last chunk has done=True.
+    """
+    max_workers = max_workers or PDF_WORKERS
+    max_in_flight = max_workers * 2
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    cache_dir = cache.cache_dir if cache is not None else None
+
+    tasks = deque(('extract', bill_id, (pdf_path,)) for bill_id, pdf_path in jobs)
+    in_flight = {}
+    ocr_progress = {}  # bill id -> state of its OCR windows
+    try:
+        while tasks or in_flight:
+            while tasks and len(in_flight) < max_in_flight:
+                task = tasks.popleft()
+                kind, bill_id, args = task
+                if kind == 'extract':
+                    future = executor.submit(run_timed, extract_or_count_pages, *args, cache_dir)
+                else:
+                    future = executor.submit(run_timed, ocr_pages, *args, dpi)
+                in_flight[future] = task
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, bill_id, args = in_flight.pop(future)
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    logger.error(f"Extraction task failed for {args[0]}: {e}")
+                    result, seconds = (("", 0, None, False) if kind == 'extract' else ""), 0.0
+
+                if kind == 'extract':
+                    text, page_count, digest, cached = result
+                    if cached:
+                        cache.record_hit(digest)
+                        for chunk in cache.iter_chunks(digest):
+                            yield bill_id, chunk, False
+                        yield bill_id, "", True
+                        continue
+                    if digest is not None:
+                        cache.record_miss()
+                    if text is not None or not page_count:
+                        if digest is not None and text and text.strip():
+                            cache.put_text(digest, text, seconds)
+                        yield bill_id, text or "", True
+                        continue
+                    windows = page_windows(page_count, ocr_window)
+                    ocr_progress[bill_id] = {
+                        'windows': len(windows),
+                        'next': 0,
+                        'ready': {},  # window index -> text, until it can be emitted in order
+                        'seconds': seconds,
+                        'has_text': False,
+                        'entry': cache.open_entry(digest) if digest is not None else None,
+                    }
+                    # Queue the windows first so a started bill finishes before new ones begin
+                    tasks.extendleft(reversed([
+                        (('ocr', index), bill_id, (args[0], first_page, last_page))
+                        for index, (first_page, last_page) in enumerate(windows)
+                    ]))
+                else:
+                    progress = ocr_progress[bill_id]
+                    progress['ready'][kind[1]] = result
+                    progress['seconds'] += seconds
+                    # Emit every window that is now contiguous with what was already emitted
+                    while progress['next'] in progress['ready']:
+                        chunk = progress['ready'].pop(progress['next'])
+                        progress['next'] += 1
+                        progress['has_text'] = progress['has_text'] or bool(chunk.strip())
+                        entry = progress['entry']
+                        if entry is not None:
+                            entry.write(chunk)
+                        done_bill = progress['next'] == progress['windows']
+                        if done_bill:
+                            del ocr_progress[bill_id]
+                            if entry is not None:
+                                if progress['has_text']:
+                                    entry.commit(progress['seconds'])
+                                else:
+                                    entry.abort()
+                        yield bill_id, chunk, done_bill
+    finally:
+        for progress in ocr_progress.values():
+            if progress['entry'] is not None:
+                progress['entry'].abort()
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+def _commit(session):
+    try:
+        session.commit()
+        return True
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.error(f"Database error while committing processed bills: {e}")
+        return False
+
+def store_text_from_file(session, bill_id, text_filename, chunk_chars=DB_TEXT_CHUNK_CHARS):
+    """
+    Copies a processed text file into the bill's text_content in fixed-size pieces,
+    so the text is never held in memory as a whole. Runs inside the caller's
+    transaction, so a bill is never committed with partial text.
+    """
+    statement = update(Bill).where(Bill.id == bill_id).execution_options(synchronize_session=False)
+    with open(text_filename, 'r', encoding='utf-8') as f:
+        session.execute(statement.values(text_content=f.read(chunk_chars)))
+        for chunk in iter(lambda: f.read(chunk_chars), ""):
+            session.execute(statement.values(text_content=Bill.text_content + chunk))
+
+def _text_filename(pdf_path):
+    return os.path.join(PROCESSED_DIR, f"{os.path.splitext(os.path.basename(pdf_path))[0]}.txt")
+
+class ProcessedTextWriter:
+    """
+    Streams one bill's extracted text to PROCESSED_DIR/<name>.txt through a partial
+    file that is renamed into place only when the bill is complete and has text.
+    """
+
+    def __init__(self, pdf_path):
+        self.text_filename = _text_filename(pdf_path)
+        self.partial_filename = f"{self.text_filename}.part"
+        self.has_text = False
         try:
-            return extract_text(pdf_path)
-        except Exception as e:
-            logger.error(f"Error extracting text from {pdf_path}: {e}")
-            return ""
+            self._file = open(self.partial_filename, 'w', encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Error writing text file {self.partial_filename}: {e}")
+            self._file = None
+
+    def write(self, chunk):
+        if self._file is None or not chunk:
+            return
+        try:
+            self._file.write(chunk)
+            self.has_text = self.has_text or bool(chunk.strip())
+        except OSError as e:
+            logger.error(f"Error writing text file {self.partial_filename}: {e}")
+            self.close()
+
+    def finish(self):
+        """
+        Completes the file. Returns False if the text could not be saved, in which case
+        the bill should be left to be retried on the next run. When the text is empty
+        (has_text is False) no file is kept.
+        """
+        if self._file is None:
+            self.close()
+            return False
+        self._file.close()
+        self._file = None
+        if self.has_text:
+            os.replace(self.partial_filename, self.text_filename)
+        else:
+            os.remove(self.partial_filename)
+        return True
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.partial_filename):
+            os.remove(self.partial_filename)
 
-def process_pdfs():
+def process_pdfs(max_workers=None, batch_size=COMMIT_BATCH_SIZE, dpi=OCR_DPI, cache=None):
+    """
+    Extracts text for every bill without text_content, in parallel, and saves it to
+    PROCESSED_DIR and the database. Bills with a missing PDF or no extractable text
+    are deleted. Database changes are committed every `batch_size` bills.
+
+    Text is streamed: OCR output is appended to a partial file as pages finish and
+    then copied to the database in pieces, so memory stays flat regardless of page count.
+    PDFs already extracted once (by SHA-256) are served from the extraction cache.
+
+    Returns:
+        bool: True if every database commit succeeded.
+    """
     if not os.path.exists(PROCESSED_DIR):
         os.makedirs(PROCESSED_DIR)
         logger.debug(f"Created processed bills directory at {PROCESSED_DIR}.")
 
+    if cache is None:
+        cache = ExtractionCache()
+
     session = SessionLocal()
-    # Fetch bills where text_content is empty or None
-    bills = session.query(Bill).filter(
-        (Bill.text_content == "") | (Bill.text_content == None)
-    ).all()
+    success = True
+    writers = {}  # bill id -> ProcessedTextWriter
+    try:
+        # Fetch bills where text_content is empty or None
+        bills = session.query(Bill).filter(
+            (Bill.text_content == "") | (Bill.text_content == None)
+        ).all()
 
-    logger.info(f"Processing {len(bills)} bills with no extracted text.")
+        logger.info(f"Processing {len(bills)} bills with no extracted text.")
 
-    for bill in bills:
-        pdf_path = bill.file_path  # Updated from pdf_path to file_path
-        if not os.path.exists(pdf_path):
-            logger.error(f"PDF file does not exist: {pdf_path}. Deleting bill from database.")
-            try:
+        bills_by_id = {}
+        for bill in bills:
+            pdf_path = bill.file_path  # Updated from pdf_path to file_path
+            if not os.path.exists(pdf_path):
+                logger.error(f"PDF file does not exist: {pdf_path}. Deleting bill from database.")
                 session.delete(bill)
-                session.commit()
-                logger.info(f"Deleted bill '{bill.title}' due to missing PDF file.")
-            except SQLAlchemyError as e:
-                session.rollback()
-                logger.error(f"Failed to delete bill '{bill.title}': {e}")
-            continue
+                continue
+            bills_by_id[bill.id] = bill
+        if len(bills_by_id) < len(bills):
+            success = _commit(session) and success
 
-        text = extract_text_from_pdf(pdf_path)
-        if text.strip():
-            bill.text_content = text
-            # Save the text to a file
-            text_filename = os.path.join(
-                PROCESSED_DIR,
-                f"{os.path.splitext(os.path.basename(pdf_path))[0]}.txt"
-            )
-            try:
-                with open(text_filename, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                logger.info(f"Processed and saved text for '{bill.title}'.")
-            except Exception as e:
-                logger.error(f"Error writing text file {text_filename}: {e}")
+        pending = 0
+        jobs = [(bill_id, bill.file_path) for bill_id, bill in bills_by_id.items()]
+        for bill_id, chunk, done in extract_bills(jobs, max_workers=max_workers, dpi=dpi, cache=cache):
+            bill = bills_by_id[bill_id]
+            writer = writers.get(bill_id)
+            if writer is None:
+                writer = writers[bill_id] = ProcessedTextWriter(bill.file_path)
+            writer.write(chunk)
+            if not done:
                 continue
 
-            try:
-                session.commit()
-                logger.debug(f"Updated text_content for '{bill.title}' in the database.")
-            except SQLAlchemyError as e:
-                session.rollback()
-                logger.error(f"Database error while updating '{bill.title}': {e}")
-        else:
-            logger.warning(f"No text extracted for '{bill.title}'. Deleting from database.")
-            try:
+            del writers[bill_id]
+            if not writer.finish():
+                # The text could not be saved; leave the bill to be retried on the next run
+                continue
+
+            if writer.has_text:
+                logger.info(f"Processed and saved text for '{bill.title}'.")
+                store_text_from_file(session, bill_id, writer.text_filename)
+            else:
+                logger.warning(f"No text extracted for '{bill.title}'. Deleting from database.")
                 session.delete(bill)
-                session.commit()
-                logger.info(f"Deleted bill '{bill.title}' due to no extracted text.")
-            except SQLAlchemyError as e:
-                session.rollback()
-                logger.error(f"Failed to delete bill '{bill.title}': {e}")
 
-    session.close()
-    logger.info("Completed PDF processing and OCR.")
+            pending += 1
+            if pending >= batch_size:
+                success = _commit(session) and success
+                pending = 0
+        if pending:
+            success = _commit(session) and success
+    finally:
+        for writer in writers.values():
+            writer.close()
+        session.close()
+        run_stats = cache.run_stats()
+        cache.save_stats()
+    logger.info(
+        f"Completed PDF processing and OCR. Extraction cache: {run_stats['hits']} hits, "
+        f"{run_stats['misses']} misses, {run_stats['saved_seconds']:.1f} s saved."
+    )
+    return success
 
 if __name__ == "__main__":
-    process_pdfs()
+    # --cache-report prints the extraction cache statistics without processing anything
+    if "--cache-report" not in sys.argv:
+        process_pdfs()
+    print(format_report(ExtractionCache().report()))
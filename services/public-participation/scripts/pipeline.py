@@ -0,0 +1,406 @@
+# scripts/pipeline.py
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from modules.knowledge_graph import KnowledgeGraph
+from .database_setup import SessionLocal, Bill
+from .downloader import DOWNLOAD_WORKERS, FAILED, NOT_MODIFIED, Downloader
+from .extraction_cache import ExtractionCache
+from .pdf_processor import (
+    PDF_WORKERS, PROCESSED_DIR, ProcessedTextWriter, extract_bills, store_text_from_file,
+)
+from .scraper import BASE_URL, DOWNLOAD_DIR, get_bill_links
+
+logger = logging.getLogger(__name__)
+
+# Items waiting between two stages
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 32))
+# Bills committed to the database (and then synced to Neo4j) together
+PIPELINE_STORE_BATCH_SIZE = int(os.environ.get("PIPELINE_STORE_BATCH_SIZE", 20))
+# Seconds between progress log lines
+PIPELINE_REPORT_INTERVAL = float(os.environ.get("PIPELINE_REPORT_INTERVAL", 10))
+
+_STOP = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items_in: int = 0
+    items_out: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    max_queue_depth: int = 0
+    queue_depth_total: int = 0
+    queue_depth_samples: int = 0
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Items handled per second while the stage was running."""
+        elapsed = self.elapsed_seconds
+        return self.items_in / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def avg_queue_depth(self) -> float:
+        if not self.queue_depth_samples:
+            return 0.0
+        return self.queue_depth_total / self.queue_depth_samples
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "throughput_per_second": round(self.throughput, 3),
+            "avg_queue_depth": round(self.avg_queue_depth, 2),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+@dataclass
+class RunSummary:
+    duration_seconds: float
+    stages: list = field(default_factory=list)  # StageStats, in pipeline order
+
+    @property
+    def failed(self) -> int:
+        return sum(stage.failed for stage in self.stages)
+
+    @property
+    def ok(self) -> bool:
+        return self.failed == 0
+
+    def stage(self, name: str) -> Optional[StageStats]:
+        return next((stage for stage in self.stages if stage.name == name), None)
+
+    def as_dict(self) -> dict:
+        return {
+            "duration_seconds": round(self.duration_seconds, 3),
+            "failed": self.failed,
+            "stages": [stage.as_dict() for stage in self.stages],
+        }
+
+    def format(self) -> str:
+        lines = [f"Pipeline finished in {self.duration_seconds:.1f} s with {self.failed} failures."]
+        for stage in self.stages:
+            lines.append(
+                f"  {stage.name:<10} workers={stage.workers} in={stage.items_in} out={stage.items_out} "
+                f"failed={stage.failed} throughput={stage.throughput:.2f}/s "
+                f"queue avg={stage.avg_queue_depth:.1f} max={stage.max_queue_depth}"
+            )
+        return "\n".join(lines)
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    `handler(item)` runs on `workers` threads and returns an iterable of items for the
+    next stage (or None). `flush()`, if given, is called when the stage has been idle for
+    `flush_interval` seconds and once when it finishes, and returns items the same way;
+    stages that batch their work use it to emit partial batches.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable,
+        workers: int = 1,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        flush: Callable = None,
+        flush_interval: float = 1.0,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush = flush
+        self.flush_interval = flush_interval
+        self.stats = StageStats(name=name, workers=self.workers)
+        self._lock = threading.Lock()
+        self._running_workers = self.workers
+
+    def sample_queue_depth(self):
+        depth = self.queue.qsize()
+        with self._lock:
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, depth)
+            self.stats.queue_depth_total += depth
+            self.stats.queue_depth_samples += 1
+
+
+class Pipeline:
+    """
+    Runs stages concurrently, connected by bounded queues.
+
+    Every stage starts as soon as the pipeline does, so the first item can reach the
+    last stage while later items are still in the first one. A full queue blocks the
+    stage feeding it, which bounds the work in flight between any two stages.
+    """
+
+    def __init__(self, stages: list, report_interval: float = PIPELINE_REPORT_INTERVAL):
+        self.stages = stages
+        self.report_interval = report_interval
+
+    def run(self, items: Iterable) -> RunSummary:
+        started = time.monotonic()
+        for stage in self.stages:
+            stage.stats.started_at = started
+
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(index,), name=f"{stage.name}-{number}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        stop_reporting = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(stop_reporting,), daemon=True)
+        reporter.start()
+
+        first = self.stages[0]
+        for item in items:
+            first.queue.put(item)
+            first.sample_queue_depth()
+        for _ in range(first.workers):
+            first.queue.put(_STOP)
+
+        for thread in threads:
+            thread.join()
+        stop_reporting.set()
+        reporter.join()
+
+        summary = RunSummary(
+            duration_seconds=time.monotonic() - started,
+            stages=[stage.stats for stage in self.stages],
+        )
+        logger.info(summary.format())
+        return summary
+
+    def _call(self, stage: Stage, function: Callable, *args):
+        started = time.perf_counter()
+        try:
+            outputs = list(function(*args) or ())
+        except Exception as e:
+            logger.error(f"Stage '{stage.name}' failed: {e}")
+            with stage._lock:
+                stage.stats.failed += 1
+            outputs = []
+        with stage._lock:
+            stage.stats.busy_seconds += time.perf_counter() - started
+        return outputs
+
+    def _emit(self, index: int, outputs: list):
+        stage = self.stages[index]
+        with stage._lock:
+            stage.stats.items_out += len(outputs)
+        if index + 1 == len(self.stages):
+            return
+        downstream = self.stages[index + 1]
+        for output in outputs:
+            downstream.queue.put(output)
+            downstream.sample_queue_depth()
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        timeout = stage.flush_interval if stage.flush else None
+        while True:
+            try:
+                item = stage.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._emit(index, self._call(stage, stage.flush))
+                continue
+            if item is _STOP:
+                break
+            with stage._lock:
+                stage.stats.items_in += 1
+            self._emit(index, self._call(stage, stage.handler, item))
+
+        if stage.flush:
+            self._emit(index, self._call(stage, stage.flush))
+        with stage._lock:
+            stage._running_workers -= 1
+            last = stage._running_workers == 0
+            if last:
+                stage.stats.finished_at = time.monotonic()
+        # The last worker to finish tells the next stage there is nothing more to come
+        if last and index + 1 < len(self.stages):
+            downstream = self.stages[index + 1]
+            for _ in range(downstream.workers):
+                downstream.queue.put(_STOP)
+
+    def _report(self, stop: threading.Event):
+        while not stop.wait(self.report_interval):
+            logger.info("Pipeline progress: " + ", ".join(
+                f"{stage.name} queue={stage.queue.qsize()} done={stage.stats.items_in}"
+                for stage in self.stages
+            ))
+
+
+class BillStore:
+    """
+    Store stage of the ingest pipeline: records extracted bills in the database and
+    commits them in batches. Each committed batch of bill ids is passed on for graph sync.
+    """
+
+    def __init__(self, batch_size: int = PIPELINE_STORE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.session = SessionLocal()
+        self.pending = []
+
+    def handle(self, item):
+        result, text_filename = item
+        bill = self.session.query(Bill).filter(Bill.file_path == result.file_path).first()
+        if text_filename is None:
+            if bill is not None:
+                logger.warning(f"No text extracted for '{bill.title}'. Deleting from database.")
+                self.session.delete(bill)
+            return self._commit_if_full()
+
+        if bill is None:
+            bill = Bill(
+                title=os.path.basename(result.file_path),
+                url=result.url,
+                file_path=result.file_path,
+                text_content="",
+            )
+            self.session.add(bill)
+            self.session.flush()
+        store_text_from_file(self.session, bill.id, text_filename)
+        self.pending.append(bill.id)
+        return self._commit_if_full()
+
+    def _commit_if_full(self):
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        if not self.session.new and not self.session.dirty and not self.session.deleted and not self.pending:
+            return []
+        bill_ids, self.pending = self.pending, []
+        try:
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise RuntimeError(f"Database error while storing {len(bill_ids)} bills: {e}") from e
+        return [bill_ids] if bill_ids else []
+
+    def close(self):
+        self.session.close()
+
+
+def bills_with_text() -> set:
+    """
+    Returns the file paths of bills that already have extracted text.
+    """
+    session = SessionLocal()
+    try:
+        return {
+            file_path for (file_path,) in session.query(Bill.file_path).filter(
+                (Bill.text_content != "") & (Bill.text_content != None)
+            )
+        }
+    finally:
+        session.close()
+
+
+def run_ingest(
+    download_workers: int = DOWNLOAD_WORKERS,
+    extract_workers: int = PDF_WORKERS,
+    pdf_workers: int = PDF_WORKERS,
+    store_batch_size: int = PIPELINE_STORE_BATCH_SIZE,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    knowledge_graph=None,
+) -> RunSummary:
+    """
+    Runs scrape -> download -> extract -> store -> sync as one overlapping pipeline.
+
+    Links are downloaded as soon as they are scraped, each PDF is extracted as soon as it
+    is downloaded (on a shared process pool of `pdf_workers`), extracted bills are
+    committed in batches of `store_batch_size`, and each committed batch is synced to
+    the Knowledge Graph. The vector and title indexes are rewritten once, after the
+    last batch, rather than per batch. PDFs that have not changed and already have
+    text are skipped.
+    """
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    downloader = Downloader(download_dir=DOWNLOAD_DIR, max_workers=download_workers)
+    cache = ExtractionCache()
+    pool = ProcessPoolExecutor(max_workers=pdf_workers)
+    store = BillStore(batch_size=store_batch_size)
+    own_graph = knowledge_graph is None
+    if own_graph:
+        knowledge_graph = KnowledgeGraph()
+    extracted = bills_with_text()
+
+    def download(url):
+        result = downloader.download(url)
+        if result.status == FAILED:
+            raise RuntimeError(f"Failed to download {url}: {result.error}")
+        if result.status == NOT_MODIFIED and result.file_path in extracted:
+            return []
+        return [result]
+
+    def extract(result):
+        writer = ProcessedTextWriter(result.file_path)
+        try:
+            jobs = [(result.file_path, result.file_path)]
+            for _, chunk, _ in extract_bills(jobs, max_workers=pdf_workers, executor=pool, cache=cache):
+                writer.write(chunk)
+        except Exception:
+            writer.close()
+            raise
+        if not writer.finish():
+            raise RuntimeError(f"Could not save the text of {result.file_path}")
+        return [(result, writer.text_filename if writer.has_text else None)]
+
+    def sync(bill_ids):
+        knowledge_graph.sync_data(bill_ids=bill_ids, defer_index_writes=True)
+        return bill_ids
+
+    pipeline = Pipeline([
+        # Download workers run in parallel, so each file must be queued once
+        Stage("scrape", lambda page: downloader.unique_urls(get_bill_links()), workers=1, queue_size=1),
+        Stage("download", download, workers=download_workers, queue_size=queue_size),
+        Stage("extract", extract, workers=extract_workers, queue_size=queue_size),
+        Stage("store", store.handle, workers=1, queue_size=queue_size, flush=store.flush),
+        Stage("sync", sync, workers=1, queue_size=queue_size),
+    ])
+    try:
+        return pipeline.run([BASE_URL])
+    finally:
+        # Bills already written to Neo4j get their embeddings even if the run failed
+        knowledge_graph.finish_sync()
+        pool.shutdown()
+        store.close()
+        downloader.close()
+        cache.save_stats()
+        if own_graph:
+            knowledge_graph.close()
+
+
+if __name__ == "__main__":
+    import json
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(run_ingest().as_dict(), indent=2))
@@ -0,0 +1,28 @@
+# scripts/rebuild_comment_stats.py
+
+import argparse
+import logging
+import time
+from app.db.session import SessionLocal
+from app.services.comment_stats import rebuild_comment_stats
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the per-bill comment aggregates from the comments table.")
+    parser.add_argument("--bill-id", type=int, help="Only rebuild this bill")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        bills = rebuild_comment_stats(db, bill_id=args.bill_id)
+        print(f"Rebuilt comment aggregates of {bills} bills in {time.perf_counter() - start:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,37 @@
+# scripts/score_comments.py
+
+import argparse
+import logging
+import time
+from app.db.session import SessionLocal
+from app.services.comment_scoring import LexiconScorer, score_new_comments
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score new comments for sentiment and topic.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--loop", action="store_true", help="Keep scoring new comments")
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between runs with --loop")
+    args = parser.parse_args()
+
+    scorer = LexiconScorer()
+    while True:
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            scored = score_new_comments(db, scorer, batch_size=args.batch_size)
+            elapsed = time.perf_counter() - start
+            if scored:
+                print(f"Scored {scored} comments in {elapsed:.1f}s ({scored / elapsed:.0f} comments/s)")
+        finally:
+            db.close()
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -4,11 +4,11 @@ import requests
 from bs4 import BeautifulSoup
 import os
 import logging
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin
 from requests.exceptions import RequestException
 from sqlalchemy.exc import SQLAlchemyError
 from .database_setup import SessionLocal, Bill
-import requests
+from .downloader import DOWNLOADED, FAILED, Downloader
 
 from dotenv import load_dotenv
 load_dotenv(dotenv_path='config/.env')  # Load environment variables from .env
@@ -44,53 +44,57 @@ def get_bill_links():
 
     return bill_links
 
-def sanitize_filename(url):
-    parsed_url = urlparse(url)
-    filename = os.path.basename(parsed_url.path)
-    # Remove any query parameters
-    filename = filename.split('?')[0]
-    return filename
+def download_bills(bill_links, downloader=None):
+    """
+    Downloads the bills concurrently and records new ones in the database.
+    Unchanged PDFs are skipped with conditional requests; a bill whose PDF changed
+    has its text cleared so it is extracted again. All rows are committed at once.
 
-def download_bills(bill_links):
-    if not os.path.exists(DOWNLOAD_DIR):
-        os.makedirs(DOWNLOAD_DIR)
+    Returns:
+        bool: True if every download and the database commit succeeded.
+    """
+    own_downloader = downloader is None
+    if own_downloader:
+        downloader = Downloader(download_dir=DOWNLOAD_DIR)
 
     session = SessionLocal()
-
-    for link in bill_links:
-        filename = sanitize_filename(link)
-        file_path = os.path.join(DOWNLOAD_DIR, filename)
-
-        if not os.path.exists(file_path):
-            logger.info(f"Downloading {link}")
-            try:
-                response = requests.get(link, timeout=10)
-                response.raise_for_status()
-            except RequestException as e:
-                logger.error(f"Failed to download {link}: {e}")
-                continue
-
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-
-            # Add entry to the database
-            bill = Bill(
-                title=filename,
-                url=link,
-                file_path=file_path,
-                text_content=""  # To be filled after processing
-            )
+    success = True
+    try:
+        results = downloader.download_all(bill_links)
+        downloaded = [result for result in results if result.status == DOWNLOADED]
+        success = all(result.status != FAILED for result in results)
+
+        if downloaded:
+            existing = {
+                bill.file_path: bill
+                for bill in session.query(Bill).filter(
+                    Bill.file_path.in_([result.file_path for result in downloaded])
+                )
+            }
+            for result in downloaded:
+                bill = existing.get(result.file_path)
+                if bill is None:
+                    session.add(Bill(
+                        title=os.path.basename(result.file_path),
+                        url=result.url,
+                        file_path=result.file_path,
+                        text_content=""  # To be filled after processing
+                    ))
+                else:
+                    # The PDF changed; extract it again
+                    bill.text_content = ""
             try:
-                session.add(bill)
                 session.commit()
-                logger.info(f"Added {filename} to the database.")
+                logger.info(f"Recorded {len(downloaded)} downloaded bills in the database.")
             except SQLAlchemyError as e:
                 session.rollback()
-                logger.error(f"Database error for {filename}: {e}")
-        else:
-            logger.info(f"File {file_path} already exists. Skipping.")
-
-    session.close()
+                logger.error(f"Database error while recording downloaded bills: {e}")
+                success = False
+    finally:
+        session.close()
+        if own_downloader:
+            downloader.close()
+    return success
 
 if __name__ == "__main__":
     links = get_bill_links()
@@ -2,11 +2,16 @@
 
 import os
 import logging
+import threading
+import time
 from dotenv import load_dotenv
-from flask import Flask, request
+from flask import Flask, request, jsonify
 from twilio.twiml.messaging_response import MessagingResponse
 from modules.ai_model import OllamaResponder
 from modules.knowledge_graph import KnowledgeGraph
+from modules.reply_dispatcher import ReplyDispatcher, get_sender
+from modules.ollama_client import WHATSAPP_MESSAGE_LIMIT
+from modules.token_budget import CHARS_PER_WORD_TOKEN
 from sqlalchemy.exc import SQLAlchemyError
 
 # Load environment variables from .env file
@@ -25,63 +30,151 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Initialize AI Responder and Knowledge Graph
+# Tokens to generate at most, so answers end near the WhatsApp message limit
+# instead of being cut off by the truncation below
+REPLY_MAX_TOKENS = int(os.getenv("WHATSAPP_REPLY_MAX_TOKENS", WHATSAPP_MESSAGE_LIMIT // CHARS_PER_WORD_TOKEN))
+
+# "sync" answers inside the webhook; "deferred" acknowledges at once and sends the
+# answer through the Twilio REST API when it is ready
+REPLY_MODE = os.getenv("WHATSAPP_REPLY_MODE", "sync").lower()
+# Sent in the webhook response in deferred mode; empty for no acknowledgement message
+ACK_MESSAGE = os.getenv("WHATSAPP_ACK_MESSAGE", "Thanks! We're looking into your question and will reply shortly.")
+
+# AI Responder and Knowledge Graph are created on first use (or by the background
+# warm-up below), so importing this module and starting a worker never waits on Neo4j
 responder = None
 knowledge_graph = None
-try:
-    responder = OllamaResponder()
-    logger.info("OllamaResponder initialized successfully.")
-except Exception as e:
-    logger.critical(f"Cannot initialize OllamaResponder: {e}")
-
-try:
-    knowledge_graph = KnowledgeGraph()
-    logger.info("KnowledgeGraph initialized successfully.")
-except Exception as e:
-    logger.critical(f"Cannot initialize KnowledgeGraph: {e}")
-
-def search_bills(prompt):
-    """
-    Retrieve relevant bills from the knowledge graph based on the user's prompt.
-    Returns a list of bill descriptions.
-    """
-    if not knowledge_graph:
-        logger.error("KnowledgeGraph is not initialized.")
-        return []
-    
-    descriptions = knowledge_graph.query_knowledge_graph(prompt)
-    if descriptions:
-        logger.info(f"Found {len(descriptions)} relevant bill(s) for the prompt.")
-        return descriptions
-    else:
-        logger.info("No relevant bills found in the Knowledge Graph.")
-        return []
-
-def construct_prompt(user_query, aggregated_context):
-    """
-    Construct the prompt for the AI model using the user's query and the aggregated context.
-    """
-    return (
-        f"You are an assistant knowledgeable about Kenyan bills.\n"
-        f"Here is some relevant information:\n{aggregated_context}\n\n"
-        f"User's question: {user_query}\n\n"
-        f"Provide a comprehensive and accurate response based on the above information."
-    )
-
-def construct_general_prompt(user_query):
-    """
-    Construct a general prompt for the AI model without additional context.
-    """
-    return (
-        f"You are an assistant knowledgeable about Kenyan bills.\n\n"
-        f"User's question: {user_query}\n\n"
-        f"Provide a comprehensive and accurate response based on your knowledge."
-    )
+_init_lock = threading.Lock()
+_init_errors = {}
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_responder():
+    """
+    Returns the shared OllamaResponder, creating it on first use.
+    Returns None if it cannot be initialized; the next call retries.
+    """
+    global responder
+    if responder is None:
+        with _init_lock:
+            if responder is None:
+                try:
+                    responder = OllamaResponder()
+                    _init_errors.pop("responder", None)
+                    logger.info("OllamaResponder initialized successfully.")
+                except Exception as e:
+                    _init_errors["responder"] = str(e)
+                    logger.critical(f"Cannot initialize OllamaResponder: {e}")
+    return responder
+
+
+def get_knowledge_graph():
+    """
+    Returns the shared KnowledgeGraph, creating it on first use.
+    Returns None if it cannot be initialized; the next call retries.
+    """
+    global knowledge_graph
+    if knowledge_graph is None:
+        shared_responder = get_responder()
+        with _init_lock:
+            if knowledge_graph is None:
+                try:
+                    # Share the responder's cache so re-synced bills drop their cached answers
+                    knowledge_graph = KnowledgeGraph(
+                        response_cache=shared_responder.response_cache if shared_responder else None
+                    )
+                    _init_errors.pop("knowledge_graph", None)
+                    logger.info("KnowledgeGraph initialized successfully.")
+                except Exception as e:
+                    _init_errors["knowledge_graph"] = str(e)
+                    logger.critical(f"Cannot initialize KnowledgeGraph: {e}")
+    return knowledge_graph
+
+
+def warm_up():
+    """
+    Initializes the responder and knowledge graph and loads the title index,
+    so the first webhook does not pay for it.
+    """
+    started = time.monotonic()
+    shared_responder = get_responder()
+    get_knowledge_graph()
+    if shared_responder:
+        try:
+            shared_responder.retriever.titles()
+        except Exception as e:
+            logger.warning(f"Could not preload bill titles: {e}")
+    logger.info(f"Warm-up finished in {time.monotonic() - started:.2f} seconds.")
+
+
+def start_background_warmup():
+    """
+    Runs warm_up in a daemon thread unless one is already running.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None or not _warmup_thread.is_alive():
+            _warmup_thread = threading.Thread(target=warm_up, name="whatsapp-bot-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def is_ready() -> bool:
+    return responder is not None and knowledge_graph is not None
+
+
+# Warm up in the background by default; set WHATSAPP_BOT_WARMUP=false to initialize on first request
+if os.environ.get("WHATSAPP_BOT_WARMUP", "true").lower() == "true":
+    start_background_warmup()
 
 @app.route('/', methods=['GET'])
 def home():
     return "WhatsApp Bot is running."
 
+def answer_message(incoming_msg, from_number=None):
+    """
+    Answers a (non-empty) question about Kenyan bills and returns the reply body.
+    The responder retrieves the bill passages and packs them into the prompt within
+    its token budget. Blocks until the AI model has generated the answer; the
+    responder's scheduler limits concurrent generations and queues them fairly
+    across numbers.
+    """
+    # Input sanitization
+    incoming_msg = incoming_msg.strip()
+    if len(incoming_msg) > 500:
+        incoming_msg = incoming_msg[:500]
+        logger.warning("Incoming message truncated to 500 characters.")
+
+    bot_responder = get_responder()
+    if not bot_responder:
+        logger.error("Responder is not initialized.")
+        return "Sorry, I'm unable to process your request at the moment."
+
+    ai_response = bot_responder.generate_response(incoming_msg, max_tokens=REPLY_MAX_TOKENS, user=from_number)
+    # Truncate ai_response if too long
+    if len(ai_response) > WHATSAPP_MESSAGE_LIMIT:
+        ai_response = ai_response[:WHATSAPP_MESSAGE_LIMIT - 3] + '...'
+        logger.warning(f"AI response truncated to {WHATSAPP_MESSAGE_LIMIT} characters.")
+    logger.info("Generated AI response.")
+    return ai_response
+
+def get_dispatcher():
+    """
+    Returns the shared ReplyDispatcher used in deferred mode, creating it on first use.
+    """
+    global dispatcher
+    if dispatcher is None:
+        with _dispatcher_lock:
+            if dispatcher is None:
+                dispatcher = ReplyDispatcher(
+                    handler=lambda number, text: answer_message(text, number),
+                    sender=get_sender(),
+                )
+    return dispatcher
+
 @app.route("/whatsapp", methods=['POST'])
 def whatsapp_reply():
     logger.info("Received request at /whatsapp endpoint.")
@@ -91,53 +184,23 @@ def whatsapp_reply():
         logger.info(f"Received message from {from_number}: {incoming_msg}")
 
         resp = MessagingResponse()
-        msg = resp.message()
-
-        if incoming_msg:
-            # Input sanitization
-            incoming_msg = incoming_msg.strip()
-            if len(incoming_msg) > 500:
-                incoming_msg = incoming_msg[:500]
-                logger.warning("Incoming message truncated to 500 characters.")
-
-            # Retrieve relevant bills from Knowledge Graph
-            bills_descriptions = search_bills(incoming_msg)
-
-            if bills_descriptions:
-                aggregated_context = "\n\n".join(bills_descriptions)
-                prompt = construct_prompt(incoming_msg, aggregated_context)
-                logger.debug(f"Constructed Knowledge-based Prompt: {prompt[:200]}{'...' if len(prompt) > 200 else ''}")
-
-                if responder:
-                    ai_response = responder.generate_response(prompt)
-                    # Truncate ai_response if too long
-                    if len(ai_response) > 1600:
-                        ai_response = ai_response[:1597] + '...'
-                        logger.warning("AI response truncated to 1600 characters.")
-                    msg.body(ai_response)
-                    logger.info("Sent Knowledge-based AI response.")
-                else:
-                    logger.error("Responder is not initialized.")
-                    msg.body("Sorry, I'm unable to process your request at the moment.")
-            else:
-                if responder:
-                    # If no bills found, generate a response using AI without additional context
-                    prompt = construct_general_prompt(incoming_msg)
-                    logger.debug(f"Constructed General Prompt: {prompt[:200]}{'...' if len(prompt) > 200 else ''}")
-                    ai_response = responder.generate_response(prompt)
-                    # Truncate ai_response if too long
-                    if len(ai_response) > 1600:
-                        ai_response = ai_response[:1597] + '...'
-                        logger.warning("AI response truncated to 1600 characters.")
-                    msg.body(ai_response)
-                    logger.info("Sent General AI response.")
-                else:
-                    logger.error("Responder is not initialized.")
-                    msg.body("Sorry, I'm unable to process your request at the moment.")
-        else:
+
+        if not incoming_msg:
             # Handle empty message
-            msg.body("Hello! How can I assist you with Kenyan bills today?")
+            resp.message("Hello! How can I assist you with Kenyan bills today?")
             logger.info("Sent greeting message for empty prompt.")
+        elif REPLY_MODE == "deferred":
+            # Acknowledge now; the answer is sent through the REST API once generated
+            if get_dispatcher().submit(from_number, incoming_msg):
+                if ACK_MESSAGE:
+                    resp.message(ACK_MESSAGE)
+                logger.info(f"Queued question from {from_number} for a deferred reply.")
+            else:
+                resp.message("We're receiving a lot of questions right now. Please try again in a few minutes.")
+                logger.warning(f"Reply queue full; turned away question from {from_number}.")
+        else:
+            resp.message(answer_message(incoming_msg, from_number))
+            logger.info("Sent AI response.")
 
         return str(resp)
     except Exception as e:
@@ -151,15 +214,48 @@ def whatsapp_reply():
 def health_check():
     """
     Health check endpoint to verify that the bot is running.
+    Never triggers initialization; components that failed to initialize are reported.
     """
     status = "OK"
-    if not responder:
+    if "responder" in _init_errors:
         status = "Responder Unavailable"
-    if not knowledge_graph:
+    if "knowledge_graph" in _init_errors:
         status = "KnowledgeGraph Unavailable" if status == "OK" else f"{status}, KnowledgeGraph Unavailable"
     logger.info(f"Health Check: {status}")
     return status, 200
 
+@app.route("/ready", methods=['GET'])
+def readiness_check():
+    """
+    Readiness endpoint: 200 once the responder and knowledge graph are initialized, 503 before.
+    Starts the background warm-up if it has not run yet.
+    """
+    if not is_ready():
+        start_background_warmup()
+    body = {
+        "ready": is_ready(),
+        "responder": responder is not None,
+        "knowledge_graph": knowledge_graph is not None,
+        "errors": dict(_init_errors),
+    }
+    return jsonify(body), 200 if body["ready"] else 503
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """
+    Exposes response cache metrics (hits, misses, hit rate and generation time saved),
+    LLM scheduler metrics (queue wait, time to first token, tokens/sec) and, in
+    deferred mode, the reply queue.
+    """
+    body = {
+        "response_cache": None,
+        "llm": responder.scheduler.stats() if responder else None,
+        "reply_queue": dispatcher.stats() if dispatcher is not None else None,
+    }
+    if responder and responder.response_cache is not None:
+        body["response_cache"] = responder.response_cache.stats()
+    return jsonify(body), 200
+
 @app.errorhandler(404)
 def page_not_found(e):
     logger.warning(f"404 error: {e}")
@@ -182,7 +278,7 @@ if __name__ == "__main__":
 
 # # simple_whatsapp_bot.py
 
-# from flask import Flask, request
+# from flask import Flask, request, jsonify
 # from twilio.twiml.messaging_response import MessagingResponse
 # import logging
 
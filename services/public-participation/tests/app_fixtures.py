@@ -0,0 +1,26 @@
+# tests/app_fixtures.py
+
+"""
+Shared setup for the FastAPI app tests. Import this before any app module:
+app.core.config requires these settings at import time.
+"""
+
+import os
+
+for name in ("POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB", "SECRET_KEY",
+             "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "NEO4J_URI", "NEO4J_USER", "NEO4J_PASSWORD"):
+    os.environ.setdefault(name, "test")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.db.base_class import Base
+
+
+def sqlite_session(*models) -> Session:
+    """
+    Open a session on a fresh in-memory SQLite database holding only the given
+    models' tables.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[model.__table__ for model in models])
+    return sessionmaker(bind=engine)()
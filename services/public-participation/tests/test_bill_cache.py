@@ -0,0 +1,254 @@
+# tests/test_bill_cache.py
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from redis.exceptions import ConnectionError
+from app_fixtures import sqlite_session
+from app.crud.crud_bill import CRUDBill, decode_cursor
+from app.models.models import Bill
+from app.services.redis_service import LocalCache, RedisService
+
+
+class FakeRedis:
+    """Just the Redis commands the cache uses, counting round trips."""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+        self.down = False
+        self._lock = threading.Lock()
+
+    def _call(self):
+        if self.down:
+            raise ConnectionError("down")
+        self.calls += 1
+
+    def ping(self):
+        self._call()
+        return True
+
+    def get(self, key):
+        self._call()
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self._call()
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, nx=False, px=None):
+        self._call()
+        with self._lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            return True
+
+    def setex(self, key, ttl, value):
+        self._call()
+        self.data[key] = value
+
+    def incr(self, key):
+        self._call()
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def delete(self, *keys):
+        self._call()
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def setex(self, key, ttl, value):
+        self.commands.append((key, value))
+
+    def execute(self):
+        self.redis._call()
+        for key, value in self.commands:
+            self.redis.data[key] = value
+
+
+def make_bill(id, title="Finance Bill"):
+    return SimpleNamespace(id=id, title=title, description="", status="active", pdf_url=None,
+                           created_at="2024-01-01", updated_at=None)
+
+
+class TestBillCache(unittest.TestCase):
+    def setUp(self):
+        self.service = RedisService()
+        self.fake = self.service._redis = FakeRedis()
+
+    def test_l1_serves_repeated_reads_without_redis(self):
+        self.service.cache_bill(make_bill(1))
+        self.service.local.clear()
+        self.assertEqual(self.service.get_bill(1)["title"], "Finance Bill")
+        calls = self.fake.calls
+        self.assertEqual(self.service.get_bill(1)["title"], "Finance Bill")
+        self.assertEqual(self.fake.calls, calls)
+
+    def test_l1_entries_expire(self):
+        local = LocalCache(ttl=0.01)
+        local.set("k", 1)
+        time.sleep(0.02)
+        self.assertIsNone(local.get("k"))
+
+    def test_concurrent_misses_load_once(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.1)
+            return make_bill(2)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.service.get_or_load_bill(2, loader)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual([bill["id"] for bill in results], [2] * 8)
+
+    def test_missing_bill_is_cached_briefly(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.1)
+            return None
+
+        threads = [threading.Thread(target=self.service.get_or_load_bill, args=(3, loader)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNone(self.service.get_or_load_bill(3, loader))
+        self.assertEqual(len(loads), 1)
+        self.assertIsNone(self.service.get_bill(3))
+        self.assertEqual(self.service.get_bills([3]), {})
+        # Creating the bill replaces the cached miss
+        self.service.cache_bill(make_bill(3))
+        self.assertEqual(self.service.get_or_load_bill(3, loader)["id"], 3)
+
+    def test_load_racing_a_write_does_not_replace_it(self):
+        def loader():
+            # The row was read, then an update commits and is cached before the load is
+            self.service.cache_bill(make_bill(6, title="Finance Bill (amended)"))
+            return make_bill(6)
+
+        self.service.get_or_load_bill(6, loader)
+        self.assertEqual(self.service.get_bill(6)["title"], "Finance Bill (amended)")
+        # Redis holds no copy of the old bill either
+        self.service.local.clear()
+        self.assertIsNone(self.service.get_bill(6))
+
+    def test_page_load_racing_a_write_drops_its_bills(self):
+        def loader():
+            self.service.invalidate_bill_lists()
+            self.service.cache_bill(make_bill(2, title="Finance Bill (amended)"))
+            return [make_bill(1), make_bill(2)], None
+
+        key = self.service.bill_list_key(None, None, 2)
+        self.service.get_or_load_bill_page(key, loader)
+        self.assertIsNone(self.service.get_bill(2))
+
+    def test_bills_are_written_and_read_in_one_round_trip(self):
+        self.service.cache_bills([make_bill(n) for n in range(10)])
+        self.assertEqual(self.fake.calls, 1)
+        self.service.local.clear()
+        bills = self.service.get_bills(list(range(12)))
+        self.assertEqual(self.fake.calls, 2)
+        self.assertEqual(sorted(bills), list(range(10)))
+
+    def test_bill_list_needs_every_bill(self):
+        self.service.cache_bill_list([make_bill(1), make_bill(2)], "bills:active")
+        self.assertEqual([bill["id"] for bill in self.service.get_bill_list("bills:active")], [1, 2])
+        self.service.invalidate_bill(2)
+        self.assertIsNone(self.service.get_bill_list("bills:active"))
+
+    def test_invalidate_clears_both_tiers(self):
+        self.service.cache_bill(make_bill(4))
+        self.service.invalidate_bill(4)
+        self.assertIsNone(self.service.get_bill(4))
+
+    def test_redis_outage_falls_back_to_loader(self):
+        self.fake.down = True
+        bill = self.service.get_or_load_bill(5, lambda: make_bill(5))
+        self.assertEqual(bill["id"], 5)
+        self.assertFalse(self.service.ping())
+
+    def test_list_pages_are_retired_by_bill_writes(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return [make_bill(1), make_bill(2)], "next"
+
+        key = self.service.bill_list_key(None, None, 2)
+        self.assertEqual(self.service.get_or_load_bill_page(key, loader)[1], "next")
+        self.assertEqual([bill["id"] for bill in self.service.get_or_load_bill_page(key, loader)[0]], [1, 2])
+        self.assertEqual(len(loads), 1)
+        self.service.invalidate_bill_lists()
+        self.assertNotEqual(self.service.bill_list_key(None, None, 2), key)
+
+    def test_evicted_page_bills_reload_the_page(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return [make_bill(1), make_bill(2)], None
+
+        key = self.service.bill_list_key("active", None, 2)
+        self.service.get_or_load_bill_page(key, loader)
+        self.service.invalidate_bill(2)
+        bills, next_cursor = self.service.get_or_load_bill_page(key, loader)
+        self.assertEqual([bill["id"] for bill in bills], [1, 2])
+        self.assertEqual(len(loads), 2)
+
+
+class TestBillPages(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite_session(Bill)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for n in range(25):
+            # Pairs of bills share a timestamp, so ties are broken by id
+            self.db.add(Bill(id=n + 1, title=f"Bill {n + 1}", status="active" if n % 2 else "draft",
+                             created_at=start + timedelta(minutes=n // 2)))
+        self.db.commit()
+        self.crud = CRUDBill(Bill)
+
+    def tearDown(self):
+        self.db.close()
+
+    def walk(self, **filters):
+        ids, cursor = [], None
+        while True:
+            bills, cursor = self.crud.get_page(self.db, cursor=cursor, limit=4, **filters)
+            ids.extend(bill.id for bill in bills)
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_bill_newest_first(self):
+        self.assertEqual(self.walk(), list(range(25, 0, -1)))
+
+    def test_pages_filtered_by_status(self):
+        self.assertEqual(self.walk(status="active"), list(range(24, 0, -2)))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+
+
+if __name__ == '__main__':
+    unittest.main()
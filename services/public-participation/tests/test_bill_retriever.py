@@ -0,0 +1,121 @@
+# tests/test_bill_retriever.py
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from modules.embeddings import HashingEmbedder, VectorIndex
+from modules.bill_retriever import BillRetriever, escape_lucene_query
+from modules.title_index import TitleIndex
+
+TITLES = [
+    (1, "TheFinanceBill_2024.pdf"),
+    (2, "TheKenyaSignLanguageBill_2024.pdf"),
+    (3, "The_Ethics_and_Anti-Corruption_Commission__Amendment__Bill__2024.pdf"),
+]
+
+
+def make_driver(fulltext_ids=None, description="Full text of the bill", passages=None):
+    """
+    Builds a fake Neo4j driver that answers the title, fulltext, passage and description queries.
+    """
+    session = MagicMock()
+
+    def run(query, **params):
+        result = MagicMock()
+        if "RETURN b.id AS id, b.title AS title" in query:
+            result.values.return_value = list(TITLES)
+        elif "passageIndex" in query or "MATCH (p:Passage" in query:
+            result.__iter__.return_value = iter(passages or [])
+        elif "db.index.fulltext.queryNodes" in query:
+            result.__iter__.return_value = iter([{"id": bill_id} for bill_id in (fulltext_ids or [])])
+        else:
+            result.single.return_value = {"description": description}
+        return result
+
+    session.run.side_effect = run
+    driver = MagicMock()
+    driver.session.return_value.__enter__.return_value = session
+    return driver, session
+
+
+class TestBillRetriever(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp_dir.name, "title_index.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_escape_lucene_query(self):
+        self.assertEqual(escape_lucene_query('finance (2024)?'), 'finance \\(2024\\)\\?')
+
+    def test_retrieve_fetches_only_winning_description(self):
+        driver, session = make_driver(fulltext_ids=[2, 1])
+        retriever = BillRetriever(driver, index=TitleIndex(path=self.index_path))
+        result = retriever.retrieve("kenya sign language bill 2024")
+        self.assertEqual(result["id"], 2)
+        self.assertEqual(result["description"], "Full text of the bill")
+        queries = [call.args[0] for call in session.run.call_args_list]
+        self.assertFalse(any("n.description" in query for query in queries))
+
+    def test_falls_back_to_title_index_without_fulltext_hits(self):
+        driver, _ = make_driver(fulltext_ids=[])
+        retriever = BillRetriever(driver, index=TitleIndex(path=self.index_path))
+        match = retriever.match("ethics and anti corruption commission amendment bill")
+        self.assertEqual(match['id'], 3)
+
+    def test_prefers_index_written_at_ingest(self):
+        index = TitleIndex(path=self.index_path)
+        index.add(7, "TheCultureBill_2024.pdf")
+        index.save()
+        driver, session = make_driver()
+        retriever = BillRetriever(driver, index=TitleIndex(path=self.index_path), use_fulltext=False)
+        self.assertEqual(retriever.match("the culture bill 2024")['id'], 7)
+        queries = [call.args[0] for call in session.run.call_args_list]
+        self.assertFalse(any("b.title AS title" in query for query in queries))
+
+    def test_retrieve_passages_returns_top_passages_in_document_order(self):
+        passages = [
+            {"bill_id": 2, "index": 7, "text": "Section 7", "score": 3.0},
+            {"bill_id": 2, "index": 2, "text": "Section 2", "score": 2.0},
+        ]
+        driver, session = make_driver(passages=passages)
+        retriever = BillRetriever(driver, index=TitleIndex(path=self.index_path), use_fulltext=False)
+        result = retriever.retrieve_passages("kenya sign language bill 2024", k=2)
+        self.assertEqual(result["id"], 2)
+        self.assertEqual(result["passages"], ["Section 2", "Section 7"])
+        queries = [call.args[0] for call in session.run.call_args_list]
+        self.assertFalse(any("b.description" in query for query in queries))
+
+    def test_retrieve_passages_falls_back_to_description(self):
+        driver, _ = make_driver(description="x" * 10000)
+        retriever = BillRetriever(driver, index=TitleIndex(path=self.index_path), use_fulltext=False)
+        result = retriever.retrieve_passages("the finance bill 2024", k=2)
+        self.assertEqual(len(result["passages"]), 1)
+        self.assertLess(len(result["passages"][0]), 10000)
+
+    def test_no_match_below_threshold(self):
+        driver, _ = make_driver()
+        retriever = BillRetriever(driver, index=TitleIndex(path=self.index_path), use_fulltext=False)
+        self.assertIsNone(retriever.match("xyz qqq"))
+
+    def test_unmatched_title_falls_back_to_vector_search(self):
+        vector_index = VectorIndex(directory=self.tmp_dir.name, embedder=HashingEmbedder(dim=64))
+        builder = vector_index.builder()
+        builder.add_bill(2, "h2", ["Interpreters must be provided in hospitals and courts."])
+        builder.add_bill(1, "h1", ["Excise duty on fuel and mobile money transfers."])
+        builder.commit()
+
+        driver, _ = make_driver(passages=[{"id": "2:0", "text": "Interpreters must be provided"}])
+        retriever = BillRetriever(
+            driver, index=TitleIndex(path=self.index_path), use_fulltext=False, vector_index=vector_index
+        )
+        match = retriever.match("are interpreters provided in hospitals?")
+        self.assertEqual(match["id"], 2)
+        self.assertEqual(retriever.vector_passages("interpreters in hospitals", bill_id=2)[0]["text"],
+                         "Interpreters must be provided")
+
+
+if __name__ == '__main__':
+    unittest.main()
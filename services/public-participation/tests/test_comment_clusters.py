@@ -0,0 +1,119 @@
+# tests/test_comment_clusters.py
+
+import unittest
+from app_fixtures import sqlite_session
+from app.crud.crud_comment import CRUDComment
+from app.models.models import (
+    Bill, BillCommentDaily, BillCommentStats, Comment, CommentCluster, CommentClusterBucket,
+    CommentClusterMember, CommentScore, User,
+)
+from app.schemas.comment import CommentCreate, CommentUpdate
+from app.services.comment_clusters import (
+    cluster_representatives, comment_cluster_ids, get_bill_clusters, minhash, similarity,
+)
+
+CAMPAIGN = "We the residents of Nakuru reject the Finance Bill because the new fuel levy will raise the cost of living for every family"
+HEARING = "When is the public hearing in Mombasa county?"
+
+
+class TestMinHash(unittest.TestCase):
+    def test_near_duplicates_are_similar(self):
+        edited = CAMPAIGN.replace("Nakuru", "Kisumu")
+        self.assertGreater(similarity(minhash(CAMPAIGN), minhash(edited)), 0.6)
+        self.assertEqual(similarity(minhash(CAMPAIGN), minhash(CAMPAIGN.upper())), 1.0)
+        self.assertLess(similarity(minhash(CAMPAIGN), minhash(HEARING)), 0.2)
+
+
+class TestCommentClusters(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite_session(
+            User, Bill, Comment, BillCommentStats, BillCommentDaily,
+            CommentCluster, CommentClusterBucket, CommentClusterMember, CommentScore,
+        )
+        self.db.add_all([
+            User(id=1, email="citizen@example.com", hashed_password="x"),
+            Bill(id=1, title="Finance Bill"),
+            Bill(id=2, title="Housing Bill"),
+        ])
+        self.db.commit()
+        self.crud = CRUDComment(Comment)
+
+    def tearDown(self):
+        self.db.close()
+
+    def comment(self, text, bill_id=1):
+        return self.crud.create_with_user(self.db, obj_in=CommentCreate(text=text, bill_id=bill_id), user_id=1)
+
+    def test_campaign_comments_join_one_cluster(self):
+        first = self.comment(CAMPAIGN)
+        self.comment(CAMPAIGN + "!")
+        self.comment(CAMPAIGN.replace("every family", "every family in the county"))
+        other = self.comment(HEARING)
+        clusters = get_bill_clusters(self.db, 1, min_size=1)
+        self.assertEqual([(c["representative_id"], c["size"]) for c in clusters], [(first.id, 3), (other.id, 1)])
+        self.assertEqual(clusters[0]["text"], CAMPAIGN)
+        self.assertEqual(len(get_bill_clusters(self.db, 1)), 1)
+
+    def test_clusters_are_per_bill(self):
+        self.comment(CAMPAIGN, bill_id=1)
+        self.comment(CAMPAIGN, bill_id=2)
+        self.assertEqual(get_bill_clusters(self.db, 1, min_size=2), [])
+        self.assertEqual(self.db.query(CommentCluster).count(), 2)
+
+    def test_remove_shrinks_cluster(self):
+        self.comment(CAMPAIGN)
+        second = self.comment(CAMPAIGN)
+        self.crud.remove(self.db, id=second.id)
+        self.assertEqual(get_bill_clusters(self.db, 1, min_size=1)[0]["size"], 1)
+        self.assertIsNone(self.db.get(CommentClusterMember, second.id))
+
+    def test_removing_representative_promotes_next_member(self):
+        first = self.comment(CAMPAIGN)
+        second = self.comment(CAMPAIGN + "!")
+        self.crud.remove(self.db, id=first.id)
+        [cluster] = get_bill_clusters(self.db, 1, min_size=1)
+        self.assertEqual((cluster["representative_id"], cluster["size"], cluster["text"]), (second.id, 1, CAMPAIGN + "!"))
+        self.crud.remove(self.db, id=second.id)
+        self.assertEqual(self.db.query(CommentCluster).count(), 0)
+        self.assertEqual(self.db.query(CommentClusterBucket).count(), 0)
+
+    def test_edited_text_is_clustered_again(self):
+        first = self.comment(CAMPAIGN)
+        second = self.comment(CAMPAIGN)
+        self.crud.update(self.db, db_obj=second, obj_in=CommentUpdate(text=HEARING, bill_id=1))
+        clusters = get_bill_clusters(self.db, 1, min_size=1)
+        self.assertEqual([(c["representative_id"], c["size"]) for c in clusters], [(first.id, 1), (second.id, 1)])
+        # The representative leaves, and the cluster is represented by the next member
+        self.crud.update(self.db, db_obj=first, obj_in=CommentUpdate(text=HEARING, bill_id=1))
+        [cluster] = get_bill_clusters(self.db, 1, min_size=1)
+        self.assertEqual((cluster["representative_id"], cluster["size"]), (second.id, 2))
+        self.assertEqual(self.db.query(CommentCluster).count(), 1)
+
+    def test_moved_comment_is_clustered_under_its_new_bill(self):
+        self.comment(CAMPAIGN, bill_id=1)
+        moved = self.comment(CAMPAIGN, bill_id=1)
+        self.comment(CAMPAIGN, bill_id=2)
+        self.crud.update(self.db, db_obj=moved, obj_in=CommentUpdate(text=CAMPAIGN, bill_id=2))
+        self.assertEqual([c["size"] for c in get_bill_clusters(self.db, 1, min_size=1)], [1])
+        self.assertEqual([c["size"] for c in get_bill_clusters(self.db, 2, min_size=1)], [2])
+
+    def test_representatives_one_node_per_cluster(self):
+        first = self.comment(CAMPAIGN)
+        second = self.comment(CAMPAIGN)
+        other = self.comment(HEARING)
+        nodes = cluster_representatives(self.db, [first.id, second.id, other.id])
+        self.assertEqual(sorted((n["id"], n["cluster_size"]) for n in nodes), [(first.id, 2), (other.id, 1)])
+
+    def test_representatives_of_the_clusters_a_comment_left(self):
+        first = self.comment(CAMPAIGN)
+        second = self.comment(CAMPAIGN + "!")
+        old_clusters = comment_cluster_ids(self.db, [first.id])
+        self.crud.remove(self.db, id=first.id)
+        nodes = cluster_representatives(self.db, [], cluster_ids=old_clusters)
+        self.assertEqual([(n["id"], n["cluster_size"]) for n in nodes], [(second.id, 1)])
+        self.crud.remove(self.db, id=second.id)
+        self.assertEqual(cluster_representatives(self.db, [], cluster_ids=old_clusters), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# tests/test_comment_import.py
+
+import io
+import json
+import unittest
+from unittest.mock import patch
+from app_fixtures import sqlite_session
+from app.models.models import (
+    Bill, BillCommentDaily, BillCommentStats, Comment, CommentCluster, CommentClusterBucket,
+    CommentClusterMember, User,
+)
+from app.services.comment_import import CSV, NDJSON, detect_format, import_comments
+
+
+class TestCommentImport(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite_session(
+            User, Bill, Comment, BillCommentStats, BillCommentDaily,
+            CommentCluster, CommentClusterBucket, CommentClusterMember,
+        )
+        self.db.add_all([
+            User(id=1, email="admin@example.com", hashed_password="x"),
+            User(id=2, email="sms@example.com", hashed_password="x"),
+            Bill(id=10, title="Finance Bill"),
+        ])
+        self.db.commit()
+        patcher = patch("app.services.comment_import.enqueue_comment_clusters")
+        self.enqueue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_ndjson_import_in_batches(self):
+        lines = [json.dumps({"text": f"Comment {n}", "bill_id": 10}) for n in range(7)]
+        stream = io.StringIO("\n".join(lines) + "\n")
+        report = import_comments(self.db, stream, format=NDJSON, user_id=1, batch_size=3)
+        self.assertEqual((report.received, report.inserted, report.rejected), (7, 7, 0))
+        self.assertEqual(self.db.query(Comment).filter(Comment.user_id == 1).count(), 7)
+        self.assertEqual(self.enqueue.call_count, 3)
+        self.assertEqual(self.db.get(BillCommentStats, 10).comment_count, 7)
+        self.assertGreater(report.rows_per_second, 0)
+
+    def test_invalid_rows_are_reported_not_fatal(self):
+        stream = io.StringIO(
+            '{"text": "Good", "bill_id": 10}\n'
+            'not json\n'
+            '{"text": "   ", "bill_id": 10}\n'
+            '{"text": "Unknown bill", "bill_id": 99}\n'
+            '{"text": "Unknown user", "bill_id": 10, "user_id": 42}\n'
+        )
+        report = import_comments(self.db, stream, format=NDJSON, user_id=1)
+        self.assertEqual((report.inserted, report.rejected), (1, 4))
+        self.assertEqual([error["line"] for error in report.errors], [2, 3, 4, 5])
+        self.assertIn("Bill 99 not found", report.errors[2]["error"])
+
+    def test_csv_import(self):
+        stream = io.StringIO(
+            "text,bill_id,user_id,created_at\n"
+            "\"Lower the tax, please\",10,2,2024-06-01T10:00:00+00:00\n"
+            "No user,10,,\n"
+        )
+        report = import_comments(self.db, stream, format=CSV, user_id=1)
+        self.assertEqual(report.inserted, 2)
+        comments = self.db.query(Comment).order_by(Comment.id).all()
+        self.assertEqual([(c.text, c.user_id) for c in comments], [("Lower the tax, please", 2), ("No user", 1)])
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format("comments.CSV"), CSV)
+        self.assertEqual(detect_format(content_type="text/csv; charset=utf-8"), CSV)
+        self.assertEqual(detect_format("comments.ndjson"), NDJSON)
+
+
+if __name__ == '__main__':
+    unittest.main()
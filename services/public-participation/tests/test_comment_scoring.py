@@ -0,0 +1,97 @@
+# tests/test_comment_scoring.py
+
+import unittest
+from app_fixtures import sqlite_session
+from app.crud.crud_comment import CRUDComment
+from app.models.models import (
+    Bill, BillCommentDaily, BillCommentStats, Comment, CommentCluster, CommentClusterBucket, CommentClusterMember,
+    CommentScore, ScoringState, User,
+)
+from app.schemas.comment import CommentUpdate
+from app.services.comment_scoring import (
+    NEGATIVE, NEUTRAL, POSITIVE, LexiconScorer, get_bill_sentiment, score_new_comments,
+)
+
+
+class TestLexiconScorer(unittest.TestCase):
+    def setUp(self):
+        self.scorer = LexiconScorer()
+
+    def test_labels(self):
+        self.assertEqual(self.scorer.score("I support this bill, it is a great relief").label, POSITIVE)
+        self.assertEqual(self.scorer.score("This tax is punitive and unfair, scrap it").label, NEGATIVE)
+        self.assertEqual(self.scorer.score("When is the next hearing?").label, NEUTRAL)
+
+    def test_negation_and_intensifiers(self):
+        self.assertEqual(self.scorer.score("This is not good").label, NEGATIVE)
+        self.assertGreater(self.scorer.score("very good").sentiment, self.scorer.score("good").sentiment)
+
+    def test_topic(self):
+        self.assertEqual(self.scorer.score("The new VAT on bread hurts families, lower the tax").topic, "tax")
+        self.assertIsNone(self.scorer.score("I agree").topic)
+
+
+class TestScoringPipeline(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite_session(
+            User, Bill, Comment, CommentScore, ScoringState, BillCommentStats, BillCommentDaily,
+            CommentCluster, CommentClusterBucket, CommentClusterMember,
+        )
+        self.db.add_all([
+            User(id=1, email="citizen@example.com", hashed_password="x"),
+            Bill(id=1, title="Finance Bill"),
+            Bill(id=2, title="Housing Bill"),
+        ])
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def add(self, *texts):
+        for text in texts:
+            self.db.add(Comment(text=text, bill_id=1, user_id=1))
+        self.db.commit()
+
+    def test_each_comment_is_scored_once(self):
+        self.add("I support it", "Unfair tax", "When?")
+        self.assertEqual(score_new_comments(self.db, batch_size=2), 3)
+        self.assertEqual(score_new_comments(self.db, batch_size=2), 0)
+        self.add("Great relief for farmers")
+        self.assertEqual(score_new_comments(self.db), 1)
+        self.assertEqual(self.db.query(CommentScore).count(), 4)
+        self.assertIsNotNone(self.db.get(ScoringState, LexiconScorer.name).updated_at)
+
+    def test_lower_ids_committed_late_are_scored(self):
+        # A bulk import holding id 2 commits after id 3 was scored
+        self.db.add_all([
+            Comment(id=1, text="I support it", bill_id=1, user_id=1),
+            Comment(id=3, text="Unfair tax", bill_id=1, user_id=1),
+        ])
+        self.db.commit()
+        self.assertEqual(score_new_comments(self.db), 2)
+        self.db.add(Comment(id=2, text="Imported late", bill_id=1, user_id=1))
+        self.db.commit()
+        self.assertEqual(score_new_comments(self.db), 1)
+        self.assertEqual(self.db.query(CommentScore).count(), 3)
+
+    def test_edited_comments_are_scored_again(self):
+        self.add("I support it, great")
+        score_new_comments(self.db)
+        comment = self.db.get(Comment, 1)
+        CRUDComment(Comment).update(self.db, db_obj=comment, obj_in=CommentUpdate(text="Unfair tax, scrap it", bill_id=2))
+        self.assertEqual(get_bill_sentiment(self.db, 1)["scored"], 0)
+        self.assertEqual(score_new_comments(self.db), 1)
+        self.assertEqual(get_bill_sentiment(self.db, 2)["labels"], {NEGATIVE: 1})
+
+    def test_bill_sentiment_distribution(self):
+        self.add("I support it, great", "Unfair tax, scrap it", "Punitive levy")
+        score_new_comments(self.db)
+        sentiment = get_bill_sentiment(self.db, 1)
+        self.assertEqual(sentiment["scored"], 3)
+        self.assertEqual(sentiment["labels"], {POSITIVE: 1, NEGATIVE: 2})
+        self.assertEqual(sentiment["topics"], {"tax": 2})
+        self.assertLess(sentiment["average_sentiment"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# tests/test_comment_stats.py
+
+import unittest
+from datetime import datetime, timedelta
+from app_fixtures import sqlite_session
+from app.crud.crud_comment import CRUDComment
+from app.models.models import (
+    Bill, BillCommentDaily, BillCommentStats, Comment, CommentCluster, CommentClusterBucket,
+    CommentClusterMember, CommentScore, User,
+)
+from app.schemas.comment import CommentCreate, CommentUpdate
+from app.services.comment_stats import apply_comment_changes, get_bill_comment_stats, rebuild_comment_stats
+
+
+class TestCommentStats(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite_session(
+            User, Bill, Comment, BillCommentStats, BillCommentDaily,
+            CommentCluster, CommentClusterBucket, CommentClusterMember, CommentScore,
+        )
+        self.db.add_all([
+            User(id=1, email="citizen@example.com", hashed_password="x"),
+            Bill(id=1, title="Finance Bill"),
+            Bill(id=2, title="Housing Bill"),
+        ])
+        self.db.commit()
+        self.crud = CRUDComment(Comment)
+
+    def tearDown(self):
+        self.db.close()
+
+    def comment(self, bill_id):
+        return self.crud.create_with_user(self.db, obj_in=CommentCreate(text="Comment", bill_id=bill_id), user_id=1)
+
+    def snapshot(self):
+        stats = sorted((row.bill_id, row.comment_count, row.last_comment_at) for row in self.db.query(BillCommentStats))
+        daily = sorted((row.bill_id, row.day, row.comment_count) for row in self.db.query(BillCommentDaily))
+        return [row for row in stats if row[1]], daily
+
+    def test_create_update_and_remove_keep_counts(self):
+        first = self.comment(1)
+        second = self.comment(1)
+        self.comment(2)
+        self.assertEqual(get_bill_comment_stats(self.db, 1)["comment_count"], 2)
+
+        self.crud.update(self.db, db_obj=second, obj_in=CommentUpdate(text="Moved", bill_id=2))
+        self.assertEqual(get_bill_comment_stats(self.db, 1)["comment_count"], 1)
+        self.assertEqual(get_bill_comment_stats(self.db, 2)["comment_count"], 2)
+
+        self.crud.remove(self.db, id=first.id)
+        stats = get_bill_comment_stats(self.db, 1)
+        self.assertEqual((stats["comment_count"], stats["last_comment_at"], stats["daily"]), (0, None, []))
+
+    def test_daily_volume_and_latest_comment(self):
+        now = datetime.utcnow()
+        comments = [(1, now - timedelta(days=2)), (1, now - timedelta(days=2)), (1, now)]
+        apply_comment_changes(self.db, added=comments)
+        self.db.commit()
+        stats = get_bill_comment_stats(self.db, 1, days=7)
+        self.assertEqual(stats["comment_count"], 3)
+        self.assertEqual(stats["last_comment_at"], now)
+        self.assertEqual([day["comment_count"] for day in stats["daily"]], [2, 1])
+        self.assertEqual(len(get_bill_comment_stats(self.db, 1, days=1)["daily"]), 1)
+
+    def test_rebuild_matches_incremental_aggregates(self):
+        for bill_id in (1, 1, 2, 1):
+            self.comment(bill_id)
+        incremental = self.snapshot()
+        self.assertEqual(rebuild_comment_stats(self.db), 2)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_bill_without_comments_has_no_stats(self):
+        self.assertIsNone(get_bill_comment_stats(self.db, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# tests/test_downloader.py
+
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scripts.downloader import DOWNLOADED, NOT_MODIFIED, Downloader
+
+BODY = b"%PDF-1.4 " + bytes(range(256)) * 64
+ETAG = '"v1"'
+
+
+class BillHandler(BaseHTTPRequestHandler):
+    """
+    Serves BODY at any path with an ETag, honouring If-None-Match, Range and If-Range.
+    """
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", ETAG) == ETAG:
+            start = int(range_header.split("=")[1].rstrip("-"))
+        body = BODY[start:]
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloader(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), BillHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        BillHandler.requests_seen = []
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.downloader = Downloader(download_dir=self.tmp_dir.name, max_workers=4, per_host_limit=2)
+
+    def tearDown(self):
+        self.downloader.close()
+        self.tmp_dir.cleanup()
+
+    def test_downloads_concurrently_and_skips_unchanged_files(self):
+        urls = [f"{self.base_url}/Bill{number}_2024.pdf" for number in range(5)]
+        results = self.downloader.download_all(urls)
+        self.assertEqual({result.status for result in results}, {DOWNLOADED})
+        for result in results:
+            with open(result.file_path, 'rb') as f:
+                self.assertEqual(f.read(), BODY)
+
+        results = self.downloader.download_all(urls)
+        self.assertEqual({result.status for result in results}, {NOT_MODIFIED})
+        self.assertEqual(BillHandler.requests_seen[-1].get("If-None-Match"), ETAG)
+
+    def test_resumes_partial_download_with_range(self):
+        url = f"{self.base_url}/TheFinanceBill_2024.pdf"
+        file_path = self.downloader.file_path(url)
+        with open(f"{file_path}.part", 'wb') as f:
+            f.write(BODY[:1000])
+
+        result = self.downloader.download(url)
+        self.assertEqual(result.status, DOWNLOADED)
+        self.assertTrue(result.resumed)
+        self.assertEqual(result.bytes_received, len(BODY) - 1000)
+        self.assertEqual(BillHandler.requests_seen[-1].get("Range"), "bytes=1000-")
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertFalse(os.path.exists(f"{file_path}.part"))
+
+    def test_duplicate_links_download_once(self):
+        url = f"{self.base_url}/Bill_2024.pdf"
+        results = self.downloader.download_all([url, f"{url}?download=1"])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(BillHandler.requests_seen), 1)
+
+    def test_unique_urls_keep_the_first_link_to_each_file(self):
+        url = f"{self.base_url}/Bill_2024.pdf"
+        other = f"{self.base_url}/Bill_2025.pdf"
+        self.assertEqual(self.downloader.unique_urls([url, other, f"{url}?download=1"]), [url, other])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# tests/test_embeddings.py
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from modules.embeddings import HashingEmbedder, VectorIndex
+
+PASSAGES = {
+    1: ["Tax on mobile money transfers rises to fifteen percent.", "Excise duty on fuel and petroleum products."],
+    2: ["Kenyan Sign Language is recognised in courts and schools.", "Interpreters must be provided in hospitals."],
+    3: ["The commission investigates corruption by public officers.", "Assets of public officers shall be declared."],
+}
+
+
+class TestHashingEmbedder(unittest.TestCase):
+    def test_embeddings_are_deterministic_and_normalized(self):
+        embedder = HashingEmbedder(dim=64)
+        first = embedder.embed(["Finance Bill 2024", "sign language"])
+        second = HashingEmbedder(dim=64).embed(["Finance Bill 2024", "sign language"])
+        self.assertEqual(first.dtype, np.float32)
+        np.testing.assert_array_equal(first, second)
+        np.testing.assert_allclose(np.linalg.norm(first, axis=1), [1.0, 1.0], rtol=1e-5)
+
+
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.embedder = HashingEmbedder(dim=128)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def build(self, passages, **kwargs):
+        index = VectorIndex(directory=self.tmp_dir.name, embedder=self.embedder, **kwargs)
+        builder = index.builder(batch_size=1)
+        for bill_id, texts in passages.items():
+            builder.add_bill(bill_id, f"hash-{bill_id}", texts)
+        builder.commit()
+        return index
+
+    def test_search_finds_the_closest_passage(self):
+        index = self.build(PASSAGES)
+        item, score = index.search("which officers must declare their assets", k=1)[0]
+        self.assertEqual((item["bill_id"], item["index"]), (3, 1))
+        self.assertEqual(index.search_bills("sign language interpreters in hospitals", k=1)[0][0], 2)
+        self.assertEqual([item["bill_id"] for item, _ in index.search("tax", k=5, bill_id=1)], [1, 1])
+
+    def test_rebuild_reuses_vectors_of_unchanged_bills(self):
+        index = self.build(PASSAGES)
+        builder = index.builder()
+        builder.add_bill(1, "hash-1b", ["Betting tax is reduced."])
+        builder.commit()
+
+        reader = VectorIndex(directory=self.tmp_dir.name, embedder=self.embedder)
+        self.assertTrue(reader.load())
+        self.assertEqual(len(reader), 5)
+        self.assertEqual(reader.bill_hashes[1], "hash-1b")
+        self.assertEqual(reader.search("betting tax", k=1)[0][0]["bill_id"], 1)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ["meta.json", "vectors-2.f32"])
+
+    def test_restaged_bill_replaces_its_earlier_rows(self):
+        index = VectorIndex(directory=self.tmp_dir.name, embedder=self.embedder)
+        builder = index.builder()
+        builder.add_bill(1, "hash-1", ["Excise duty on fuel rises.", "Betting tax doubles."])
+        builder.add_bill(2, "hash-2", PASSAGES[2])
+        builder.add_bill(1, "hash-1b", ["Betting tax is reduced."])
+        builder.commit()
+        self.assertEqual(len(index), 1 + len(PASSAGES[2]))
+        self.assertEqual(index.bill_hashes[1], "hash-1b")
+        self.assertEqual(index.search("betting tax reduced", k=1)[0][0], {"bill_id": 1, "index": 0})
+        self.assertEqual(index.search(PASSAGES[2][0], k=1)[0][0], {"bill_id": 2, "index": 0})
+
+    def test_ivf_search_agrees_with_exact_search(self):
+        rng = np.random.default_rng(1)
+        words = [f"word{n}" for n in range(300)]
+        passages = {
+            bill_id: [" ".join(rng.choice(words, 12)) for _ in range(10)] for bill_id in range(60)
+        }
+        index = self.build(passages, exact_below=100, nprobe=4)
+        self.assertIsNotNone(index.centroids)
+        query = passages[7][3]
+        self.assertEqual(index.search(query, k=1)[0][0], {"bill_id": 7, "index": 3})
+
+    def test_index_from_another_model_is_not_loaded(self):
+        self.build(PASSAGES)
+        other = VectorIndex(directory=self.tmp_dir.name, embedder=HashingEmbedder(dim=32))
+        self.assertFalse(other.load())
+        self.assertEqual(other.search("tax"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+# tests/test_graph_writer.py
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import app_fixtures  # noqa: F401  (sets the settings app.core.config needs)
+from app.services.graph_writer import BILL, COMMENT, DELETED_COMMENT, GraphWriter
+
+
+class RecordingGraph:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.deleted = []
+        self.written = threading.Event()
+
+    def write_batch(self, bills, comments, deleted_comments=()):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Neo4j is unavailable")
+        if deleted_comments:
+            self.deleted.extend(deleted_comments)
+        else:
+            self.batches.append((bills, comments))
+        self.written.set()
+
+
+def bill(id, title="Finance Bill"):
+    return {"id": id, "title": title, "description": None, "status": "active", "created_at": "2024-01-01"}
+
+
+class TestGraphWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool_path = os.path.join(self.directory.name, "spool", "graph.jsonl")
+        self.writers = []
+
+    def tearDown(self):
+        for writer in self.writers:
+            writer.close()
+        self.directory.cleanup()
+
+    def make_writer(self, graph, **kwargs):
+        kwargs.setdefault("flush_interval", 60)
+        writer = GraphWriter(write_batch=graph.write_batch, spool_path=self.spool_path, **kwargs)
+        self.writers.append(writer)
+        return writer
+
+    def spool_files(self):
+        return [name for name in os.listdir(os.path.dirname(self.spool_path)) if os.path.getsize(
+            os.path.join(os.path.dirname(self.spool_path), name))]
+
+    def test_events_are_coalesced_per_node(self):
+        graph = RecordingGraph()
+        writer = self.make_writer(graph)
+        writer.enqueue(BILL, bill(1, "Draft"))
+        writer.enqueue(BILL, bill(1, "Final"))
+        writer.enqueue(COMMENT, {"id": 7, "text": "No", "bill_id": 1, "created_at": "2024-01-02"})
+        self.assertTrue(writer.flush())
+        self.assertEqual(graph.batches, [([bill(1, "Final")], []),
+                                         ([], [{"id": 7, "text": "No", "bill_id": 1, "created_at": "2024-01-02"}])])
+        self.assertEqual(writer.stats()["coalesced"], 1)
+        self.assertEqual(self.spool_files(), [])
+
+    def test_latest_comment_event_wins_over_a_deletion(self):
+        graph = RecordingGraph()
+        writer = self.make_writer(graph)
+        comment = {"id": 7, "text": "No", "bill_id": 1, "created_at": "2024-01-02", "cluster_size": 2}
+        writer.enqueue(COMMENT, comment)
+        writer.enqueue(DELETED_COMMENT, {"id": 7})
+        writer.enqueue(DELETED_COMMENT, {"id": 8})
+        writer.enqueue(COMMENT, dict(comment, id=8))
+        self.assertTrue(writer.flush())
+        self.assertEqual(graph.batches, [([], [dict(comment, id=8)])])
+        self.assertEqual(graph.deleted, [7])
+        self.assertEqual(writer.stats()["written"], 2)
+
+    def test_full_batch_is_flushed_without_waiting(self):
+        graph = RecordingGraph()
+        writer = self.make_writer(graph, batch_size=3)
+        for id in range(3):
+            writer.enqueue(BILL, bill(id))
+        self.assertTrue(graph.written.wait(5))
+        self.assertEqual(len(graph.batches[0][0]), 3)
+
+    def test_pending_events_are_flushed_after_the_interval(self):
+        graph = RecordingGraph()
+        writer = self.make_writer(graph, flush_interval=0.05)
+        writer.enqueue(BILL, bill(1))
+        self.assertTrue(graph.written.wait(5))
+
+    def test_failed_writes_are_retried_and_stay_spooled(self):
+        graph = RecordingGraph(failures=1)
+        writer = self.make_writer(graph)
+        writer.enqueue(BILL, bill(1))
+        self.assertFalse(writer.flush())
+        self.assertEqual(writer.stats()["pending"], 1)
+        self.assertNotEqual(self.spool_files(), [])
+        self.assertTrue(writer.flush())
+        self.assertEqual(graph.batches, [([bill(1)], [])])
+        self.assertEqual(self.spool_files(), [])
+
+    def test_spooled_events_are_replayed_after_a_restart(self):
+        down = RecordingGraph(failures=100)
+        writer = self.make_writer(down)
+        writer.enqueue(BILL, bill(1))
+        writer.enqueue(BILL, bill(2))
+        writer.close()
+
+        graph = RecordingGraph()
+        restarted = self.make_writer(graph)
+        restarted.start()
+        self.assertEqual(restarted.stats()["pending"], 2)
+        self.assertTrue(restarted.flush())
+        self.assertEqual([node["id"] for node in graph.batches[0][0]], [1, 2])
+        self.assertEqual(self.spool_files(), [])
+
+    def test_only_spools_of_stopped_writers_are_replayed(self):
+        # Worker processes, told apart by their pid
+        with patch("app.services.graph_writer.os.getpid", return_value=1001):
+            busy = self.make_writer(RecordingGraph(failures=100))
+            busy.enqueue(BILL, bill(1))
+        with patch("app.services.graph_writer.os.getpid", return_value=1002):
+            other = self.make_writer(RecordingGraph())
+            other.start()
+        self.assertEqual(other.stats()["pending"], 0)
+
+        busy.close()
+        graph = RecordingGraph()
+        with patch("app.services.graph_writer.os.getpid", return_value=1003):
+            restarted = self.make_writer(graph)
+            restarted.start()
+        self.assertEqual(restarted.stats()["pending"], 1)
+        self.assertTrue(restarted.flush())
+        self.assertEqual(graph.batches, [([bill(1)], [])])
+        self.assertEqual(self.spool_files(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
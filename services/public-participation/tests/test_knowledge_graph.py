@@ -0,0 +1,140 @@
+# tests/test_knowledge_graph.py
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from modules.embeddings import HashingEmbedder, VectorIndex
+from modules.knowledge_graph import Base, KenyaBill, KnowledgeGraph, content_hash
+from modules.passages import PASSAGE_SCHEME
+from modules.title_index import TitleIndex
+
+
+def make_knowledge_graph(index_path, graph_hashes=None, batch_size=2):
+    """
+    Builds a KnowledgeGraph on an in-memory SQLite database and a fake Neo4j driver,
+    without running the constructor's connection setup.
+    """
+    kg = KnowledgeGraph.__new__(KnowledgeGraph)
+    kg.pg_engine = create_engine("sqlite://")
+    Base.metadata.create_all(kg.pg_engine)
+    kg.SessionLocal = sessionmaker(bind=kg.pg_engine)
+    kg.title_index = TitleIndex(path=index_path)
+    kg.response_cache = MagicMock()
+    kg.batch_size = batch_size
+    kg._fulltext_index_ready = True
+    kg.vector_index = None
+    kg._deferred_vectors = None
+    kg._title_index_dirty = False
+
+    session = MagicMock()
+    session.run.return_value = [
+        {"id": bill_id, "content_hash": bill_hash} for bill_id, bill_hash in (graph_hashes or {}).items()
+    ]
+    kg.neo4j_driver = MagicMock()
+    kg.neo4j_driver.session.return_value.__enter__.return_value = session
+    return kg, session
+
+
+class TestKnowledgeGraphSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp_dir.name, "title_index.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def add_bills(self, kg, count):
+        db = kg.SessionLocal()
+        for bill_id in range(1, count + 1):
+            db.add(KenyaBill(
+                id=bill_id, title=f"Bill{bill_id}_2024.pdf", url=f"http://example/{bill_id}",
+                file_path=f"bills_pdfs/Bill{bill_id}_2024.pdf", text_content=f"Text {bill_id}",
+            ))
+        db.commit()
+        db.close()
+
+    def written_rows(self, session):
+        rows = []
+        for call in session.execute_write.call_args_list:
+            rows.extend(call.args[1])
+        return rows
+
+    def test_writes_new_bills_in_batches(self):
+        kg, session = make_knowledge_graph(self.index_path)
+        self.add_bills(kg, 5)
+        stats = kg.sync_data()
+        self.assertEqual(stats, {"scanned": 5, "written": 5, "unchanged": 0})
+        self.assertEqual(session.execute_write.call_count, 3)
+        saved_index = TitleIndex(path=self.index_path)
+        self.assertTrue(saved_index.load())
+        self.assertEqual(len(saved_index), 5)
+
+    def test_skips_unchanged_bills(self):
+        unchanged = content_hash("Bill1_2024.pdf", "http://example/1", "bills_pdfs/Bill1_2024.pdf", "Text 1", PASSAGE_SCHEME)
+        kg, session = make_knowledge_graph(self.index_path, graph_hashes={1: unchanged, 2: "stale"})
+        self.add_bills(kg, 3)
+        stats = kg.sync_data()
+        self.assertEqual(stats, {"scanned": 3, "written": 2, "unchanged": 1})
+        self.assertEqual([row["id"] for row in self.written_rows(session)], [2, 3])
+        self.assertIn(1, kg.title_index)
+
+    def test_changed_bill_invalidates_cached_answers(self):
+        kg, _ = make_knowledge_graph(self.index_path, graph_hashes={1: "stale"})
+        kg.title_index.add(1, "Bill1_2024.pdf", content_hash="stale")
+        self.add_bills(kg, 1)
+        kg.sync_data()
+        kg.response_cache.invalidate_bill.assert_called_once_with(1)
+
+    def test_write_bills_replaces_passages(self):
+        tx = MagicMock()
+        rows = [{"id": 1, "title": "Bill1", "url": "u", "file_path": "f", "description": "Text",
+                 "content_hash": "h", "passages": ["first", "second"]}]
+        KnowledgeGraph._write_bills(tx, rows)
+        bill_call, delete_call, passage_call = tx.run.call_args_list
+        self.assertNotIn("passages", bill_call.kwargs["rows"][0])
+        self.assertIn("DETACH DELETE p", delete_call.args[0])
+        self.assertEqual(delete_call.kwargs["ids"], [1])
+        self.assertEqual(
+            passage_call.kwargs["passages"],
+            [{"bill_id": 1, "index": 0, "text": "first"}, {"bill_id": 1, "index": 1, "text": "second"}],
+        )
+
+    def test_full_sync_rewrites_everything(self):
+        unchanged = content_hash("Bill1_2024.pdf", "http://example/1", "bills_pdfs/Bill1_2024.pdf", "Text 1", PASSAGE_SCHEME)
+        kg, session = make_knowledge_graph(self.index_path, graph_hashes={1: unchanged})
+        self.add_bills(kg, 1)
+        self.assertEqual(kg.sync_data(full=True)["written"], 1)
+
+    def test_sync_embeds_only_new_or_changed_bills(self):
+        kg, _ = make_knowledge_graph(self.index_path)
+        kg.vector_index = VectorIndex(directory=self.tmp_dir.name, embedder=HashingEmbedder(dim=32))
+        self.add_bills(kg, 3)
+        self.assertEqual(kg.sync_data()["embedded"], 3)
+        self.assertEqual(len(kg.vector_index), 3)
+
+        hashes = dict(kg.vector_index.bill_hashes)
+        kg, _ = make_knowledge_graph(self.index_path, graph_hashes=hashes)
+        kg.vector_index = VectorIndex(directory=self.tmp_dir.name, embedder=HashingEmbedder(dim=32))
+        self.assertEqual(kg.sync_data()["embedded"], 0)
+
+    def test_deferred_syncs_write_the_indexes_once(self):
+        kg, _ = make_knowledge_graph(self.index_path)
+        kg.vector_index = VectorIndex(directory=self.tmp_dir.name, embedder=HashingEmbedder(dim=32))
+        self.add_bills(kg, 4)
+        kg.sync_data(bill_ids=[1, 2], defer_index_writes=True)
+        kg.sync_data(bill_ids=[3, 4], defer_index_writes=True)
+        self.assertEqual(len(kg.vector_index), 0)
+        self.assertFalse(os.path.exists(self.index_path))
+
+        self.assertEqual(kg.finish_sync(), {"embedded": 4})
+        self.assertEqual(kg.vector_index.generation, 1)
+        self.assertEqual(len(kg.vector_index), 4)
+        self.assertTrue(TitleIndex(path=self.index_path).load())
+        self.assertEqual(kg.finish_sync(), {"embedded": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
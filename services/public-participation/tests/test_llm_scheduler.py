@@ -0,0 +1,228 @@
+# tests/test_llm_scheduler.py
+
+import asyncio
+import threading
+import time
+import unittest
+from contextlib import aclosing
+from modules.llm_scheduler import HIGH, LOW, NORMAL, LLMScheduler, request_key, request_priority
+
+
+class TestLLMScheduler(unittest.TestCase):
+    def run_blocked(self, scheduler, requests):
+        """
+        Holds the only slot while the requests queue up, then releases it and returns
+        the order in which the queued requests ran.
+        """
+        order = []
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with scheduler.slot("holder"):
+                holding.set()
+                release.wait(5)
+
+        threads = [threading.Thread(target=hold)]
+        threads[0].start()
+        holding.wait(5)
+        for user, priority, name in requests:
+            thread = threading.Thread(target=lambda u=user, p=priority, n=name: self._run(scheduler, u, p, n, order))
+            thread.start()
+            threads.append(thread)
+            # Queue them in a known order
+            while scheduler.stats()["waiting"] < len(threads) - 1:
+                time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    @staticmethod
+    def _run(scheduler, user, priority, name, order):
+        with scheduler.slot(user, priority):
+            order.append(name)
+
+    def test_concurrency_cap(self):
+        scheduler = LLMScheduler(max_concurrency=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def work(n):
+            with scheduler.slot(f"user{n}"):
+                with lock:
+                    running.append(n)
+                    peak.append(len(running))
+                time.sleep(0.02)
+                with lock:
+                    running.remove(n)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(scheduler.stats()["completed"], 8)
+
+    def test_priority_then_round_robin_across_users(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = self.run_blocked(scheduler, [
+            ("alice", NORMAL, "alice-1"),
+            ("alice", NORMAL, "alice-2"),
+            ("alice", NORMAL, "alice-3"),
+            ("bob", NORMAL, "bob-1"),
+            ("carol", LOW, "carol-1"),
+            ("dave", HIGH, "dave-1"),
+        ])
+        self.assertEqual(order, ["dave-1", "alice-1", "bob-1", "alice-2", "alice-3", "carol-1"])
+
+    def test_identical_in_flight_requests_share_one_generation(self):
+        scheduler = LLMScheduler(max_concurrency=2)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def generate(record):
+            calls.append(record.user)
+            started.set()
+            release.wait(5)
+            record.token()
+            return "answer"
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(scheduler.run("key", generate, user="a")))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(scheduler.run("key", generate, user="b")))
+        second.start()
+        time.sleep(0.05)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(results, ["answer", "answer"])
+        self.assertEqual(calls, ["a"])
+        self.assertEqual(scheduler.stats()["deduplicated"], 1)
+
+    def test_records_wait_first_token_and_throughput(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+        with scheduler.slot("a") as record:
+            time.sleep(0.01)
+            for _ in range(5):
+                record.token()
+                time.sleep(0.005)
+        self.assertGreater(record.time_to_first_token, 0)
+        self.assertGreater(record.tokens_per_second, 0)
+        stats = scheduler.stats()
+        self.assertIsNotNone(stats["time_to_first_token_seconds"]["p50"])
+        self.assertIsNotNone(stats["tokens_per_second"]["p95"])
+
+        record.set_eval(100, 2_000_000_000)
+        self.assertEqual(record.tokens_per_second, 50)
+
+    def test_async_slot_and_cancellation_release(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+
+        async def scenario():
+            async with scheduler.aslot("a"):
+                waiter = asyncio.create_task(self._aslot(scheduler))
+                await asyncio.sleep(0.02)
+                waiter.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiter
+            async with scheduler.aslot("c"):
+                pass
+
+        asyncio.run(scenario())
+        stats = scheduler.stats()
+        self.assertEqual((stats["running"], stats["waiting"], stats["completed"]), (0, 0, 2))
+
+    @staticmethod
+    async def _aslot(scheduler):
+        async with scheduler.aslot("b"):
+            pass
+
+    def test_async_waiters_hold_no_threads(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+
+        async def scenario():
+            async with scheduler.aslot("a"):
+                waiters = [asyncio.create_task(self._aslot(scheduler)) for _ in range(64)]
+                await asyncio.sleep(0.02)
+                self.assertEqual(scheduler.stats()["waiting"], 64)
+                # More waiters than the default executor has threads, and it is still free
+                self.assertEqual(await asyncio.wait_for(asyncio.to_thread(lambda: "cached"), 1), "cached")
+            await asyncio.wait_for(asyncio.gather(*waiters), 5)
+
+        asyncio.run(scenario())
+        self.assertEqual(scheduler.stats()["completed"], 65)
+
+    def test_identical_in_flight_streams_share_one_generation(self):
+        scheduler = LLMScheduler(max_concurrency=2)
+        calls = []
+
+        async def stream(record):
+            calls.append(record.user)
+            for token in ("The bill ", "raises ", "duty."):
+                await asyncio.sleep(0.01)
+                record.token()
+                yield token
+
+        async def scenario():
+            first = asyncio.create_task(self._collect(scheduler, "key", stream, "a"))
+            await asyncio.sleep(0.005)
+            return await asyncio.gather(first, self._collect(scheduler, "key", stream, "b"))
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first, ["The bill ", "raises ", "duty."])
+        self.assertEqual(second, ["The bill raises duty."])
+        self.assertEqual(calls, ["a"])
+        self.assertEqual(scheduler.stats()["deduplicated"], 1)
+
+    def test_abandoned_stream_is_run_again_by_the_next_request(self):
+        scheduler = LLMScheduler(max_concurrency=2)
+        calls = []
+
+        async def stream(record):
+            calls.append(record.user)
+            for token in ("The bill ", "raises ", "duty."):
+                await asyncio.sleep(0.01)
+                yield token
+
+        async def first_token(user):
+            # The caller stops reading after the first token
+            async with aclosing(scheduler.astream("key", stream, user=user)) as tokens:
+                async for token in tokens:
+                    return token
+
+        async def scenario():
+            owner = asyncio.create_task(first_token("a"))
+            await asyncio.sleep(0.005)
+            follower = asyncio.create_task(self._collect(scheduler, "key", stream, "b"))
+            await owner
+            return await asyncio.wait_for(follower, 5)
+
+        self.assertEqual(asyncio.run(scenario()), ["The bill ", "raises ", "duty."])
+        self.assertEqual(calls, ["a", "b"])
+
+    @staticmethod
+    async def _collect(scheduler, key, stream, user):
+        return [token async for token in scheduler.astream(key, stream, user=user)]
+
+    def test_request_priority(self):
+        self.assertEqual(request_priority("list", 1000), HIGH)
+        self.assertEqual(request_priority("general", 150), HIGH)
+        self.assertEqual(request_priority("detail", 150), NORMAL)
+        self.assertEqual(request_priority("general", 1000), LOW)
+        self.assertEqual(request_priority("detail", 150, prompt_chars=10000), NORMAL)
+
+    def test_request_key_ignores_num_predict(self):
+        options = {"num_ctx": 4096, "temperature": 0.7}
+        key = request_key("llama2", "What is the Finance Bill?", dict(options, num_predict=150))
+        self.assertEqual(key, request_key("llama2", "What is the Finance Bill?", dict(options, num_predict=212)))
+        self.assertNotEqual(key, request_key("llama2", "What is the Finance Bill?", dict(options, temperature=0.2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# tests/test_ollama_client.py
+
+import json
+import unittest
+import httpx
+from modules.ai_model import OllamaResponder
+from modules.llm_scheduler import LLMScheduler
+from modules.ollama_client import AsyncOllamaClient, OllamaError, chunk_stream
+from modules.token_budget import TokenBudget
+
+
+def ndjson(*chunks):
+    lines = [json.dumps({"response": chunk, "done": False}) for chunk in chunks]
+    lines.append(json.dumps({"response": "", "done": True}))
+    return "\n".join(lines) + "\n"
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+class TestAsyncOllamaClient(unittest.IsolatedAsyncioTestCase):
+    async def test_streams_tokens(self):
+        def handler(request):
+            payload = json.loads(request.content)
+            self.assertEqual(payload["prompt"], "Hello")
+            return httpx.Response(200, text=ndjson("The ", "Finance ", "Bill"))
+
+        async with AsyncOllamaClient(transport=httpx.MockTransport(handler)) as client:
+            tokens = [token async for token in client.stream_generate("Hello")]
+        self.assertEqual(tokens, ["The ", "Finance ", "Bill"])
+
+    async def test_retries_with_backoff(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) < 3:
+                return httpx.Response(503)
+            return httpx.Response(200, text=ndjson("ok"))
+
+        client = AsyncOllamaClient(retry_delay=0.0, transport=httpx.MockTransport(handler))
+        self.assertEqual(await client.generate("Hello"), "ok")
+        self.assertEqual(len(calls), 3)
+        await client.aclose()
+
+    async def test_gives_up_after_max_retries(self):
+        client = AsyncOllamaClient(
+            retry_delay=0.0, max_retries=2,
+            transport=httpx.MockTransport(lambda request: httpx.Response(500)),
+        )
+        with self.assertRaises(OllamaError):
+            await client.generate("Hello")
+        await client.aclose()
+
+    async def test_client_errors_are_not_retried(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(404)
+
+        client = AsyncOllamaClient(retry_delay=0.0, transport=httpx.MockTransport(handler))
+        with self.assertRaises(OllamaError):
+            await client.generate("Hello")
+        self.assertEqual(len(calls), 1)
+        await client.aclose()
+
+    async def test_chunk_stream_respects_limit(self):
+        tokens = iterate(["word "] * 50)
+        chunks = [chunk async for chunk in chunk_stream(tokens, max_chars=42)]
+        self.assertTrue(all(len(chunk) <= 42 for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), ["word"] * 50)
+
+
+class FailingStreamClient:
+    """Streams the given tokens, then fails as a dropped Ollama connection would."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    async def stream_generate(self, prompt, options):
+        for token in self.tokens:
+            yield token
+        raise OllamaError("connection reset")
+
+
+class TestResponderStreaming(unittest.IsolatedAsyncioTestCase):
+    def responder(self, tokens):
+        responder = OllamaResponder.__new__(OllamaResponder)
+        responder.search = None
+        responder.model_name = "llama3.2:latest"
+        responder.lookup_cached_response = lambda prompt, max_tokens, temperature, deadline: ("key", None, None)
+        responder.build_prompt = lambda prompt, match, deadline: ("Answer: " + prompt, "", "general")
+        responder.token_budget = TokenBudget(count_tokens=lambda text: len(text.split()))
+        responder.scheduler = LLMScheduler(max_concurrency=1)
+        responder._async_client = FailingStreamClient(tokens)
+        responder.stored = []
+        responder.store_cached_response = lambda *args: responder.stored.append(args)
+        return responder
+
+    async def test_error_before_output_yields_apology(self):
+        tokens = [token async for token in self.responder([]).agenerate_stream("What is the Finance Bill?")]
+        self.assertEqual(tokens, ["Sorry, I couldn't process your request at this time."])
+
+    async def test_error_after_output_ends_stream(self):
+        responder = self.responder(["The bill ", "raises "])
+        tokens = [token async for token in responder.agenerate_stream("What is the Finance Bill?")]
+        self.assertEqual(tokens, ["The bill ", "raises "])
+        self.assertEqual(responder.stored, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+# tests/test_passages.py
+
+import unittest
+from modules.passages import split_passages
+
+
+class TestSplitPassages(unittest.TestCase):
+    def test_short_text_is_one_passage(self):
+        self.assertEqual(split_passages("  The Finance Bill, 2024.  "), ["The Finance Bill, 2024."])
+        self.assertEqual(split_passages(""), [])
+
+    def test_passages_overlap_and_do_not_cut_words(self):
+        words = [f"word{number}" for number in range(400)]
+        passages = split_passages(" ".join(words), size=200, overlap=50)
+        self.assertGreater(len(passages), 1)
+        for passage in passages:
+            self.assertLessEqual(len(passage), 200)
+            for word in passage.split():
+                self.assertIn(word, words)
+        # The start of each passage repeats the end of the previous one
+        for previous, current in zip(passages, passages[1:]):
+            self.assertIn(current.split()[0], previous.split())
+        self.assertEqual(passages[-1].split()[-1], "word399")
+
+    def test_prefers_paragraph_breaks(self):
+        text = "A" * 150 + "\n\n" + "B" * 150
+        self.assertEqual(split_passages(text, size=200, overlap=0), ["A" * 150, "B" * 150])
+
+
+if __name__ == '__main__':
+    unittest.main()
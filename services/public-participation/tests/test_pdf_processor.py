@@ -0,0 +1,138 @@
+# tests/test_pdf_processor.py
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from scripts import pdf_processor
+from scripts.database_setup import Base, Bill
+from scripts.extraction_cache import ExtractionCache, file_digest
+
+
+def fake_ocr_pages(pdf_path, first_page, last_page, dpi=None):
+    return "".join(f"{pdf_path} page {page}\n" for page in range(first_page, last_page + 1))
+
+
+class TestPdfProcessor(unittest.TestCase):
+    def test_page_windows(self):
+        self.assertEqual(pdf_processor.page_windows(5, 2), [(1, 2), (3, 4), (5, 5)])
+        self.assertEqual(pdf_processor.page_windows(0, 2), [])
+
+    @patch('scripts.pdf_processor.extract_text')
+    def test_text_pdf_reuses_first_page_probe(self, mock_extract_text):
+        mock_extract_text.side_effect = lambda path, maxpages=0, page_numbers=None: (
+            "page one\x0c" if maxpages == 1 else "page two\x0c"
+        )
+        text = pdf_processor.extract_text_from_pdf("bill.pdf")
+        self.assertEqual(text, "page one\x0cpage two\x0c")
+        self.assertEqual(mock_extract_text.call_count, 2)
+        rest_call = mock_extract_text.call_args_list[1]
+        self.assertNotIn(0, rest_call.kwargs["page_numbers"])
+        self.assertIn(1, rest_call.kwargs["page_numbers"])
+
+    @patch('scripts.pdf_processor.ocr_pages', side_effect=fake_ocr_pages)
+    @patch('scripts.pdf_processor.count_pages', return_value=5)
+    @patch('scripts.pdf_processor.probe_pdf')
+    @patch('scripts.pdf_processor.extract_remaining_text', return_value="text layer")
+    def test_extract_bills_splits_scanned_pdfs_into_windows(self, _rest, mock_probe, _count, mock_ocr):
+        mock_probe.side_effect = lambda path: "" if path == "scanned.pdf" else "first page"
+        jobs = [(1, "scanned.pdf"), (2, "text.pdf")]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            events = list(pdf_processor.extract_bills(jobs, max_workers=2, executor=executor, ocr_window=2))
+
+        self.assertIn((2, "text layer", True), events)
+        scanned = [event for event in events if event[0] == 1]
+        self.assertEqual([done for _, _, done in scanned], [False, False, True])
+        self.assertEqual("".join(chunk for _, chunk, _ in scanned), fake_ocr_pages("scanned.pdf", 1, 5))
+        self.assertEqual(mock_ocr.call_count, 3)
+
+    @patch('scripts.pdf_processor.ocr_pages', side_effect=fake_ocr_pages)
+    @patch('scripts.pdf_processor.count_pages', return_value=3)
+    @patch('scripts.pdf_processor.probe_pdf', return_value="")
+    def test_cached_pdfs_skip_extraction(self, mock_probe, _count, mock_ocr):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "scanned.pdf")
+            copy_path = os.path.join(tmp_dir, "copy.pdf")
+            for path in (pdf_path, copy_path):
+                with open(path, 'wb') as f:
+                    f.write(b"%PDF-1.4 same bytes")
+            cache = ExtractionCache(os.path.join(tmp_dir, "cache"))
+
+            def run(jobs):
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    events = pdf_processor.extract_bills(
+                        jobs, max_workers=1, executor=executor, ocr_window=2, cache=cache
+                    )
+                    return "".join(chunk for _, chunk, _ in events)
+
+            first = run([(1, pdf_path)])
+            self.assertEqual(cache.run_stats()["misses"], 1)
+            self.assertTrue(cache.contains(file_digest(pdf_path)))
+
+            mock_probe.reset_mock()
+            mock_ocr.reset_mock()
+            second = run([(2, copy_path)])
+            self.assertEqual(second, first)
+            mock_probe.assert_not_called()
+            mock_ocr.assert_not_called()
+            self.assertEqual(cache.run_stats()["hits"], 1)
+
+            cache.save_stats()
+            report = cache.report()
+            self.assertEqual((report["hits"], report["misses"], report["entries"]), (1, 1, 1))
+
+
+class TestProcessPdfs(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.SessionLocal = sessionmaker(bind=engine)
+
+        session = self.SessionLocal()
+        for bill_id in (1, 2):
+            pdf_path = os.path.join(self.tmp_dir.name, f"Bill{bill_id}.pdf")
+            open(pdf_path, 'wb').close()
+            session.add(Bill(id=bill_id, title=f"Bill{bill_id}.pdf", file_path=pdf_path, text_content=""))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_streams_chunks_to_file_and_database(self):
+        events = [(1, "page 1\n", False), (2, " ", True), (1, "page 2\n", True)]
+        processed_dir = os.path.join(self.tmp_dir.name, "processed")
+        with patch.object(pdf_processor, 'SessionLocal', self.SessionLocal), \
+                patch.object(pdf_processor, 'PROCESSED_DIR', processed_dir), \
+                patch.object(pdf_processor, 'extract_bills', return_value=iter(events)):
+            cache = ExtractionCache(os.path.join(self.tmp_dir.name, "cache"))
+            self.assertTrue(pdf_processor.process_pdfs(batch_size=1, cache=cache))
+
+        session = self.SessionLocal()
+        self.assertEqual(session.get(Bill, 1).text_content, "page 1\npage 2\n")
+        self.assertIsNone(session.get(Bill, 2))
+        session.close()
+        self.assertEqual(sorted(os.listdir(processed_dir)), ["Bill1.txt"])
+
+    def test_store_text_from_file_appends_in_pieces(self):
+        text_filename = os.path.join(self.tmp_dir.name, "Bill1.txt")
+        with open(text_filename, 'w', encoding='utf-8') as f:
+            f.write("abcdefgh")
+        session = self.SessionLocal()
+        pdf_processor.store_text_from_file(session, 1, text_filename, chunk_chars=3)
+        session.commit()
+        session.expire_all()
+        self.assertEqual(session.get(Bill, 1).text_content, "abcdefgh")
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# tests/test_pipeline.py
+
+import os
+import threading
+import time
+import unittest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from scripts.pipeline import Pipeline, Stage
+
+
+class TestPipeline(unittest.TestCase):
+    def test_items_flow_through_all_stages(self):
+        results = []
+        summary = Pipeline([
+            Stage("double", lambda item: [item * 2], workers=3, queue_size=2),
+            Stage("square", lambda item: [item * item], workers=2, queue_size=2),
+            Stage("collect", lambda item: results.append(item), queue_size=2),
+        ]).run(range(10))
+
+        self.assertEqual(sorted(results), sorted((n * 2) ** 2 for n in range(10)))
+        self.assertTrue(summary.ok)
+        self.assertEqual(summary.stage("double").items_in, 10)
+        self.assertEqual(summary.stage("square").items_out, 10)
+        self.assertLessEqual(summary.stage("square").max_queue_depth, 2)
+
+    def test_later_stages_overlap_with_earlier_ones(self):
+        first_done = threading.Event()
+        seen_before_first_done = []
+
+        def slow_source(item):
+            if item == 4:
+                time.sleep(0.2)
+                first_done.set()
+            return [item]
+
+        def sink(item):
+            if not first_done.is_set():
+                seen_before_first_done.append(item)
+
+        Pipeline([
+            Stage("source", slow_source, workers=1),
+            Stage("sink", sink, workers=1),
+        ]).run(range(5))
+        self.assertTrue(seen_before_first_done)
+
+    def test_failures_are_counted_and_batches_flushed(self):
+        batch = []
+
+        def handle(item):
+            if item == 3:
+                raise ValueError("bad item")
+            batch.append(item)
+            return []
+
+        def flush():
+            items, batch[:] = list(batch), []
+            return [items] if items else []
+
+        flushed = []
+        summary = Pipeline([
+            Stage("store", handle, flush=flush, flush_interval=0.05),
+            Stage("sync", lambda items: flushed.extend(items)),
+        ]).run(range(6))
+
+        self.assertEqual(summary.failed, 1)
+        self.assertFalse(summary.ok)
+        self.assertEqual(sorted(flushed), [0, 1, 2, 4, 5])
+        self.assertIn("store", summary.format())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# tests/test_reply_dispatcher.py
+
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+os.environ["WHATSAPP_BOT_WARMUP"] = "false"
+
+from modules.llm_scheduler import LOW, request_priority
+from modules.reply_dispatcher import LogSender, ReplyDispatcher
+from scripts import whatsapp_bot
+
+
+class TestReplyDispatcher(unittest.TestCase):
+    def test_replies_to_a_number_keep_their_order(self):
+        sender = LogSender()
+
+        def handler(number, text):
+            # Earlier questions take longer, so a reordering would show
+            time.sleep(0.05 if text == "first" else 0.0)
+            return f"answer to {text}"
+
+        dispatcher = ReplyDispatcher(handler, sender, workers=4)
+        for text in ("first", "second", "third"):
+            self.assertTrue(dispatcher.submit("whatsapp:+254700000001", text))
+        self.assertTrue(dispatcher.join(timeout=5))
+        dispatcher.close()
+        self.assertEqual(
+            [body for _, body in sender.sent],
+            ["answer to first", "answer to second", "answer to third"],
+        )
+
+    def test_numbers_are_answered_concurrently(self):
+        started = threading.Barrier(3, timeout=5)
+
+        def handler(number, text):
+            started.wait()
+            return "ok"
+
+        sender = LogSender()
+        dispatcher = ReplyDispatcher(handler, sender, workers=3)
+        for n in range(3):
+            dispatcher.submit(f"whatsapp:+25470000000{n}", "question")
+        self.assertTrue(dispatcher.join(timeout=5))
+        dispatcher.close()
+        self.assertEqual(len(sender.sent), 3)
+
+    def test_full_queue_rejects_and_failures_send_an_apology(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def handler(number, text):
+            started.set()
+            release.wait(5)
+            raise RuntimeError("ollama down")
+
+        sender = LogSender()
+        dispatcher = ReplyDispatcher(handler, sender, workers=1, max_pending=1, error_reply="sorry")
+        self.assertTrue(dispatcher.submit("a", "one"))
+        self.assertTrue(started.wait(5))  # "one" is now in progress, no longer pending
+        self.assertTrue(dispatcher.submit("a", "two"))
+        self.assertFalse(dispatcher.submit("b", "three"))
+        release.set()
+        self.assertTrue(dispatcher.join(timeout=5))
+        dispatcher.close()
+        self.assertEqual(sender.sent, [("a", "sorry"), ("a", "sorry")])
+        self.assertEqual(dispatcher.stats()["rejected"], 1)
+
+
+class TestDeferredWebhook(unittest.TestCase):
+    def setUp(self):
+        self.sender = LogSender()
+        whatsapp_bot.dispatcher = ReplyDispatcher(lambda number, text: whatsapp_bot.answer_message(text, number), self.sender)
+        self.client = whatsapp_bot.app.test_client()
+
+    def tearDown(self):
+        whatsapp_bot.dispatcher.close()
+        whatsapp_bot.dispatcher = None
+
+    @patch('scripts.whatsapp_bot.REPLY_MODE', "deferred")
+    @patch('scripts.whatsapp_bot.get_responder')
+    def test_webhook_acknowledges_and_sends_the_answer_later(self, mock_get_responder):
+        release = threading.Event()
+
+        def generate_response(prompt, max_tokens=150, user=None):
+            release.wait(5)
+            return "The Finance Bill raises excise duty."
+
+        mock_get_responder.return_value.generate_response.side_effect = generate_response
+        response = self.client.post('/whatsapp', data={'Body': 'What is the finance bill?', 'From': 'whatsapp:+254700000001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(whatsapp_bot.ACK_MESSAGE, response.get_data(as_text=True))
+        self.assertEqual(self.sender.sent, [])
+
+        release.set()
+        self.assertTrue(whatsapp_bot.dispatcher.join(timeout=5))
+        self.assertEqual(self.sender.sent, [("whatsapp:+254700000001", "The Finance Bill raises excise duty.")])
+
+
+class TestReplyPriority(unittest.TestCase):
+    @patch('scripts.whatsapp_bot.get_responder')
+    def test_replies_are_not_scheduled_as_long_answers(self, mock_get_responder):
+        generate_response = mock_get_responder.return_value.generate_response
+        generate_response.return_value = "The Finance Bill raises excise duty."
+        whatsapp_bot.answer_message("What is the finance bill?", "whatsapp:+254700000001")
+        max_tokens = generate_response.call_args.kwargs["max_tokens"]
+        self.assertEqual(max_tokens, whatsapp_bot.REPLY_MAX_TOKENS)
+        for response_type in ("general", "detail"):
+            self.assertNotEqual(request_priority(response_type, max_tokens), LOW)
+
+
+if __name__ == '__main__':
+    unittest.main()
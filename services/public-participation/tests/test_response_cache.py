@@ -0,0 +1,59 @@
+# tests/test_response_cache.py
+
+import unittest
+from unittest.mock import patch
+from modules.response_cache import ResponseCache, normalize_prompt
+
+FINANCE_BILL = {'id': 1, 'title': "TheFinanceBill_2024.pdf", 'content_hash': "v1"}
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(ttl=60, max_entries=2)
+
+    def test_normalize_prompt(self):
+        self.assertEqual(
+            normalize_prompt("Hi, what is the Finance Bill 2024 about?? Thanks"),
+            "what is the finance bill 2024 about",
+        )
+
+    def test_near_identical_questions_share_a_key(self):
+        key = self.cache.make_key("What is the finance bill 2024 about?", FINANCE_BILL)
+        self.assertEqual(key, self.cache.make_key("what is the Finance Bill 2024 about", FINANCE_BILL))
+        changed = dict(FINANCE_BILL, content_hash="v2")
+        self.assertNotEqual(key, self.cache.make_key("what is the finance bill 2024 about", changed))
+
+    def test_hit_and_miss_metrics(self):
+        key = self.cache.make_key("finance bill", FINANCE_BILL)
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, "It raises taxes.", bill_id=1, generation_seconds=4.0)
+        self.assertEqual(self.cache.get(key), "It raises taxes.")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(stats["saved_generation_seconds"], 4.0)
+        self.assertEqual(stats["backend"], "memory")
+
+    def test_lru_eviction(self):
+        self.cache.set("a", "A")
+        self.cache.set("b", "B")
+        self.cache.get("a")
+        self.cache.set("c", "C")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "A")
+
+    def test_ttl_expiry(self):
+        self.cache.set("a", "A")
+        with patch("modules.response_cache.time.monotonic", return_value=10 ** 9):
+            self.assertIsNone(self.cache.get("a"))
+
+    def test_invalidate_bill(self):
+        self.cache.set("a", "A", bill_id=1)
+        self.cache.set("b", "B", bill_id=2)
+        self.cache.invalidate_bill(1)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), "B")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+# tests/test_retrieval.py
+
+import os
+import tempfile
+import time
+import unittest
+from modules.embeddings import HashingEmbedder, VectorIndex
+from modules.retrieval import BM25, FUZZY, HybridRetriever, reciprocal_rank_fusion
+from modules.title_index import TitleIndex
+from scripts.benchmark_retrieval import format_report, run_benchmark
+
+TITLES = {
+    1: "TheFinanceBill_2024.pdf",
+    2: "TheKenyaSignLanguageBill_2024.pdf",
+    3: "The_Ethics_and_Anti-Corruption_Commission__Amendment__Bill__2024.pdf",
+}
+PASSAGES = {
+    1: ["Excise duty on mobile money transfers rises to fifteen percent."],
+    2: ["Interpreters must be provided in hospitals and courts."],
+    3: ["Public officers shall declare their income and assets."],
+}
+
+
+class FakeBillRetriever:
+    """
+    Stands in for BillRetriever with a real title and vector index and a fake,
+    optionally slow, fulltext index.
+    """
+
+    def __init__(self, directory, fulltext_ids=(), fulltext_delay=0.0):
+        self.index = TitleIndex(path=os.path.join(directory, "title_index.json"))
+        for bill_id, title in TITLES.items():
+            self.index.add(bill_id, title)
+        self.vector_index = VectorIndex(directory=directory, embedder=HashingEmbedder(dim=64))
+        builder = self.vector_index.builder()
+        for bill_id, texts in PASSAGES.items():
+            builder.add_bill(bill_id, str(bill_id), texts)
+        builder.commit()
+        self.use_fulltext = True
+        self.match_threshold = 70
+        self.vector_threshold = 0.35
+        self.fulltext_ids = list(fulltext_ids)
+        self.fulltext_delay = fulltext_delay
+
+    def _ensure_fresh(self):
+        pass
+
+    def fulltext_candidates(self, prompt):
+        time.sleep(self.fulltext_delay)
+        return self.fulltext_ids
+
+    def fulltext_passages(self, prompt, bill_id=None, k=10):
+        time.sleep(self.fulltext_delay)
+        return [
+            {'bill_id': found, 'index': 0, 'text': PASSAGES[found][0], 'score': 1.0}
+            for found in self.fulltext_ids if bill_id in (None, found)
+        ]
+
+    def vector_passages(self, prompt, bill_id=None, k=10):
+        return [
+            {'bill_id': item['bill_id'], 'index': item['index'], 'text': PASSAGES[item['bill_id']][item['index']], 'score': score}
+            for item, score in self.vector_index.search(prompt, k=k, bill_id=bill_id)
+        ]
+
+    def bill_passages(self, bill_id, k=4):
+        return [{'bill_id': bill_id, 'index': 0, 'text': PASSAGES[bill_id][0], 'score': 0.0}]
+
+
+class TestHybridRetriever(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion({"a": [1, 2, 3], "b": [2, 3]}, rrf_k=60)
+        self.assertEqual([key for key, _, _ in fused], [2, 3, 1])
+        self.assertEqual(fused[0][2], {"a": 2, "b": 1})
+
+    def test_title_and_vector_sources_are_fused(self):
+        search = HybridRetriever(FakeBillRetriever(self.tmp_dir.name, fulltext_ids=[2]))
+        self.addCleanup(search.close)
+
+        result = search.match_bills("kenya sign language bill")
+        self.assertEqual(result.match["id"], 2)
+        self.assertEqual(result.bills[0]["ranks"][BM25], 1)
+        self.assertFalse(result.partial)
+
+        # No title is close, but a passage is about the same thing
+        result = search.retrieve("must interpreters be provided in hospitals", k=2)
+        self.assertEqual(result.match["id"], 2)
+        self.assertEqual(result.passages[0]["text"], PASSAGES[2][0])
+
+    def test_slow_source_is_dropped_when_the_budget_runs_out(self):
+        search = HybridRetriever(FakeBillRetriever(self.tmp_dir.name, fulltext_ids=[1], fulltext_delay=0.5))
+        self.addCleanup(search.close)
+
+        start = time.monotonic()
+        result = search.match_bills("finance bill", budget_ms=50)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertTrue(result.partial)
+        self.assertNotIn("bills.bm25", result.timings)
+        self.assertIn("bills.fuzzy", result.timings)
+        self.assertEqual(result.match["id"], 1)
+
+    def test_calls_share_one_deadline(self):
+        search = HybridRetriever(FakeBillRetriever(self.tmp_dir.name, fulltext_ids=[1], fulltext_delay=0.5))
+        self.addCleanup(search.close)
+
+        start = time.monotonic()
+        deadline = search.deadline(50)
+        search.match_bills("finance bill", deadline=deadline)
+        result = search.search_passages("excise duty", bill_id=1, deadline=deadline)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertTrue(result.partial)
+
+    def test_slow_source_cannot_take_every_thread(self):
+        search = HybridRetriever(
+            FakeBillRetriever(self.tmp_dir.name, fulltext_ids=[1], fulltext_delay=0.5),
+            max_workers=2, max_source_tasks=1,
+        )
+        self.addCleanup(search.close)
+
+        search.match_bills("finance bill", budget_ms=50)
+        # BM25 is still running from the first request; it is skipped, not queued
+        result = search.match_bills("finance bill", budget_ms=100)
+        self.assertTrue(result.partial)
+        self.assertNotIn("bills.bm25", result.timings)
+        self.assertIn("bills.vector", result.timings)
+
+    def test_benchmark_reports_recall_per_mode_and_budget(self):
+        retriever = FakeBillRetriever(self.tmp_dir.name)
+        queries = [
+            {"query": "finance", "bill_id": 1},
+            {"query": "declare income and assets", "bill_id": 3},
+        ]
+        rows = run_benchmark(retriever, queries, modes={"fuzzy": (FUZZY,), "hybrid": (FUZZY, "vector")},
+                             budgets=(100,), ks=(1, 3))
+        by_mode = {row["mode"]: row for row in rows}
+        self.assertEqual(by_mode["hybrid"]["recall"][3], 1.0)
+        self.assertEqual(by_mode["fuzzy"]["budget_ms"], 100)
+        self.assertEqual(by_mode["hybrid"]["partial_rate"], 0.0)
+        self.assertIn("hybrid", format_report(rows, ks=(1, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
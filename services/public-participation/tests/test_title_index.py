@@ -0,0 +1,88 @@
+# tests/test_title_index.py
+
+import os
+import tempfile
+import unittest
+from modules.title_index import TitleIndex, char_ngrams, normalize_title
+
+
+class TestTitleIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "title_index.json")
+        self.index = TitleIndex(path=self.path)
+        self.index.add(1, "TheFinanceBill_2024.pdf")
+        self.index.add(2, "TheKenyaRoadsBoard_Amendment_Bill_2024.pdf")
+        self.index.add(3, "TheCultureBill_2024.pdf")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title("TheKenya_Roads-Bill_2024.pdf"), "Thekenya Roads Bill 2024")
+
+    def test_char_ngrams_ignore_case_and_spacing(self):
+        self.assertEqual(char_ngrams("TheFinance"), char_ngrams("the finance"))
+
+    def test_match_returns_record(self):
+        record = self.index.match("what is the finance bill 2024 about")
+        self.assertEqual(record['id'], 1)
+        self.assertEqual(record['title'], "TheFinanceBill_2024.pdf")
+        self.assertGreaterEqual(record['score'], 70)
+
+    def test_match_below_threshold(self):
+        self.assertIsNone(self.index.match("zzzz"))
+
+    def test_candidate_ids_restrict_scoring(self):
+        record = self.index.match("the culture bill", candidate_ids=[1, 2])
+        self.assertNotEqual(record and record['id'], 3)
+
+    def test_updates_are_visible_to_queries(self):
+        self.index.match("culture bill")
+        self.index.add(4, "TheLivestockBill_2024.pdf")
+        self.assertEqual(self.index.match("livestock bill 2024")['id'], 4)
+        self.index.remove(4)
+        self.assertIsNone(self.index.match("livestock", threshold=90))
+
+    def test_save_and_reload(self):
+        self.index.save()
+        other = TitleIndex(path=self.path)
+        self.assertTrue(other.load())
+        self.assertEqual(len(other), 3)
+        self.assertEqual(other.get(3)['normalized'], "Theculturebill 2024")
+        self.assertFalse(other.reload_if_changed())
+
+
+    def test_bill_listing_grouped_by_year(self):
+        self.index.add(4, "TheCultureBill_2024.docx")
+        self.index.add(5, "TheLivestockBill_2023.pdf")
+        self.assertEqual(
+            self.index.format_bill_listing(),
+            "List of Bills in Kenya grouped by year:\n"
+            "\nYear 2024:\n"
+            "- Theculturebill 2024\n"
+            "- Thefinancebill 2024\n"
+            "- Thekenyaroadsboard Amendment Bill 2024\n"
+            "\nYear 2023:\n"
+            "- Thelivestockbill 2023\n",
+        )
+
+    def test_bill_listing_filter_and_paging(self):
+        self.index.add(5, "TheLivestockBill_2023.pdf")
+        self.assertEqual(self.index.list_bills(year="2023"), [("2023", "Thelivestockbill 2023")])
+        self.assertEqual(self.index.list_bills(offset=1, limit=1), [("2024", "Thefinancebill 2024")])
+        self.assertEqual(self.index.format_bill_listing(year="2019"), "")
+
+    def test_bill_listing_invalidated_on_ingest(self):
+        self.index.save()
+        reader = TitleIndex(path=self.path)
+        reader.load()
+        self.assertNotIn("Livestock", reader.format_bill_listing())
+        self.index.add(5, "TheLivestockBill_2023.pdf")
+        self.index.save()
+        self.assertTrue(reader.reload_if_changed())
+        self.assertIn("Thelivestockbill 2023", reader.format_bill_listing())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# tests/test_token_budget.py
+
+import unittest
+from modules.ai_model import OllamaResponder
+from modules.token_budget import TokenBudget, approximate_tokens
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class TestTokenBudget(unittest.TestCase):
+    def test_approximate_tokens(self):
+        self.assertEqual(approximate_tokens(""), 0)
+        self.assertEqual(approximate_tokens("The Bill, 2024."), 5)
+        # Long words count as several tokens
+        self.assertGreater(approximate_tokens("intergovernmental"), 1)
+
+    def test_pack_keeps_the_most_relevant_texts_that_fit(self):
+        budget = TokenBudget(count_tokens=count_words)
+        texts = ["one two three four", "five six", "seven eight nine", "ten"]
+        selected, used = budget.pack(texts, max_tokens=8, separator_tokens=0)
+        self.assertEqual(selected, ["one two three four", "five six", "ten"])
+        self.assertEqual(used, 7)
+
+        selected, _ = budget.pack(["a b c d e f"], max_tokens=3)
+        self.assertEqual(selected, ["a b c"])
+
+    def test_num_predict_fits_context_and_latency(self):
+        budget = TokenBudget(num_ctx=4096, target_seconds=10, generation_tps=20, prompt_tps=100,
+                             min_predict=32, count_tokens=count_words)
+        # 10 s target, 5 s spent on a 500 token prompt, 5 s at 20 tokens/s
+        self.assertEqual(budget.num_predict(500, 1000), 100)
+        self.assertEqual(budget.num_predict(500, 50), 50)
+        self.assertEqual(budget.num_predict(4080, 1000), 16)
+        # Never below min_predict because of latency alone
+        self.assertEqual(budget.num_predict(3000, 1000), 32)
+
+        budget.observe(generation_tps=40, weight=1.0)
+        self.assertEqual(budget.num_predict(500, 1000), 200)
+
+        options, prompt_tokens = budget.options("a b c", 150, 0.7)
+        self.assertEqual(prompt_tokens, 3)
+        self.assertEqual(options, {"num_ctx": 4096, "num_predict": 150, "temperature": 0.7})
+
+    def test_responder_packs_passages_by_relevance(self):
+        responder = OllamaResponder.__new__(OllamaResponder)
+        responder.token_budget = TokenBudget(count_tokens=count_words)
+        passages = [
+            {"bill_id": 1, "index": 5, "text": "most relevant passage"},
+            {"bill_id": 1, "index": 0, "text": "a much longer and less relevant passage text"},
+            {"bill_id": 1, "index": 2, "text": "short one"},
+        ]
+        packed = responder.pack_passages(passages, max_tokens=8)
+        self.assertEqual([passage["index"] for passage in packed], [5, 2])
+        self.assertEqual(responder.pack_passages(passages[1:2], 3)[0]["text"], "a much longer")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests/test_whatsapp_startup.py
+
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+os.environ["WHATSAPP_BOT_WARMUP"] = "false"
+
+from scripts import whatsapp_bot
+
+
+class TestLazyStartup(unittest.TestCase):
+    def setUp(self):
+        whatsapp_bot.responder = None
+        whatsapp_bot.knowledge_graph = None
+        whatsapp_bot._init_errors.clear()
+        self.client = whatsapp_bot.app.test_client()
+
+    def tearDown(self):
+        whatsapp_bot.responder = None
+        whatsapp_bot.knowledge_graph = None
+
+    def test_import_does_not_initialize(self):
+        self.assertIsNone(whatsapp_bot.responder)
+        self.assertIsNone(whatsapp_bot.knowledge_graph)
+        self.assertEqual(self.client.get('/health').data, b"OK")
+
+    @patch('scripts.whatsapp_bot.KnowledgeGraph')
+    @patch('scripts.whatsapp_bot.OllamaResponder')
+    def test_initializes_once_on_first_use(self, mock_responder, mock_graph):
+        first = whatsapp_bot.get_knowledge_graph()
+        second = whatsapp_bot.get_knowledge_graph()
+        self.assertIs(first, second)
+        mock_responder.assert_called_once()
+        mock_graph.assert_called_once_with(response_cache=mock_responder.return_value.response_cache)
+
+    @patch('scripts.whatsapp_bot.start_background_warmup')
+    def test_ready_reports_initialization(self, mock_warmup):
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        mock_warmup.assert_called_once()
+
+        whatsapp_bot.responder = MagicMock()
+        whatsapp_bot.knowledge_graph = MagicMock()
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()["ready"])
+
+    @patch('scripts.whatsapp_bot.OllamaResponder', side_effect=RuntimeError("neo4j down"))
+    def test_failed_initialization_is_retried(self, mock_responder):
+        self.assertIsNone(whatsapp_bot.get_responder())
+        self.assertIn("responder", whatsapp_bot._init_errors)
+        self.assertIsNone(whatsapp_bot.get_responder())
+        self.assertEqual(mock_responder.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()